@@ -0,0 +1,181 @@
+import threading
+from datetime import datetime
+
+from utils.config import (
+    ACTION_TYPES, DECISION_GROUP_SIZE, MAX_FOLLOWING_POSTS, MAX_SERVER_POSTS,
+    MAX_POST_CONTENT_LENGTH, MAX_RELEVANT_MEMORIES
+)
+from utils.logger import log_token_usage, log_prompt_sections
+from utils.prompt_budget import format_sections
+from utils.prompts import build_group_decision_prompt
+from llm.tokenizer import count_tokens
+
+def validate_group_entry(entry):
+    if not isinstance(entry, dict) or not isinstance(entry.get("actions"), list):
+        return None
+    actions = [a for a in entry["actions"] if isinstance(a, dict) and a.get("type") in ACTION_TYPES]
+    if not actions:
+        return None
+    return {"actions": actions}
+
+
+class DecisionGrouper:
+    def __init__(self, llm_client, group_size=DECISION_GROUP_SIZE):
+        self.llm_client = llm_client
+        self.group_size = max(1, group_size)
+        self.groups = 0
+        self.grouped_agents = 0
+        self.fallbacks = 0
+        self.calls_saved = 0
+        self.tokens_saved = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.group_size > 1
+
+    def group(self, agents, round_num):
+        feeds = {}
+        for agent in agents:
+            server = agent.get_current_server()
+            visible_posts = agent.network.get_mixed_posts_for_user(
+                agent.user_id,
+                server,
+                max_following_posts=MAX_FOLLOWING_POSTS,
+                max_server_posts=MAX_SERVER_POSTS
+            )
+            feed_key = (server, tuple(post.get('post_id') for post in visible_posts))
+            if feed_key not in feeds:
+                feeds[feed_key] = (visible_posts, [])
+            feeds[feed_key][1].append(agent)
+
+        groups = []
+        for (server, _), (visible_posts, members) in feeds.items():
+            for i in range(0, len(members), self.group_size):
+                chunk = members[i:i + self.group_size]
+                if len(chunk) > 1:
+                    groups.append(self._prepare(server, visible_posts, chunk, round_num))
+        return groups
+
+    def _prepare(self, server, visible_posts, agents, round_num):
+        posts_info = [
+            {
+                'post_id': post.get('post_id'),
+                'author': post.get('author'),
+                'content': post.get('content', '')[:MAX_POST_CONTENT_LENGTH],
+                'stance': post.get('stance', 'unknown'),
+                'likes': post.get('likes', 0),
+                'comments': len(post.get('comments', [])),
+            }
+            for post in visible_posts
+        ]
+        members = []
+        for agent in agents:
+            liked = agent.network.user_likes.get(agent.user_id, set())
+            members.append({
+                "user_id": agent.user_id,
+                "profile": agent.profile,
+                "already_liked": [p['post_id'] for p in posts_info if str(p['post_id']) in liked],
+                "following": sorted(agent.network.get_following(agent.user_id)),
+                "memories": agent.get_relevant_memories("interaction", MAX_RELEVANT_MEMORIES),
+            })
+        sections = {}
+        prompt = build_group_decision_prompt(members, posts_info, round_num, sections)
+        individual_tokens = {agent.user_id: count_tokens(agent.generate_decision_prompt(visible_posts, round_num))
+                             for agent in agents}
+        return server, visible_posts, agents, prompt, sections, individual_tokens
+
+    def decide(self, group, round_num):
+        server, visible_posts, agents, prompt, sections, individual_tokens = group
+        group_id = "+".join(agent.user_id for agent in agents)
+        log_prompt_sections({
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "round": round_num,
+            "user_id": group_id,
+            "action_type": "group_interaction_decision",
+            "prompt_tokens": count_tokens(prompt),
+            "sections": format_sections(sections["sections"]),
+            "trimmed": format_sections(sections["trimmed"]),
+        })
+
+        print(f"\n👥 Group decision for {len(agents)} users on server {server}: {group_id}")
+        response = self.llm_client.chat(
+            prompt,
+            action_type="group_interaction_decision",
+            user_id=group_id,
+            round_num=round_num
+        )
+        if not isinstance(response, dict):
+            response = {}
+
+        decisions = {}
+        for agent in agents:
+            entry = validate_group_entry(response.get(agent.user_id))
+            if entry is None:
+                print(f"  ⚠ No valid grouped decision for {agent.user_id}, falling back to an individual call")
+                continue
+            decisions[agent.user_id] = (visible_posts, prompt, entry)
+
+        saved_from = sum(individual_tokens[user_id] for user_id in decisions)
+        calls_saved = max(0, len(decisions) - 1)
+        tokens_saved = max(0, saved_from - count_tokens(prompt)) if decisions else 0
+        with self._lock:
+            self.groups += 1
+            self.grouped_agents += len(decisions)
+            self.fallbacks += len(agents) - len(decisions)
+            self.calls_saved += calls_saved
+            self.tokens_saved += tokens_saved
+        log_token_usage({
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "round": round_num,
+            "user_id": group_id,
+            "action_type": "interaction_decision",
+            "model": self.llm_client.router.primary.model,
+            "source": "grouped",
+            "saved_tokens": tokens_saved,
+        })
+        return decisions
+
+    def absorb(self, counts):
+        with self._lock:
+            self.groups += counts.get("groups", 0)
+            self.grouped_agents += counts.get("grouped_agents", 0)
+            self.fallbacks += counts.get("fallbacks", 0)
+            self.calls_saved += counts.get("calls_saved", 0)
+            self.tokens_saved += counts.get("tokens_saved", 0)
+
+    def pending(self, groups, round_num):
+        return PendingGroupDecisions(self, groups, round_num)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "group_size": self.group_size,
+                "groups": self.groups,
+                "grouped_agents": self.grouped_agents,
+                "fallbacks": self.fallbacks,
+                "calls_saved": self.calls_saved,
+                "tokens_saved": self.tokens_saved,
+            }
+
+
+class PendingGroupDecisions:
+    def __init__(self, grouper, groups, round_num):
+        self.grouper = grouper
+        self.round_num = round_num
+        self.groups = groups
+        self._group_of = {agent.user_id: index for index, group in enumerate(groups) for agent in group[2]}
+        self._locks = [threading.Lock() for _ in groups]
+        self._results = {}
+
+    def get(self, user_id):
+        index = self._group_of.get(user_id)
+        if index is None:
+            return None
+        with self._locks[index]:
+            if index not in self._results:
+                self._results[index] = self.grouper.decide(self.groups[index], self.round_num)
+        return self._results[index].get(user_id)
+
+    def __len__(self):
+        return sum(len(decisions) for decisions in list(self._results.values()))
@@ -1,31 +1,30 @@
 import json
 import time
-import random
-import requests
-import re
 from datetime import datetime
 from utils.config import (
-    API_KEY, API_BASE_URL, 
     MAX_MEMORY_ITEMS, MAX_REFLECTION_MEMORIES,
     MAX_RELEVANT_MEMORIES, MAX_POST_CONTENT_LENGTH,
-    MAX_STANCE_HISTORY, MAX_TOKEN_COUNT, MAX_DISPLAY_TOKEN_COUNT,
-    MAX_FOLLOWING_POSTS, MAX_SERVER_POSTS,
-    RETRY_BASE_DELAY, RETRY_BACKOFF_FACTOR, RETRY_MAX_DELAY,
-    RETRY_JITTER_LOW, RETRY_JITTER_HIGH,
-    RETRYABLE_STATUS_CODES, RETRYABLE_ERROR_SUBSTRINGS
+    MAX_STANCE_HISTORY, MAX_TOKEN_COUNT, TRUNCATED_PROMPT_TOKENS, MAX_DISPLAY_TOKEN_COUNT,
+    MAX_FOLLOWING_POSTS, MAX_SERVER_POSTS, FUSED_TURN_MODE,
+    MIGRATION_SATISFACTION_THRESHOLD
 )
-from utils.logger import log_action, log_stance_change, log_migration, log_satisfaction, log_dramatic_stance_change, log_memory_compression
+from utils.logger import log_action, log_stance_change, log_migration, log_satisfaction, log_dramatic_stance_change, log_memory_compression, log_prompt_sections
+from utils.prompt_budget import format_sections
+from utils.seeding import rng_stream
 from utils.prompts import (
     build_create_post_prompt,
     build_environment_evaluation_prompt,
     build_decision_prompt,
+    build_fused_turn_prompt,
     build_adjust_stance_after_interaction_prompt,
     build_reflection_prompt
 )
+from llm.client import get_default_client
+from llm.tokenizer import count_tokens, truncate_to_tokens
 
 class SocialAgent:
     AVAILABLE_SERVERS = ['A', 'B', 'C']
-    def __init__(self, profile, user_id, network, initial_server):
+    def __init__(self, profile, user_id, network, initial_server, llm_client=None):
         self.profile = profile
         self.user_id = f"user_{user_id}"
         self.network = network
@@ -36,6 +35,7 @@ class SocialAgent:
         self.reflections = []
         self.total_importance_since_last_reflection = 0
         self.current_round = 0
+        self.llm_client = llm_client or get_default_client()
     
     def get_current_server(self):
         return self.network.user_servers[self.user_id]
@@ -91,10 +91,14 @@ class SocialAgent:
     def _generate_reflection(self):
         if len(self.behavior_memory) < 5:
             return
+        if not self.llm_client.governor.allow_reflection():
+            print(f"💸 Skipping reflection for {self.user_id} to stay within the token budget")
+            return
         
         recent_memories = self.behavior_memory[-MAX_REFLECTION_MEMORIES:]
         
-        prompt = build_reflection_prompt(recent_memories)
+        sections = {}
+        prompt = build_reflection_prompt(recent_memories, sections)
         
         log_memory_compression({
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
@@ -112,7 +116,7 @@ class SocialAgent:
         })
         
         try:
-            response = self._query_openai(prompt, expect_json_array=True, action_type="reflection")
+            response = self._query_openai(prompt, expect_json_array=True, action_type="reflection", sections=sections)
             if response and isinstance(response, list):
                 new_reflections_count = 0
                 for insight in response[:2]:
@@ -200,9 +204,10 @@ class SocialAgent:
         current_server = self.get_current_server()
         print(f"\n{self.user_id} preparing to post on server {current_server}")
         
-        prompt = build_create_post_prompt(self.profile)
+        sections = {}
+        prompt = build_create_post_prompt(self.profile, sections)
 
-        response = self._query_openai(prompt, action_type="post_creation")
+        response = self._query_openai(prompt, action_type="post_creation", sections=sections)
         
         if response and "content" in response:
             post_content = response["content"]
@@ -245,9 +250,11 @@ class SocialAgent:
         MAX_RELEVANT_MEMORIES = 5
         relevant_memories = self.get_relevant_memories("interaction", MAX_RELEVANT_MEMORIES)
 
-        prompt = build_environment_evaluation_prompt(self.user_id, self.profile, current_server, visible_posts, relevant_memories)
+        sections = {}
+        prompt = build_environment_evaluation_prompt(self.user_id, self.profile, current_server, visible_posts, relevant_memories,
+                                                     sections)
 
-        result = self._query_openai(prompt, action_type="environment_evaluation")
+        result = self._query_openai(prompt, action_type="environment_evaluation", sections=sections)
         if not isinstance(result, dict):
             result = {}
 
@@ -258,7 +265,7 @@ class SocialAgent:
 
     def migrate_if_unsatisfied(self):
         evaluation = self.evaluate_environment()
-        if evaluation.get("score", 0) < 6:
+        if evaluation.get("score", 0) < MIGRATION_SATISFACTION_THRESHOLD:
             self._migrate_with_logging(evaluation)
             return True
         return False
@@ -268,7 +275,7 @@ class SocialAgent:
         candidates = [s for s in self.AVAILABLE_SERVERS if s != old_server]
         if not candidates:
             return
-        new_server = random.choice(candidates)
+        new_server = rng_stream(self.current_round, self.user_id, "migration").choice(candidates)
         self.network.change_user_server(self.user_id, new_server)
         migration_record = f"User {self.user_id} migrated from server {old_server} to server {new_server} (score={evaluation.get('score', '')})"
         self.network.migration_reasons.append(migration_record)
@@ -294,7 +301,7 @@ class SocialAgent:
         except Exception as e:
             print(f"Failed to record migration CSV: {e}")
 
-    def generate_decision_prompt(self, visible_posts, round_num=1, has_posted_this_round=False):
+    def generate_decision_prompt(self, visible_posts, round_num=1, has_posted_this_round=False, fused=False, sections=None):
         recent_posts = visible_posts
         
         user_liked_posts = self.network.user_likes.get(self.user_id, set())
@@ -315,37 +322,25 @@ class SocialAgent:
         relevant_memories = self.get_relevant_memories("interaction", MAX_RELEVANT_MEMORIES)
         
         following_users = self.network.get_following(self.user_id)
-        following_info = f"\n\nCurrently following users: {list(following_users) if following_users else 'none'}"
-        
-        prompt = build_decision_prompt(self.profile, posts_info, round_num, has_posted_this_round)
-        prompt += following_info
-        
-        if relevant_memories:
-            memory_text = "\n\nPast experience (recent interactions):\n"
-            for i, memory in enumerate(relevant_memories, 1):
-                memory_text += f"{i}. {memory['action_type']}@{memory['server']}(stance {memory['stance']}) "
-                memory_text += f"'{memory['content']}'\n"
-                if memory.get('outcome'):
-                    memory_text += f"   Outcome: {memory['outcome']}\n"
-            
-            memory_text += "\nPlease refer to these experiences to make decisions."
-            prompt += memory_text
         
-        return prompt
+        if fused:
+            return build_fused_turn_prompt(self.profile, posts_info, round_num, self.get_current_server(),
+                                           following_users, relevant_memories, sections)
+        return build_decision_prompt(self.profile, posts_info, round_num, has_posted_this_round,
+                                     following_users, relevant_memories, sections)
 
     def estimate_token_count(self, text):
-        chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
-        english_words = len(re.findall(r'\b[a-zA-Z]+\b', text))
-        return chinese_chars + int(english_words * 0.75)
+        return count_tokens(text)
 
     def adjust_stance_after_interaction(self, post, action_type, action_content):
         old_stance = self.profile.get('stance', 0)
         
-        prompt = build_adjust_stance_after_interaction_prompt(self.profile, post, action_type, action_content)
+        sections = {}
+        prompt = build_adjust_stance_after_interaction_prompt(self.profile, post, action_type, action_content, sections)
         
         print(f"  📝 Stance Adjustment Prompt: {prompt[:500]}...")
         
-        response = self._query_openai(prompt, action_type="stance_adjustment")
+        response = self._query_openai(prompt, action_type="stance_adjustment", sections=sections)
         if response and "new_stance" in response:
             try:
                 new_stance = int(response["new_stance"])
@@ -365,6 +360,36 @@ class SocialAgent:
             except Exception as e:
                 print(f"{self.user_id} LLM stance parsing failed: {response.get('new_stance')}, error: {e}")
 
+    def _apply_fused_stance(self, response, interactions, prompt):
+        stance_result = response.get("stance") if isinstance(response, dict) else None
+        if not interactions or not isinstance(stance_result, dict) or "new_stance" not in stance_result:
+            return
+        old_stance = self.profile.get('stance', 0)
+        try:
+            new_stance = int(stance_result["new_stance"])
+        except (TypeError, ValueError):
+            print(f"{self.user_id} LLM stance parsing failed: {stance_result.get('new_stance')}")
+            return
+        if new_stance not in [-2, -1, 0, 1, 2]:
+            print(f"{self.user_id} LLM returned invalid stance: {stance_result['new_stance']}")
+            return
+        reason = stance_result.get('reason', '')
+        if not self._validate_stance_change(old_stance, new_stance, reason):
+            print(f"  ⚠️ Unreasonable stance change, keeping original stance: {old_stance}")
+            return
+        if old_stance != new_stance:
+            change_type = f"Interaction impact ({'/'.join(dict.fromkeys(interactions))})"
+            self.record_stance_change(old_stance, new_stance, change_type, reason, prompt)
+            print(f"  📊 stance: {old_stance} → {new_stance}")
+        self.profile['stance'] = new_stance
+
+    def _fused_evaluation(self, response, prompt):
+        evaluation = response.get("evaluation") if isinstance(response, dict) else None
+        if not isinstance(evaluation, dict) or "score" not in evaluation:
+            print(f"  ⚠ Fused turn returned no evaluation, evaluating separately")
+            return self.evaluate_environment()
+        return {"score": evaluation.get("score", 0), "reason": evaluation.get("reason", ""), "prompt": prompt}
+
     def _validate_stance_change(self, old_stance, new_stance, reason):
         change_magnitude = abs(new_stance - old_stance)
         
@@ -435,38 +460,46 @@ class SocialAgent:
         if len(self.profile['stance_history']) > MAX_STANCE_HISTORY:
             self.profile['stance_history'] = self.profile['stance_history'][-MAX_STANCE_HISTORY:]
 
-    def interact_with_posts(self, round_num=1, has_posted_this_round=False):
+    def interact_with_posts(self, round_num=1, has_posted_this_round=False, decision=None):
         current_server = self.get_current_server()
-        visible_posts = self.network.get_mixed_posts_for_user(
-            self.user_id, 
-            current_server, 
-            max_following_posts=MAX_FOLLOWING_POSTS,
-            max_server_posts=MAX_SERVER_POSTS
-        )
-        
-        following_set = self.network.user_following.get(self.user_id, set())
-        following_count = sum(1 for p in visible_posts if p.get('author') in following_set)
-        server_count = len(visible_posts) - following_count
+        fused = FUSED_TURN_MODE and decision is None
+        interactions = []
+        if decision is not None:
+            visible_posts, decision_prompt, response = decision
+            print(f"\n{self.user_id} (server {current_server}) applying grouped decision... (total {len(visible_posts)} posts)")
+        else:
+            visible_posts = self.network.get_mixed_posts_for_user(
+                self.user_id, 
+                current_server, 
+                max_following_posts=MAX_FOLLOWING_POSTS,
+                max_server_posts=MAX_SERVER_POSTS
+            )
         
-        print(f"\n{self.user_id} (server {current_server}) starting interaction... (total {len(visible_posts)} posts: {following_count} following posts, {server_count} server posts)")
+            following_set = self.network.user_following.get(self.user_id, set())
+            following_count = sum(1 for p in visible_posts if p.get('author') in following_set)
+            server_count = len(visible_posts) - following_count
         
-        decision_prompt = self.generate_decision_prompt(visible_posts, round_num, has_posted_this_round)
+            print(f"\n{self.user_id} (server {current_server}) starting interaction... (total {len(visible_posts)} posts: {following_count} following posts, {server_count} server posts)")
         
-        estimated_tokens = self.estimate_token_count(decision_prompt)
-        if estimated_tokens > MAX_DISPLAY_TOKEN_COUNT:
-            print(f"\n{'='*60}")
-            print(f"🤖 {self.user_id} Decision Prompt (truncated, {estimated_tokens} tokens):")
-            print(f"{'='*60}")
-            print(decision_prompt[:1000] + "...\n[Content too long, truncated]")
-            print(f"{'='*60}\n")
-        else:
-            print(f"\n{'='*60}")
-            print(f"🤖 {self.user_id} Decision Prompt:")
-            print(f"{'='*60}")
-            print(decision_prompt)
-            print(f"{'='*60}\n")
+            sections = {}
+            decision_prompt = self.generate_decision_prompt(visible_posts, round_num, has_posted_this_round, fused, sections)
         
-        response = self._query_openai(decision_prompt, action_type="interaction_decision")
+            estimated_tokens = self.estimate_token_count(decision_prompt)
+            if estimated_tokens > MAX_DISPLAY_TOKEN_COUNT:
+                print(f"\n{'='*60}")
+                print(f"🤖 {self.user_id} Decision Prompt (truncated, {estimated_tokens} tokens):")
+                print(f"{'='*60}")
+                print(decision_prompt[:1000] + "...\n[Content too long, truncated]")
+                print(f"{'='*60}\n")
+            else:
+                print(f"\n{'='*60}")
+                print(f"🤖 {self.user_id} Decision Prompt:")
+                print(f"{'='*60}")
+                print(decision_prompt)
+                print(f"{'='*60}\n")
+        
+            response = self._query_openai(decision_prompt, action_type="fused_turn" if fused else "interaction_decision",
+                                          sections=sections)
 
         user_liked_posts = self.network.user_likes.get(self.user_id, set())
 
@@ -491,7 +524,10 @@ class SocialAgent:
                             stance=self.profile.get('stance', 0),
                             outcome=f"commented on post by {post['author']}"
                         )
-                        self.adjust_stance_after_interaction(post, "comment", content)
+                        if fused:
+                            interactions.append("comment")
+                        else:
+                            self.adjust_stance_after_interaction(post, "comment", content)
                 elif action_type == "retweet" and target_post_id is not None:
                     post = next((p for p in visible_posts if p.get('post_id') == target_post_id), None)
                     if post is not None:
@@ -512,7 +548,10 @@ class SocialAgent:
                             stance=self.profile.get('stance', 0),
                             outcome=f"retweeted post by {post['author']}"
                         )
-                        self.adjust_stance_after_interaction(post, "retweet", retweet_content)
+                        if fused:
+                            interactions.append("retweet")
+                        else:
+                            self.adjust_stance_after_interaction(post, "retweet", retweet_content)
                 elif action_type == "like" and target_post_id is not None:
                     if str(target_post_id) not in user_liked_posts:
                         self.network.add_interaction(self.user_id, target_post_id, "like_post")
@@ -526,7 +565,10 @@ class SocialAgent:
                                 stance=self.profile.get('stance', 0),
                                 outcome=f"liked post by {post['author']}"
                             )
-                            self.adjust_stance_after_interaction(post, "like", "Liked post")
+                            if fused:
+                                interactions.append("like")
+                            else:
+                                self.adjust_stance_after_interaction(post, "like", "Liked post")
                     else:
                         print(f"  ⚠ Already liked post {target_post_id}")
                 elif action_type == "follow":
@@ -581,144 +623,53 @@ class SocialAgent:
         else:
             print("  ⚠ LLM did not return valid actions, defaulting to silent")
 
-        evaluation = self.evaluate_environment()
+        if fused:
+            self._apply_fused_stance(response, interactions, decision_prompt)
+            evaluation = self._fused_evaluation(response, decision_prompt)
+        else:
+            evaluation = self.evaluate_environment()
         
         evaluation_with_round = evaluation.copy()
         evaluation_with_round['round'] = getattr(self, 'current_round', '')
         evaluation_with_round['prompt'] = evaluation.get('prompt', '')
         self.network.record_satisfaction(self.user_id, current_server, evaluation_with_round)
 
-        if evaluation.get("score", 0) < 6:
+        if evaluation.get("score", 0) < MIGRATION_SATISFACTION_THRESHOLD:
             self._migrate_with_logging(evaluation)
         else:
             print(f"  ✅ Environment satisfied (score={evaluation.get('score', '')})")
 
 
-    def _query_openai(self, prompt, max_retries=5, timeout=60, expect_json_array=False, action_type="unknown"):
+    def _query_openai(self, prompt, max_retries=5, timeout=60, expect_json_array=False, action_type="unknown",
+                      sections=None):
         print(f"\n{'='*80}")
         print(f"🤖 API call started - {self.user_id}")
         print(f"{'='*80}")
         
         estimated_tokens = self.estimate_token_count(prompt)
+        if sections:
+            log_prompt_sections({
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "round": getattr(self, 'current_round', ''),
+                "user_id": self.user_id,
+                "action_type": action_type,
+                "prompt_tokens": estimated_tokens,
+                "sections": format_sections(sections["sections"]),
+                "trimmed": format_sections(sections["trimmed"]),
+            })
         if estimated_tokens > MAX_TOKEN_COUNT:
             print(f"⚠️ Prompt too long ({estimated_tokens} tokens), truncating...")
-            target_tokens = 50000
-            max_chars = int(len(prompt) * target_tokens / estimated_tokens)
-            prompt = prompt[:max_chars] + "\n\n[Content truncated to save tokens]"
-            
-            final_tokens = self.estimate_token_count(prompt)
-            while final_tokens > 60000:
-                max_chars = int(max_chars * 0.8)
-                prompt = prompt[:max_chars] + "\n\n[Content truncated to save tokens]"
-                final_tokens = self.estimate_token_count(prompt)
-            
-            print(f"✅ Truncated to {final_tokens} tokens")
-        
-        headers = {
-            "Authorization": f"Bearer {API_KEY}",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "model": "gpt-4o-mini",
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.7
-        }
-
-        for attempt in range(max_retries):
-            try:
-                response = requests.post(
-                    f"{API_BASE_URL}/chat/completions", 
-                    headers=headers, 
-                    json=data,
-                    timeout=timeout
-                )
-                
-                if response.status_code == 200:
-                    response_data = response.json()
-                    content = response_data["choices"][0]["message"]["content"].strip()
-                    
-                    if "usage" in response_data:
-                        from utils.logger import log_token_usage
-                        from datetime import datetime
-                        
-                        usage = response_data["usage"]
-                        log_token_usage({
-                            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                            "round": getattr(self, 'current_round', 0),
-                            "user_id": self.user_id,
-                            "action_type": action_type,
-                            "prompt_tokens": usage.get("prompt_tokens", 0),
-                            "completion_tokens": usage.get("completion_tokens", 0),
-                            "total_tokens": usage.get("total_tokens", 0),
-                            "model": data.get("model", "unknown"),
-                        })
-                    
-                    if "```json" in content:
-                        json_str = content.split("```json")[1].split("```")[0].strip()
-                    elif "```" in content:
-                        json_str = content.split("```")[1].split("```")[0].strip()
-                    else:
-                        json_str = content.strip()
-                    
-                    try:
-                        result = json.loads(json_str)
-                        print(f"✅ API call successful - {self.user_id}")
-                        print(f"{'='*80}\n")
-                        return result
-                    except json.JSONDecodeError:
-                        print(f"❌ JSON parsing failed, original content: {json_str[:200]}...")
-                        if attempt < max_retries - 1:
-                            print(f"⏳ Waiting before retry...")
-                            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (RETRY_BACKOFF_FACTOR ** attempt))
-                            delay *= random.uniform(RETRY_JITTER_LOW, RETRY_JITTER_HIGH)
-                            time.sleep(delay)
-                            continue
-                        else:
-                            print(f"⚠️ All retries failed, returning original content as reason")
-                            return {"reason": json_str[:100], "error": "JSON parse failed"}
-                else:
-                    print(f"❌ API error: {response.text}")
-                    is_retryable = (response.status_code in RETRYABLE_STATUS_CODES) or any(
-                        err_substr.lower() in response.text.lower() for err_substr in RETRYABLE_ERROR_SUBSTRINGS
-                    )
-                    if attempt < max_retries - 1 and is_retryable:
-                        print(f"⏳ Retryable error, waiting before retry...")
-                        delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (RETRY_BACKOFF_FACTOR ** attempt))
-                        delay *= random.uniform(RETRY_JITTER_LOW, RETRY_JITTER_HIGH)
-                        time.sleep(delay)
-                        continue
-                    else:
-                        return {"reason": response.text[:200], "status": response.status_code, "error": "HTTP error"}
-                    
-            except requests.exceptions.Timeout:
-                print(f"⏰ API call timeout (attempt {attempt + 1}/{max_retries})")
-                if attempt < max_retries - 1:
-                    print("⏳ Waiting before retry...")
-                    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (RETRY_BACKOFF_FACTOR ** attempt))
-                    delay *= random.uniform(RETRY_JITTER_LOW, RETRY_JITTER_HIGH)
-                    time.sleep(delay)
-                    continue
-                
-            except requests.exceptions.ConnectionError:
-                print(f"🔌 Connection error (attempt {attempt + 1}/{max_retries})")
-                if attempt < max_retries - 1:
-                    print("⏳ Waiting before retry...")
-                    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (RETRY_BACKOFF_FACTOR ** attempt))
-                    delay *= random.uniform(RETRY_JITTER_LOW, RETRY_JITTER_HIGH)
-                    time.sleep(delay)
-                    continue
-                
-            except Exception as e:
-                print(f"💥 API call error: {e}")
-                if attempt < max_retries - 1:
-                    print("⏳ Waiting before retry...")
-                    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (RETRY_BACKOFF_FACTOR ** attempt))
-                    delay *= random.uniform(RETRY_JITTER_LOW, RETRY_JITTER_HIGH)
-                    time.sleep(delay)
-                    continue
-        
-        print(f"❌ API call completely failed - {self.user_id}")
-        print(f"{'='*80}\n")
-        return {"reason": "API call failed after all retries", "error": "API failure"} 
+            prompt = truncate_to_tokens(prompt, TRUNCATED_PROMPT_TOKENS, suffix="\n\n[Content truncated to save tokens]")
+            print(f"✅ Truncated to {self.estimate_token_count(prompt)} tokens")
+        
+        return self.llm_client.chat(
+            prompt,
+            expect_json_array=expect_json_array,
+            action_type=action_type,
+            user_id=self.user_id,
+            round_num=getattr(self, 'current_round', 0),
+            max_retries=max_retries,
+            timeout=timeout
+        )
 
     
\ No newline at end of file
@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import httpx
+
+from utils.config import (
+    API_KEY, API_BASE_URL, OUTPUT_DIR,
+    LLM_BATCH_MODE, LLM_BATCH_DIR, LLM_BATCH_POLL_INTERVAL, LLM_BATCH_COMPLETION_WINDOW
+)
+from llm.tokenizer import count_tokens
+
+BATCH_OFF = "off"
+BATCH_LOCAL = "local"
+BATCH_OPENAI = "openai"
+BATCH_MODES = (BATCH_OFF, BATCH_LOCAL, BATCH_OPENAI)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+GROUP_MEMBER_RE = re.compile(r"^## (\S+)$", re.MULTILINE)
+
+
+def make_custom_id(seq, action_type, user_id, round_num):
+    return f"{action_type}|{user_id}|r{round_num}|{seq}"
+
+
+def parse_custom_id(custom_id):
+    action_type, user_id, round_tag, _ = custom_id.split("|")
+    return action_type, user_id, round_tag[1:]
+
+
+def write_batch_input(path, requests):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for custom_id, body in requests:
+            f.write(json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": body,
+            }, ensure_ascii=False) + "\n")
+
+
+def read_batch_output(path):
+    results = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entry = json.loads(line)
+                results[entry["custom_id"]] = entry
+    return results
+
+
+def local_stub_content(action_type, prompt):
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+    decision = {"actions": [{"type": "silent", "reason": "Local batch stand-in"}]}
+    evaluation = {"score": 5 + int(digest, 16) % 5, "reason": "Local batch stand-in evaluation"}
+    stance = {"reason": "Local batch stand-in keeps the current stance"}
+    if action_type == "post_creation":
+        return json.dumps({"content": f"Sharing my thoughts on AI today ({digest})."})
+    if action_type == "interaction_decision":
+        return json.dumps(decision)
+    if action_type == "group_interaction_decision":
+        return json.dumps({user_id: decision for user_id in GROUP_MEMBER_RE.findall(prompt)})
+    if action_type == "fused_turn":
+        return json.dumps(dict(decision, stance=stance, evaluation=evaluation))
+    if action_type == "environment_evaluation":
+        return json.dumps(evaluation)
+    if action_type == "stance_adjustment":
+        return json.dumps(stance)
+    if action_type == "reflection":
+        return json.dumps([f"I tend to engage with posts close to my own stance ({digest})."])
+    raise ValueError(f"No local batch stand-in for action type {action_type}")
+
+
+class LocalBatchProcessor:
+    def __init__(self, responder=local_stub_content):
+        self.responder = responder
+
+    def process(self, input_path, output_path):
+        with open(input_path, "r", encoding="utf-8") as src, open(output_path, "w", encoding="utf-8") as dst:
+            for line in src:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                body = request["body"]
+                prompt = "\n".join(m["content"] for m in body["messages"])
+                action_type, _, _ = parse_custom_id(request["custom_id"])
+                content = self.responder(action_type, prompt)
+                prompt_tokens = count_tokens(prompt)
+                completion_tokens = count_tokens(content)
+                dst.write(json.dumps({
+                    "id": f"batch_req_{request['custom_id']}",
+                    "custom_id": request["custom_id"],
+                    "response": {
+                        "status_code": 200,
+                        "body": {
+                            "object": "chat.completion",
+                            "model": body["model"],
+                            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                         "finish_reason": "stop"}],
+                            "usage": {
+                                "prompt_tokens": prompt_tokens,
+                                "completion_tokens": completion_tokens,
+                                "total_tokens": prompt_tokens + completion_tokens,
+                            },
+                        },
+                    },
+                    "error": None,
+                }, ensure_ascii=False) + "\n")
+
+
+class OpenAIBatchProcessor:
+    def __init__(self, api_key=API_KEY, base_url=API_BASE_URL, poll_interval=LLM_BATCH_POLL_INTERVAL,
+                 completion_window=LLM_BATCH_COMPLETION_WINDOW):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+
+    def process(self, input_path, output_path):
+        with httpx.Client(headers={"Authorization": f"Bearer {self.api_key}"}, timeout=120) as session:
+            with open(input_path, "rb") as f:
+                response = session.post(
+                    f"{self.base_url}/files",
+                    data={"purpose": "batch"},
+                    files={"file": (os.path.basename(input_path), f, "application/jsonl")}
+                )
+            response.raise_for_status()
+            input_file_id = response.json()["id"]
+
+            response = session.post(f"{self.base_url}/batches", json={
+                "input_file_id": input_file_id,
+                "endpoint": BATCH_ENDPOINT,
+                "completion_window": self.completion_window,
+            })
+            response.raise_for_status()
+            batch = response.json()
+            print(f"⏳ Batch {batch['id']} submitted, polling every {self.poll_interval:.0f}s")
+
+            while batch["status"] not in BATCH_TERMINAL_STATUSES:
+                time.sleep(self.poll_interval)
+                response = session.get(f"{self.base_url}/batches/{batch['id']}")
+                response.raise_for_status()
+                batch = response.json()
+
+            if batch["status"] != "completed":
+                raise RuntimeError(f"Batch {batch['id']} ended with status {batch['status']}")
+
+            with open(output_path, "wb") as out:
+                for file_id in (batch.get("output_file_id"), batch.get("error_file_id")):
+                    if file_id:
+                        response = session.get(f"{self.base_url}/files/{file_id}/content")
+                        response.raise_for_status()
+                        out.write(response.content)
+
+
+class BatchCollector:
+    def __init__(self, mode=LLM_BATCH_MODE, processor=None, directory=None):
+        if mode not in BATCH_MODES:
+            raise ValueError(f"Unknown batch mode: {mode} (expected one of {BATCH_MODES})")
+        self.mode = mode
+        if processor is None and mode == BATCH_LOCAL:
+            processor = LocalBatchProcessor()
+        elif processor is None and mode == BATCH_OPENAI:
+            processor = OpenAIBatchProcessor()
+        self.processor = processor
+        self.directory = directory or os.path.join(OUTPUT_DIR, LLM_BATCH_DIR)
+        self.batches = 0
+        self.requests = 0
+        self.failed_batches = 0
+        self._cond = threading.Condition()
+        self._participants = 0
+        self._pending = {}
+        self._seq = 0
+        self._label = "batch"
+
+    @property
+    def enabled(self):
+        return self.mode != BATCH_OFF
+
+    def run(self, items, turn, label="batch"):
+        with self._cond:
+            self._participants = len(items)
+            self._label = label
+
+        def participant(item):
+            try:
+                return turn(item)
+            finally:
+                with self._cond:
+                    self._participants -= 1
+                    self._flush_if_ready()
+
+        with ThreadPoolExecutor(max_workers=max(1, len(items)), thread_name_prefix="batch-agent") as pool:
+            return list(pool.map(participant, items))
+
+    def submit(self, body, action_type, user_id, round_num):
+        future = Future()
+        with self._cond:
+            self._seq += 1
+            custom_id = make_custom_id(self._seq, action_type, user_id, round_num)
+            self._pending[custom_id] = (body, future)
+            self._flush_if_ready()
+        return future
+
+    def _flush_if_ready(self):
+        if self._pending and len(self._pending) >= self._participants:
+            pending, self._pending = self._pending, {}
+            self.batches += 1
+            self.requests += len(pending)
+            name = f"{self._label}_{self.batches:04d}"
+            threading.Thread(target=self._flush, args=(name, pending), name=f"llm-batch-{name}", daemon=True).start()
+
+    def _flush(self, name, pending):
+        input_path = os.path.join(self.directory, f"{name}_input.jsonl")
+        output_path = os.path.join(self.directory, f"{name}_output.jsonl")
+        try:
+            write_batch_input(input_path, [(custom_id, body) for custom_id, (body, _) in pending.items()])
+            print(f"📦 Submitting batch {name} ({len(pending)} requests, {self.mode})")
+            self.processor.process(input_path, output_path)
+            results = read_batch_output(output_path)
+        except Exception as e:
+            self.failed_batches += 1
+            print(f"❌ Batch {name} failed: {e}")
+            for _, future in pending.values():
+                future.set_exception(e)
+            return
+        print(f"📬 Batch {name} completed ({len(results)}/{len(pending)} results)")
+        for custom_id, (_, future) in pending.items():
+            future.set_result(results.get(custom_id))
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "batches": self.batches,
+            "requests": self.requests,
+            "failed_batches": self.failed_batches,
+        }
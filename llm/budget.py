@@ -0,0 +1,189 @@
+import threading
+from datetime import datetime
+
+from utils.config import (
+    TOTAL_ROUNDS, LLM_ROUND_TOKEN_BUDGET, LLM_RUN_TOKEN_BUDGET,
+    LLM_PROMPT_COST_PER_MILLION, LLM_COMPLETION_COST_PER_MILLION,
+    LLM_BUDGET_RECOVERY_RATIO, LLM_BUDGET_PROMPT_SCALE, LLM_BUDGET_AGENT_SAMPLE_RATE
+)
+from utils.logger import add_token_usage_listener, log_budget_step
+from utils.prompt_budget import set_section_budget_scale
+from utils.seeding import rng_stream
+
+LEVEL_NORMAL = 0
+LEVEL_SHORT_PROMPTS = 1
+LEVEL_SAMPLE_AGENTS = 2
+LEVEL_SKIP_REFLECTIONS = 3
+
+LEVEL_NAMES = {
+    LEVEL_NORMAL: "normal",
+    LEVEL_SHORT_PROMPTS: "shorter_prompts",
+    LEVEL_SAMPLE_AGENTS: "sample_agents",
+    LEVEL_SKIP_REFLECTIONS: "skip_reflections",
+}
+
+
+def estimate_cost(prompt_tokens, completion_tokens, cached_tokens=0):
+    prompt_cost = (prompt_tokens - cached_tokens * 0.5) / 1_000_000 * LLM_PROMPT_COST_PER_MILLION
+    completion_cost = completion_tokens / 1_000_000 * LLM_COMPLETION_COST_PER_MILLION
+    return prompt_cost + completion_cost
+
+
+class BudgetGovernor:
+    def __init__(self, round_budget=LLM_ROUND_TOKEN_BUDGET, run_budget=LLM_RUN_TOKEN_BUDGET, total_rounds=TOTAL_ROUNDS,
+                 recovery_ratio=LLM_BUDGET_RECOVERY_RATIO, prompt_scale=LLM_BUDGET_PROMPT_SCALE,
+                 sample_rate=LLM_BUDGET_AGENT_SAMPLE_RATE):
+        self.round_budget = round_budget or 0
+        self.run_budget = run_budget or 0
+        self.total_rounds = total_rounds
+        self.recovery_ratio = recovery_ratio
+        self.prompt_scale = prompt_scale
+        self.sample_rate = sample_rate
+        self.level = LEVEL_NORMAL
+        self.round_num = 0
+        self.rounds_seen = 0
+        self.round_tokens = 0
+        self.last_round_tokens = 0
+        self.run_tokens = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.batch_cost_discount = 0.0
+        self.steps = 0
+        self.skipped_agents = 0
+        self.skipped_reflections = 0
+        self._round_over_budget = False
+        self._lock = threading.RLock()
+        if self.enabled:
+            add_token_usage_listener(self.observe)
+
+    @property
+    def enabled(self):
+        return self.round_budget > 0 or self.run_budget > 0
+
+    @property
+    def skip_reflections(self):
+        return self.level >= LEVEL_SKIP_REFLECTIONS
+
+    def observe(self, record):
+        if record.get("source") in ("coalesced", "grouped"):
+            return
+        total = int(record.get("total_tokens") or 0)
+        prompt = int(record.get("prompt_tokens") or 0)
+        completion = int(record.get("completion_tokens") or 0)
+        with self._lock:
+            self.round_tokens += total
+            self.run_tokens += total
+            self.prompt_tokens += prompt
+            self.completion_tokens += completion
+            self.cached_tokens += int(record.get("cached_tokens") or 0)
+            if record.get("source") == "batch":
+                self.batch_cost_discount += estimate_cost(prompt, completion) * 0.5
+            if self.round_budget and self.round_tokens > self.round_budget and not self._round_over_budget:
+                self._round_over_budget = True
+                print(f"💸 Round {self.round_num} tokens {self.round_tokens:,} over budget {self.round_budget:,}, "
+                      f"degrading from the next round")
+
+    def run_cost(self):
+        with self._lock:
+            return estimate_cost(self.prompt_tokens, self.completion_tokens, self.cached_tokens) - self.batch_cost_discount
+
+    def projection(self, rounds_left=None):
+        with self._lock:
+            if rounds_left is None:
+                rounds_left = max(0, self.total_rounds - self.round_num)
+            if not self.rounds_seen:
+                return self.run_tokens, self.run_cost()
+            per_round_tokens = self.run_tokens / self.rounds_seen
+            per_round_cost = self.run_cost() / self.rounds_seen
+            return (int(self.run_tokens + per_round_tokens * rounds_left),
+                    self.run_cost() + per_round_cost * rounds_left)
+
+    def pressure(self, rounds_left):
+        pressures = []
+        if self.round_budget and self.rounds_seen:
+            pressures.append(self.last_round_tokens / self.round_budget)
+        if self.run_budget:
+            projected_tokens, _ = self.projection(rounds_left)
+            pressures.append(projected_tokens / self.run_budget)
+        return max(pressures) if pressures else 0.0
+
+    def start_round(self, round_num):
+        if not self.enabled:
+            return
+        with self._lock:
+            if self.round_num:
+                self.rounds_seen += 1
+            over_round = self._round_over_budget
+            self.last_round_tokens = self.round_tokens
+            self.round_num = round_num
+            self.round_tokens = 0
+            self._round_over_budget = False
+            rounds_left = max(0, self.total_rounds - round_num + 1)
+            pressure = self.pressure(rounds_left)
+            projected_tokens, projected_cost = self.projection(rounds_left)
+            if self.run_budget and self.run_tokens >= self.run_budget:
+                self._step(LEVEL_SKIP_REFLECTIONS, f"run budget {self.run_budget:,} exhausted")
+            elif over_round:
+                self._step(self.level + 1, f"round {round_num - 1} tokens {self.last_round_tokens:,} over budget {self.round_budget:,}")
+            elif pressure > 1.0:
+                self._step(self.level + 1, f"budget pressure {pressure:.2f}")
+            elif pressure < self.recovery_ratio and self.level > LEVEL_NORMAL:
+                self._step(self.level - 1, f"budget pressure {pressure:.2f} below {self.recovery_ratio:.2f}")
+            print(f"💰 Budget: {self.run_tokens:,} tokens used, projected {projected_tokens:,} tokens "
+                  f"(${projected_cost:.4f}) by round {self.total_rounds}, level {LEVEL_NAMES[self.level]}")
+
+    def _step(self, level, reason):
+        level = max(LEVEL_NORMAL, min(LEVEL_SKIP_REFLECTIONS, level))
+        if level == self.level:
+            return
+        direction = "⬆️ Degrading" if level > self.level else "⬇️ Restoring"
+        self.set_level(level)
+        self.steps += 1
+        projected_tokens, projected_cost = self.projection()
+        print(f"{direction} to budget level {level} ({LEVEL_NAMES[level]}): {reason}")
+        log_budget_step({
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "round": self.round_num,
+            "level": level,
+            "step": LEVEL_NAMES[level],
+            "round_tokens": self.round_tokens,
+            "run_tokens": self.run_tokens,
+            "projected_tokens": projected_tokens,
+            "projected_cost": round(projected_cost, 6),
+            "reason": reason,
+        })
+
+    def set_level(self, level):
+        self.level = level
+        set_section_budget_scale(self.prompt_scale if level >= LEVEL_SHORT_PROMPTS else 1.0)
+
+    def sample_agents(self, agents):
+        if self.level < LEVEL_SAMPLE_AGENTS:
+            return list(agents)
+        count = max(1, int(len(agents) * self.sample_rate))
+        sampled = rng_stream(self.round_num, "sample_agents").sample(agents, count)
+        with self._lock:
+            self.skipped_agents += len(agents) - count
+        return sampled
+
+    def allow_reflection(self):
+        if not self.skip_reflections:
+            return True
+        with self._lock:
+            self.skipped_reflections += 1
+        return False
+
+    def stats(self):
+        with self._lock:
+            projected_tokens, projected_cost = self.projection(0)
+            return {
+                "level": LEVEL_NAMES[self.level],
+                "run_tokens": self.run_tokens,
+                "run_cost": self.run_cost(),
+                "projected_tokens": projected_tokens,
+                "projected_cost": projected_cost,
+                "steps": self.steps,
+                "skipped_agents": self.skipped_agents,
+                "skipped_reflections": self.skipped_reflections,
+            }
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from utils.config import (
+    LLM_CACHE_MODE, LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES,
+    LLM_CACHE_BYPASS_NONZERO_TEMPERATURE
+)
+
+CACHE_OFF = "off"
+CACHE_READ_WRITE = "read-write"
+CACHE_READ_ONLY = "read-only"
+CACHE_MODES = (CACHE_OFF, CACHE_READ_WRITE, CACHE_READ_ONLY)
+
+
+def make_cache_key(model: str, temperature: float, prompt: str, action_type: str, salt=None) -> str:
+    parts = [model, temperature, prompt, action_type]
+    if salt is not None:
+        parts.append(salt)
+    payload = json.dumps(parts, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path=LLM_CACHE_PATH, mode=LLM_CACHE_MODE, max_bytes=LLM_CACHE_MAX_BYTES,
+                 bypass_nonzero_temperature=LLM_CACHE_BYPASS_NONZERO_TEMPERATURE, salt=None, forward=False):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode: {mode} (expected one of {CACHE_MODES})")
+        self.path = path
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.bypass_nonzero_temperature = bypass_nonzero_temperature
+        self.salt = salt
+        self.forward = forward
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.tokens_saved = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._total_bytes = 0
+        self._forwarded = []
+
+    @property
+    def enabled(self):
+        return self.mode != CACHE_OFF
+
+    def accepts(self, temperature):
+        if not self.enabled:
+            return False
+        return not (self.bypass_nonzero_temperature and temperature > 0)
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, content TEXT NOT NULL, total_tokens INTEGER NOT NULL, "
+                "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses (last_access)")
+            self._conn.commit()
+            self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        return self._conn
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT content, total_tokens FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if self.mode == CACHE_READ_WRITE:
+                conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+                conn.commit()
+            return row[0], row[1]
+
+    def served(self, total_tokens):
+        with self._lock:
+            self.hits += 1
+            self.tokens_saved += total_tokens
+
+    def rejected(self):
+        with self._lock:
+            self.misses += 1
+
+    def put(self, key, content, total_tokens=0):
+        if self.mode != CACHE_READ_WRITE:
+            return
+        if self.forward:
+            with self._lock:
+                self._forwarded.append((key, content, total_tokens))
+            return
+        size = len(content.encode("utf-8"))
+        with self._lock:
+            conn = self._connect()
+            old = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, content, total_tokens, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, content, total_tokens, size, time.time())
+            )
+            conn.commit()
+            self.stores += 1
+            self._total_bytes += size - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict(conn)
+
+    def take_forwarded(self):
+        with self._lock:
+            stores, self._forwarded = self._forwarded, []
+            return stores
+
+    def absorb(self, counts):
+        with self._lock:
+            self.hits += counts.get("hits", 0)
+            self.misses += counts.get("misses", 0)
+            self.tokens_saved += counts.get("tokens_saved", 0)
+
+    def _evict(self, conn):
+        self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        while self._total_bytes > self.max_bytes:
+            rows = conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC LIMIT 100").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_bytes -= size
+                self.evictions += 1
+        conn.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "tokens_saved": self.tokens_saved,
+            "size_bytes": self._total_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
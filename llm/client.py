@@ -0,0 +1,444 @@
+import asyncio
+import copy
+import json
+import random
+import threading
+import time
+from datetime import datetime
+
+import httpx
+
+from utils.config import (
+    LLM_TEMPERATURE, LLM_COMPLETION_TOKEN_ESTIMATE, LLM_STREAMING, LLM_JSON_REPAIR,
+    LLM_SINGLE_FLIGHT, LLM_SINGLE_FLIGHT_BYPASS_NONZERO_TEMPERATURE,
+    RETRY_BASE_DELAY, RETRY_BACKOFF_FACTOR, RETRY_MAX_DELAY,
+    RETRY_JITTER_LOW, RETRY_JITTER_HIGH,
+    RETRYABLE_STATUS_CODES, RETRYABLE_ERROR_SUBSTRINGS
+)
+from utils.logger import log_token_usage, log_json_repair
+from utils.prompts import SYSTEM_PROMPT
+from llm.transport import HTTPTransport
+from llm.cache import ResponseCache, make_cache_key
+from llm.journal import CallJournal
+from llm.rate_limiter import TokenBucketRateLimiter
+from llm.tokenizer import count_tokens
+from llm.router import EndpointRouter
+from llm.concurrency import AdaptiveConcurrencyController, CircuitOpenError
+from llm.single_flight import SingleFlight
+from llm.batch import BatchCollector
+from llm.streaming import JSONStreamScanner
+from llm.json_repair import repair_json, coerce_schema
+from llm.hedging import HedgePolicy
+from llm.scheduler import PriorityScheduler
+from llm.budget import BudgetGovernor
+
+_JITTER_RNG = random.Random()
+
+
+def compute_retry_delay(attempt: int) -> float:
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (RETRY_BACKOFF_FACTOR ** attempt))
+    return delay * _JITTER_RNG.uniform(RETRY_JITTER_LOW, RETRY_JITTER_HIGH)
+
+
+def is_retryable_error(status_code: int, text: str) -> bool:
+    return (status_code in RETRYABLE_STATUS_CODES) or is_saturation_error(text)
+
+
+def is_saturation_error(text: str) -> bool:
+    return any(err_substr.lower() in text.lower() for err_substr in RETRYABLE_ERROR_SUBSTRINGS)
+
+
+def cached_prompt_tokens(usage: dict) -> int:
+    return (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0) or 0
+
+
+def extract_json_str(content: str) -> str:
+    if "```json" in content:
+        return content.split("```json")[1].split("```")[0].strip()
+    elif "```" in content:
+        return content.split("```")[1].split("```")[0].strip()
+    return content.strip()
+
+
+class AsyncLLMClient:
+    def __init__(self, transport=None, cache=None, journal=None, rate_limiter=None, router=None,
+                 concurrency=None, batch=None, hedge=None, scheduler=None, governor=None):
+        self.transport = transport or HTTPTransport()
+        self.router = router or EndpointRouter()
+        self.cache = cache if cache is not None else ResponseCache()
+        self.journal = journal if journal is not None else CallJournal()
+        self.rate_limiter = rate_limiter if rate_limiter is not None else TokenBucketRateLimiter()
+        self.concurrency = concurrency or AdaptiveConcurrencyController()
+        self.scheduler = scheduler or PriorityScheduler(lambda: self.concurrency.limit)
+        self.concurrency.on_limit_increase(self.scheduler.wake)
+        self.single_flight = SingleFlight()
+        self.single_flight_enabled = LLM_SINGLE_FLIGHT
+        self.batch = batch if batch is not None else BatchCollector()
+        self.hedge = hedge or HedgePolicy()
+        self.governor = governor or BudgetGovernor()
+        self.streaming = LLM_STREAMING
+        self.json_repair = LLM_JSON_REPAIR
+        self.parse_stats = {"clean": 0, "repaired": 0, "retried": 0, "failed": 0, "saved_tokens": 0}
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def coalesces(self, temperature=LLM_TEMPERATURE):
+        return self.single_flight_enabled and not (LLM_SINGLE_FLIGHT_BYPASS_NONZERO_TEMPERATURE and temperature > 0)
+
+    def start(self):
+        with self._start_lock:
+            if self._loop is not None:
+                return self
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="llm-client-loop", daemon=True)
+            thread.start()
+            self._loop = loop
+            self._thread = thread
+        return self
+
+    async def _aclose(self):
+        await self.transport.aclose()
+        self.cache.close()
+        self.journal.close()
+
+    def close(self):
+        with self._start_lock:
+            if self._loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._aclose(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+            self._thread = None
+
+    def run(self, coro):
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def chat(self, prompt, expect_json_array=False, action_type="unknown", user_id="", round_num=0,
+             max_retries=5, timeout=60):
+        return self.run(self.achat(prompt, expect_json_array, action_type, user_id, round_num,
+                                   max_retries, timeout))
+
+    async def achat(self, prompt, expect_json_array=False, action_type="unknown", user_id="", round_num=0,
+                    max_retries=5, timeout=60):
+        data = {
+            "model": self.router.primary.model,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": LLM_TEMPERATURE
+        }
+
+        if self.journal.replaying:
+            result = self.journal.replay(round_num, user_id, action_type, prompt)
+            print(f"📼 Replayed response - {user_id} ({action_type})")
+            print(f"{'='*80}\n")
+            return result
+
+        result, content, usage = await self._cached_complete(data, prompt, action_type, user_id, round_num,
+                                                             max_retries, timeout, expect_json_array)
+        self.journal.record(round_num, user_id, action_type, data["model"], prompt, result, content, usage)
+        return result
+
+    async def _cached_complete(self, data, prompt, action_type, user_id, round_num, max_retries, timeout,
+                               expect_json_array=False):
+        cache_key = None
+        if self.cache.accepts(data["temperature"]):
+            cache_key = make_cache_key(data["model"], data["temperature"], prompt, action_type, self.cache.salt)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                cached_content, cached_tokens = cached
+                try:
+                    result = self._parse_content(extract_json_str(cached_content), cached_content, expect_json_array,
+                                                 action_type, user_id, round_num, {})
+                except ValueError:
+                    self.cache.rejected()
+                else:
+                    self.cache.served(cached_tokens)
+                    print(f"💾 Cache hit - {user_id} ({action_type})")
+                    print(f"{'='*80}\n")
+                    return result, cached_content, {}
+
+        if self.batch.enabled:
+            result, content, usage = await self._complete_batched(data, action_type, user_id, round_num, max_retries,
+                                                                  expect_json_array)
+        elif self.coalesces(data["temperature"]):
+            flight_key = cache_key or make_cache_key(data["model"], data["temperature"], prompt, action_type)
+            (result, content, usage), coalesced = await self.single_flight.do(
+                flight_key,
+                lambda: self._complete(data, action_type, user_id, round_num, max_retries, timeout,
+                                       expect_json_array)
+            )
+            if coalesced:
+                print(f"🔗 Coalesced with identical in-flight request - {user_id} ({action_type})")
+                print(f"{'='*80}\n")
+                log_token_usage({
+                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    "round": round_num,
+                    "user_id": user_id,
+                    "action_type": action_type,
+                    "model": data["model"],
+                    "source": "coalesced",
+                    "saved_tokens": usage.get("total_tokens", 0),
+                })
+                return copy.deepcopy(result), content, {}
+        else:
+            result, content, usage = await self._complete(data, action_type, user_id, round_num, max_retries, timeout,
+                                                          expect_json_array)
+        if cache_key is not None and content is not None:
+            self.cache.put(cache_key, content, usage.get("total_tokens", 0))
+        return result, content, usage
+
+    def _parse_content(self, json_str, content, expect_json_array, action_type, user_id, round_num, usage):
+        try:
+            result = json.loads(json_str)
+        except json.JSONDecodeError:
+            if not self.json_repair:
+                raise
+            result, repairs = repair_json(content, expect_json_array, action_type)
+        else:
+            if not self.json_repair:
+                self.parse_stats["clean"] += 1
+                return result
+            try:
+                result, repairs = coerce_schema(result, action_type)
+            except ValueError:
+                repairs = []
+
+        if not repairs:
+            self.parse_stats["clean"] += 1
+            return result
+        saved_tokens = usage.get("total_tokens", 0)
+        self.parse_stats["repaired"] += 1
+        self.parse_stats["saved_tokens"] += saved_tokens
+        print(f"🔧 Repaired LLM JSON ({', '.join(repairs)}) - {user_id}")
+        log_json_repair({
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "round": round_num,
+            "user_id": user_id,
+            "action_type": action_type,
+            "outcome": "repaired",
+            "repairs": "|".join(repairs),
+            "saved_tokens": saved_tokens,
+            "content": content,
+        })
+        return result
+
+    def _record_parse_failure(self, outcome, content, action_type, user_id, round_num):
+        self.parse_stats[outcome] += 1
+        log_json_repair({
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "round": round_num,
+            "user_id": user_id,
+            "action_type": action_type,
+            "outcome": outcome,
+            "content": content,
+        })
+
+    def parse_summary(self):
+        stats = dict(self.parse_stats)
+        total = stats["clean"] + stats["repaired"] + stats["retried"] + stats["failed"]
+        stats["repair_rate"] = stats["repaired"] / total if total else 0.0
+        stats["retry_rate"] = stats["retried"] / total if total else 0.0
+        return stats
+
+    async def _complete_batched(self, data, action_type, user_id, round_num, max_retries, expect_json_array=False):
+        for attempt in range(max_retries):
+            try:
+                entry = await asyncio.wrap_future(self.batch.submit(data, action_type, user_id, round_num))
+            except Exception as e:
+                print(f"💥 Batch request error (attempt {attempt + 1}/{max_retries}): {e}")
+                continue
+
+            response = (entry or {}).get("response") or {}
+            if response.get("status_code") != 200:
+                error = (entry or {}).get("error") or response.get("body") or "missing from batch output"
+                print(f"❌ Batch request failed (attempt {attempt + 1}/{max_retries}): {error}")
+                continue
+
+            response_data = response["body"]
+            content = response_data["choices"][0]["message"]["content"].strip()
+            usage = response_data.get("usage", {})
+            log_token_usage({
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "round": round_num,
+                "user_id": user_id,
+                "action_type": action_type,
+                "prompt_tokens": usage.get("prompt_tokens", 0),
+                "completion_tokens": usage.get("completion_tokens", 0),
+                "total_tokens": usage.get("total_tokens", 0),
+                "cached_tokens": cached_prompt_tokens(usage),
+                "model": response_data.get("model", data["model"]),
+                "source": "batch",
+            })
+
+            json_str = extract_json_str(content)
+            try:
+                result = self._parse_content(json_str, content, expect_json_array, action_type,
+                                             user_id, round_num, usage)
+                print(f"✅ Batch call successful - {user_id}")
+                print(f"{'='*80}\n")
+                return result, content, usage
+            except ValueError:
+                print(f"❌ JSON parsing failed, original content: {json_str[:200]}...")
+                if attempt == max_retries - 1:
+                    self._record_parse_failure("failed", content, action_type, user_id, round_num)
+                    return {"reason": json_str[:100], "error": "JSON parse failed"}, None, usage
+                self._record_parse_failure("retried", content, action_type, user_id, round_num)
+
+        print(f"❌ Batch call completely failed - {user_id}")
+        print(f"{'='*80}\n")
+        return {"reason": "API call failed after all retries", "error": "API failure"}, None, {}
+
+    async def _admit_and_send(self, send, endpoint, action_type, estimated_tokens):
+        priority = await self.scheduler.acquire(action_type)
+        try:
+            await self.rate_limiter.acquire(estimated_tokens)
+            await self.concurrency.acquire()
+            try:
+                response, endpoint, latency = await self.hedge.run(send, endpoint, self.router)
+            except (httpx.TimeoutException, httpx.TransportError):
+                await self.concurrency.release(False)
+                raise
+            except BaseException:
+                await self.concurrency.release(None)
+                raise
+            await self.concurrency.release(
+                response.status_code == 200 or not is_retryable_error(response.status_code, response.text)
+            )
+            return response, endpoint, latency
+        finally:
+            self.scheduler.release(priority)
+
+    async def _complete(self, data, action_type, user_id, round_num, max_retries, timeout, expect_json_array=False):
+        prompt_tokens = sum(count_tokens(m["content"]) for m in data["messages"])
+        estimated_tokens = prompt_tokens + LLM_COMPLETION_TOKEN_ESTIMATE
+
+        async def send(target, hedge):
+            if hedge:
+                await self.rate_limiter.acquire(estimated_tokens)
+            request_data = dict(data, model=target.model)
+            if self.streaming:
+                scanner = JSONStreamScanner(expect_json_array, action_type)
+                return await self.transport.stream_chat(request_data, timeout=timeout, base_url=target.base_url,
+                                                        scanner=scanner, prompt_tokens=prompt_tokens)
+            return await self.transport.post_chat(request_data, timeout=timeout, base_url=target.base_url)
+
+        for attempt in range(max_retries):
+            endpoint = self.router.choose()
+            started = time.monotonic()
+            try:
+                response, endpoint, latency = await self._admit_and_send(send, endpoint, action_type, estimated_tokens)
+                if response.status_code == 200:
+                    self.router.record_success(endpoint, latency)
+                    response_data = response.json()
+                    content = response_data["choices"][0]["message"]["content"].strip()
+                    usage = response_data.get("usage", {})
+
+                    if "usage" in response_data:
+                        self.rate_limiter.reconcile(estimated_tokens, usage.get("total_tokens", estimated_tokens))
+                        log_token_usage({
+                            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                            "round": round_num,
+                            "user_id": user_id,
+                            "action_type": action_type,
+                            "prompt_tokens": usage.get("prompt_tokens", 0),
+                            "completion_tokens": usage.get("completion_tokens", 0),
+                            "total_tokens": usage.get("total_tokens", 0),
+                            "cached_tokens": cached_prompt_tokens(usage),
+                            "model": endpoint.model,
+                        })
+
+                    json_str = response.scanner.json_text if self.streaming else extract_json_str(content)
+                    malformed = getattr(response, "malformed", False)
+                    if malformed:
+                        print(f"✂️ Stream cancelled early ({response.scanner.error}): {content[:200]}...")
+                        json_str = ""
+                    try:
+                        result = self._parse_content(json_str, content, expect_json_array, action_type,
+                                                     user_id, round_num, usage)
+                        print(f"✅ API call successful - {user_id}")
+                        print(f"{'='*80}\n")
+                        return result, content, usage
+                    except ValueError:
+                        print(f"❌ JSON parsing failed, original content: {content[:200]}...")
+                        if attempt < max_retries - 1:
+                            self._record_parse_failure("retried", content, action_type, user_id, round_num)
+                            if not malformed:
+                                print(f"⏳ Waiting before retry...")
+                                await asyncio.sleep(compute_retry_delay(attempt))
+                            continue
+                        else:
+                            self._record_parse_failure("failed", content, action_type, user_id, round_num)
+                            print(f"⚠️ All retries failed, returning original content as reason")
+                            return {"reason": json_str[:100] or content[:100], "error": "JSON parse failed"}, None, usage
+                else:
+                    print(f"❌ API error ({endpoint.model} @ {endpoint.base_url}): {response.text}")
+                    is_retryable = is_retryable_error(response.status_code, response.text)
+                    saturated = is_retryable and is_saturation_error(response.text)
+                    if is_retryable:
+                        self.router.record_failure(endpoint, latency, saturated=saturated)
+                    if attempt < max_retries - 1 and is_retryable:
+                        if saturated and self.router.has_alternative(endpoint):
+                            print(f"🔀 Endpoint saturated, failing over immediately...")
+                            continue
+                        print(f"⏳ Retryable error, waiting before retry...")
+                        await asyncio.sleep(compute_retry_delay(attempt))
+                        continue
+                    else:
+                        return {"reason": response.text[:200], "status": response.status_code, "error": "HTTP error"}, None, {}
+
+            except CircuitOpenError:
+                print(f"🔴 Circuit breaker open, failing fast - {user_id}")
+                print(f"{'='*80}\n")
+                return {"reason": "LLM circuit breaker open", "error": "Circuit open"}, None, {}
+
+            except httpx.TimeoutException:
+                self.router.record_failure(endpoint, time.monotonic() - started)
+                print(f"⏰ API call timeout (attempt {attempt + 1}/{max_retries})")
+                if attempt < max_retries - 1:
+                    print("⏳ Waiting before retry...")
+                    await asyncio.sleep(compute_retry_delay(attempt))
+                    continue
+
+            except httpx.TransportError:
+                self.router.record_failure(endpoint, time.monotonic() - started)
+                print(f"🔌 Connection error (attempt {attempt + 1}/{max_retries})")
+                if attempt < max_retries - 1:
+                    print("⏳ Waiting before retry...")
+                    await asyncio.sleep(compute_retry_delay(attempt))
+                    continue
+
+            except Exception as e:
+                print(f"💥 API call error: {e}")
+                if attempt < max_retries - 1:
+                    print("⏳ Waiting before retry...")
+                    await asyncio.sleep(compute_retry_delay(attempt))
+                    continue
+
+        print(f"❌ API call completely failed - {user_id}")
+        print(f"{'='*80}\n")
+        return {"reason": "API call failed after all retries", "error": "API failure"}, None, {}
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def set_default_client(client):
+    global _default_client
+    with _default_client_lock:
+        _default_client = client
+    return client
+
+
+def get_default_client():
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = AsyncLLMClient()
+        return _default_client
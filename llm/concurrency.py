@@ -0,0 +1,143 @@
+import asyncio
+import time
+from collections import deque
+
+from utils.config import (
+    LLM_MAX_CONCURRENCY, LLM_MIN_CONCURRENCY, LLM_INITIAL_CONCURRENCY,
+    LLM_AIMD_DECREASE_FACTOR, LLM_AIMD_DECREASE_INTERVAL,
+    LLM_BREAKER_WINDOW, LLM_BREAKER_MIN_CALLS, LLM_BREAKER_ERROR_THRESHOLD,
+    LLM_BREAKER_OPEN_SECONDS, LLM_BREAKER_MODE
+)
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+BREAKER_MODE_QUEUE = "queue"
+BREAKER_MODE_FAIL_FAST = "fail_fast"
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class AdaptiveConcurrencyController:
+    def __init__(self, max_limit=LLM_MAX_CONCURRENCY, min_limit=LLM_MIN_CONCURRENCY,
+                 initial_limit=LLM_INITIAL_CONCURRENCY, breaker_mode=LLM_BREAKER_MODE):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(max(self.min_limit, min(initial_limit, self.max_limit)))
+        self.breaker_mode = breaker_mode
+        self.breaker_state = BREAKER_CLOSED
+        self.in_flight = 0
+        self.successes = 0
+        self.overloads = 0
+        self.decreases = 0
+        self.breaker_trips = 0
+        self.rejected = 0
+        self._outcomes = deque(maxlen=LLM_BREAKER_WINDOW)
+        self._opened_at = 0.0
+        self._last_decrease = 0.0
+        self._probe_in_flight = False
+        self._condition = None
+        self._limit_listeners = []
+
+    def on_limit_increase(self, callback):
+        self._limit_listeners.append(callback)
+
+    def _get_condition(self):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _error_rate(self):
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for ok in self._outcomes if not ok) / len(self._outcomes)
+
+    def _can_admit(self):
+        if self.breaker_state == BREAKER_OPEN:
+            if time.monotonic() - self._opened_at < LLM_BREAKER_OPEN_SECONDS:
+                return False
+            self.breaker_state = BREAKER_HALF_OPEN
+            self._probe_in_flight = False
+        if self.breaker_state == BREAKER_HALF_OPEN:
+            return not self._probe_in_flight
+        return self.in_flight < int(self.limit)
+
+    async def acquire(self):
+        condition = self._get_condition()
+        async with condition:
+            while not self._can_admit():
+                if self.breaker_state == BREAKER_OPEN and self.breaker_mode == BREAKER_MODE_FAIL_FAST:
+                    self.rejected += 1
+                    raise CircuitOpenError("LLM circuit breaker is open")
+                if self.breaker_state == BREAKER_OPEN:
+                    remaining = LLM_BREAKER_OPEN_SECONDS - (time.monotonic() - self._opened_at)
+                    try:
+                        await asyncio.wait_for(condition.wait(), timeout=max(0.01, remaining))
+                    except asyncio.TimeoutError:
+                        pass
+                else:
+                    await condition.wait()
+            if self.breaker_state == BREAKER_HALF_OPEN:
+                self._probe_in_flight = True
+            self.in_flight += 1
+
+    async def release(self, ok):
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            if ok is not None:
+                self._record(ok)
+            elif self.breaker_state == BREAKER_HALF_OPEN:
+                self._probe_in_flight = False
+            condition.notify_all()
+
+    def _record(self, ok):
+        now = time.monotonic()
+        self._outcomes.append(ok)
+        if self.breaker_state == BREAKER_HALF_OPEN:
+            self._probe_in_flight = False
+            if ok:
+                self.breaker_state = BREAKER_CLOSED
+                self._outcomes.clear()
+                print(f"🟢 LLM circuit breaker closed")
+            else:
+                self._open(now)
+            return
+        if ok:
+            self.successes += 1
+            previous = int(self.limit)
+            self.limit = min(self.max_limit, self.limit + 1.0 / max(1.0, self.limit))
+            if int(self.limit) > previous:
+                for callback in self._limit_listeners:
+                    callback()
+            return
+        self.overloads += 1
+        if now - self._last_decrease >= LLM_AIMD_DECREASE_INTERVAL:
+            self.limit = max(self.min_limit, self.limit * LLM_AIMD_DECREASE_FACTOR)
+            self._last_decrease = now
+            self.decreases += 1
+        if (self.breaker_state == BREAKER_CLOSED and len(self._outcomes) >= LLM_BREAKER_MIN_CALLS
+                and self._error_rate() >= LLM_BREAKER_ERROR_THRESHOLD):
+            self._open(now)
+
+    def _open(self, now):
+        self.breaker_state = BREAKER_OPEN
+        self._opened_at = now
+        self.breaker_trips += 1
+        print(f"🔴 LLM circuit breaker opened (error rate {self._error_rate():.0%}), pausing for {LLM_BREAKER_OPEN_SECONDS:.0f}s")
+
+    def state(self):
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "breaker_state": self.breaker_state,
+            "error_rate": self._error_rate(),
+            "successes": self.successes,
+            "overloads": self.overloads,
+            "decreases": self.decreases,
+            "breaker_trips": self.breaker_trips,
+            "rejected": self.rejected,
+        }
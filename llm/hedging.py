@@ -0,0 +1,112 @@
+import asyncio
+import math
+import threading
+import time
+
+from utils.config import (
+    LLM_HEDGE_ENABLED, LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_DELAY,
+    LLM_HEDGE_MIN_SAMPLES, LLM_HEDGE_MAX_RATE
+)
+
+
+def latency_percentile(samples, percentile):
+    latencies = sorted(latency for latency, ok in samples if ok)
+    if not latencies:
+        return None
+    index = min(len(latencies) - 1, max(0, math.ceil(percentile / 100 * len(latencies)) - 1))
+    return latencies[index]
+
+
+class HedgePolicy:
+    def __init__(self, enabled=LLM_HEDGE_ENABLED, percentile=LLM_HEDGE_PERCENTILE, min_delay=LLM_HEDGE_MIN_DELAY,
+                 min_samples=LLM_HEDGE_MIN_SAMPLES, max_rate=LLM_HEDGE_MAX_RATE):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.max_rate = max_rate
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.over_budget = 0
+        self.no_alternative = 0
+        self._lock = threading.Lock()
+
+    def delay(self, endpoint):
+        if not self.enabled:
+            return None
+        samples = list(endpoint.samples)
+        if sum(1 for _, ok in samples if ok) < self.min_samples:
+            return None
+        return max(self.min_delay, latency_percentile(samples, self.percentile))
+
+    def _admit_hedge(self, endpoint, router):
+        if not router.has_alternative(endpoint):
+            with self._lock:
+                self.no_alternative += 1
+            return False
+        with self._lock:
+            if self.hedged + 1 > self.max_rate * self.calls:
+                self.over_budget += 1
+                return False
+            self.hedged += 1
+            return True
+
+    async def run(self, send, endpoint, router):
+        started = time.monotonic()
+        with self._lock:
+            self.calls += 1
+        delay = self.delay(endpoint)
+        if delay is None:
+            response = await send(endpoint, False)
+            return response, endpoint, time.monotonic() - started
+
+        primary = asyncio.ensure_future(send(endpoint, False))
+        racers = {primary: (endpoint, started)}
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not self._admit_hedge(endpoint, router):
+                response = await primary
+                return response, endpoint, time.monotonic() - started
+
+            backup_endpoint = router.choose(exclude={endpoint.key})
+            print(f"🪁 No response after {delay:.1f}s, hedging to {backup_endpoint.model} @ {backup_endpoint.base_url}")
+            backup = asyncio.ensure_future(send(backup_endpoint, True))
+            racers[backup] = (backup_endpoint, time.monotonic())
+
+            fallback = None
+            error = None
+            while racers:
+                done, _ = await asyncio.wait(racers, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    racer_endpoint, racer_started = racers.pop(task)
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    response = task.result()
+                    result = (response, racer_endpoint, time.monotonic() - racer_started)
+                    if response.status_code == 200:
+                        if task is backup:
+                            with self._lock:
+                                self.hedge_wins += 1
+                        return result
+                    fallback = result
+            if fallback is not None:
+                return fallback
+            raise error
+        finally:
+            for task in racers:
+                task.cancel()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "calls": self.calls,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "over_budget": self.over_budget,
+                "no_alternative": self.no_alternative,
+                "hedge_rate": self.hedged / self.calls if self.calls else 0.0,
+                "win_rate": self.hedge_wins / self.hedged if self.hedged else 0.0,
+            }
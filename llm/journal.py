@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import threading
+from collections import defaultdict, deque
+from datetime import datetime
+
+from utils.config import OUTPUT_DIR, LLM_JOURNAL_MODE, LLM_JOURNAL_JSONL
+
+JOURNAL_OFF = "off"
+JOURNAL_RECORD = "record"
+JOURNAL_REPLAY = "replay"
+JOURNAL_MODES = (JOURNAL_OFF, JOURNAL_RECORD, JOURNAL_REPLAY)
+
+
+def _prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class CallJournal:
+    def __init__(self, path=None, mode=LLM_JOURNAL_MODE, forward=False):
+        if mode not in JOURNAL_MODES:
+            raise ValueError(f"Unknown journal mode: {mode} (expected one of {JOURNAL_MODES})")
+        self.path = path or os.path.join(OUTPUT_DIR, LLM_JOURNAL_JSONL)
+        self.mode = mode
+        self.forward = forward
+        self.recorded = 0
+        self.replayed = 0
+        self.replay_misses = 0
+        self.prompt_mismatches = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._streams = None
+        self._forwarded = []
+
+    @property
+    def enabled(self):
+        return self.mode != JOURNAL_OFF
+
+    @property
+    def recording(self):
+        return self.mode == JOURNAL_RECORD
+
+    @property
+    def replaying(self):
+        return self.mode == JOURNAL_REPLAY
+
+    def record(self, round_num, user_id, action_type, model, prompt, result, content=None, usage=None):
+        if not self.recording:
+            return
+        entry = {
+            "timestamp": datetime.now().isoformat(),
+            "round": round_num,
+            "user_id": user_id,
+            "action_type": action_type,
+            "model": model,
+            "prompt_hash": _prompt_hash(prompt),
+            "prompt": prompt,
+            "response": content,
+            "usage": usage or {},
+            "result": result,
+        }
+        if self.forward:
+            with self._lock:
+                self._forwarded.append(entry)
+            return
+        self.write_entry(entry)
+
+    def write_entry(self, entry):
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            entry["seq"] = self.recorded
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+            self.recorded += 1
+
+    def take_forwarded(self):
+        with self._lock:
+            entries, self._forwarded = self._forwarded, []
+            return entries
+
+    def absorb(self, counts):
+        with self._lock:
+            self.replayed += counts.get("replayed", 0)
+            self.replay_misses += counts.get("replay_misses", 0)
+            self.prompt_mismatches += counts.get("prompt_mismatches", 0)
+
+    def _load(self):
+        streams = defaultdict(deque)
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    key = (str(entry.get("round", "")), entry.get("user_id", ""), entry.get("action_type", ""))
+                    streams[key].append(entry)
+        else:
+            print(f"⚠️ Replay journal not found: {self.path}")
+        return streams
+
+    def replay(self, round_num, user_id, action_type, prompt):
+        with self._lock:
+            if self._streams is None:
+                self._streams = self._load()
+            stream = self._streams.get((str(round_num), user_id, action_type))
+            if not stream:
+                self.replay_misses += 1
+                print(f"⚠️ Replay journal has no entry for {user_id} ({action_type}, round {round_num})")
+                return {"reason": "No recorded response in replay journal", "error": "Replay miss"}
+            entry = stream.popleft()
+            self.replayed += 1
+            if entry.get("prompt_hash") != _prompt_hash(prompt):
+                self.prompt_mismatches += 1
+            return entry.get("result")
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "recorded": self.recorded,
+            "replayed": self.replayed,
+            "replay_misses": self.replay_misses,
+            "prompt_mismatches": self.prompt_mismatches,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,194 @@
+import json
+import re
+
+from utils.config import ACTION_TYPES
+
+_FENCE_RE = re.compile(r"```(?:json)?", re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_NUMBER_RE = re.compile(r"[-+]?\d+(?:\.\d+)?")
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _balanced_spans(text, opener):
+    spans = []
+    i = 0
+    while i < len(text):
+        if text[i] != opener:
+            i += 1
+            continue
+        stack = []
+        quote = None
+        escape = False
+        end = None
+        for j in range(i, len(text)):
+            ch = text[j]
+            if quote:
+                if escape:
+                    escape = False
+                elif ch == "\\":
+                    escape = True
+                elif ch == quote:
+                    quote = None
+            elif ch in "\"'":
+                quote = ch
+            elif ch in _CLOSERS:
+                stack.append(_CLOSERS[ch])
+            elif ch in "}]":
+                if not stack or stack.pop() != ch:
+                    break
+                if not stack:
+                    end = j + 1
+                    break
+        if end is None:
+            i += 1
+            continue
+        spans.append(text[i:end])
+        i = end
+    return spans
+
+
+def _normalize_quotes(text):
+    out = []
+    quote = None
+    escape = False
+    word = ""
+    for ch in text:
+        if quote:
+            if escape:
+                escape = False
+                out.append("'" if ch == "'" and quote == "'" else "\\" + ch)
+                continue
+            if ch == "\\":
+                escape = True
+                continue
+            if ch == quote:
+                quote = None
+                out.append('"')
+            elif ch == '"' and quote == "'":
+                out.append('\\"')
+            else:
+                out.append(ch)
+            continue
+        if ch.isalpha():
+            word += ch
+            continue
+        if word:
+            out.append(_LITERALS.get(word, word))
+            word = ""
+        if ch in "\"'":
+            quote = ch
+            out.append('"')
+        else:
+            out.append(ch)
+    if word:
+        out.append(_LITERALS.get(word, word))
+    return "".join(out)
+
+
+def _loads_candidate(candidate, repairs):
+    try:
+        return json.loads(candidate)
+    except json.JSONDecodeError:
+        pass
+    fixed = _normalize_quotes(candidate)
+    if fixed != candidate:
+        repairs.append("quotes")
+    stripped = _TRAILING_COMMA_RE.sub(r"\1", fixed)
+    if stripped != fixed:
+        repairs.append("trailing_commas")
+    return json.loads(stripped)
+
+
+def _to_int(value, low, high):
+    if isinstance(value, bool):
+        raise ValueError(f"not a number: {value}")
+    if isinstance(value, (int, float)):
+        number = value
+    else:
+        match = _NUMBER_RE.search(str(value))
+        if not match:
+            raise ValueError(f"not a number: {value}")
+        number = float(match.group())
+    return max(low, min(high, int(round(number))))
+
+
+def _coerce_actions(actions, repairs):
+    if isinstance(actions, dict):
+        actions = [actions]
+        repairs.append("actions_list")
+    if not isinstance(actions, list):
+        raise ValueError("actions is not a list")
+    coerced = []
+    for action in actions:
+        if isinstance(action, str):
+            action = {"type": action}
+            repairs.append("action_strings")
+        if not isinstance(action, dict):
+            continue
+        action_type = str(action.get("type", "")).strip().lower()
+        if action_type not in ACTION_TYPES:
+            repairs.append("dropped_actions")
+            continue
+        if action_type != action.get("type"):
+            action = dict(action, type=action_type)
+            repairs.append("action_types")
+        coerced.append(action)
+    if not coerced and actions:
+        raise ValueError("no valid actions")
+    return coerced
+
+
+def _coerce_field(container, key, low, high, repairs):
+    if not isinstance(container, dict) or key not in container:
+        return
+    value = _to_int(container[key], low, high)
+    if value != container[key] or not isinstance(container[key], int):
+        container[key] = value
+        repairs.append(key)
+
+
+def coerce_schema(value, action_type):
+    repairs = []
+    if action_type in ("interaction_decision", "fused_turn"):
+        if isinstance(value, list):
+            value = {"actions": value}
+            repairs.append("actions_wrapped")
+        if isinstance(value, dict) and "actions" in value:
+            value["actions"] = _coerce_actions(value["actions"], repairs)
+    if action_type == "environment_evaluation":
+        _coerce_field(value, "score", 1, 10, repairs)
+    if action_type == "stance_adjustment":
+        _coerce_field(value, "new_stance", -2, 2, repairs)
+    if action_type == "fused_turn" and isinstance(value, dict):
+        _coerce_field(value.get("evaluation"), "score", 1, 10, repairs)
+        _coerce_field(value.get("stance"), "new_stance", -2, 2, repairs)
+    return value, repairs
+
+
+def repair_json(text, expect_array=False, action_type="unknown"):
+    repairs = []
+    body = _FENCE_RE.sub("", text).strip()
+    if body != text.strip():
+        repairs.append("fences")
+
+    opener = "[" if expect_array else "{"
+    candidates = sorted(_balanced_spans(body, opener), key=len, reverse=True)
+    if opener == "{" and action_type in ("interaction_decision", "fused_turn"):
+        lists = sorted(_balanced_spans(body, "["), key=len, reverse=True)
+        if lists and (not candidates or body.index(lists[0]) < body.index(candidates[0])):
+            candidates = lists + candidates
+    if not candidates:
+        raise ValueError("no balanced JSON value found")
+    if candidates[0] != body:
+        repairs.append("extracted")
+
+    for candidate in candidates:
+        candidate_repairs = list(repairs)
+        try:
+            value = _loads_candidate(candidate, candidate_repairs)
+        except json.JSONDecodeError:
+            continue
+        value, schema_repairs = coerce_schema(value, action_type)
+        return value, list(dict.fromkeys(candidate_repairs + schema_repairs))
+    raise ValueError("no candidate could be parsed")
@@ -0,0 +1,96 @@
+import asyncio
+import multiprocessing
+import time
+
+from utils.config import (
+    LLM_RPM_LIMIT, LLM_TPM_LIMIT, LLM_RATE_LIMIT_HEADROOM
+)
+
+_REQUESTS = 0
+_TOKENS = 1
+_LAST_REFILL = 2
+_ADMITTED = 3
+_THROTTLED = 4
+_WAIT_SECONDS = 5
+_TOKENS_CHARGED = 6
+
+
+class TokenBucketRateLimiter:
+    def __init__(self, requests_per_minute=LLM_RPM_LIMIT, tokens_per_minute=LLM_TPM_LIMIT,
+                 headroom=LLM_RATE_LIMIT_HEADROOM):
+        self.request_capacity = (requests_per_minute or 0) * headroom
+        self.token_capacity = (tokens_per_minute or 0) * headroom
+        self.request_rate = self.request_capacity / 60.0
+        self.token_rate = self.token_capacity / 60.0
+        self._lock = multiprocessing.Lock()
+        self._state = multiprocessing.RawArray('d', 7)
+        self._state[_REQUESTS] = self.request_capacity
+        self._state[_TOKENS] = self.token_capacity
+        self._state[_LAST_REFILL] = time.time()
+
+    @property
+    def enabled(self):
+        return self.request_capacity > 0 or self.token_capacity > 0
+
+    def _refill(self, now):
+        elapsed = max(0.0, now - self._state[_LAST_REFILL])
+        self._state[_LAST_REFILL] = now
+        if self.request_capacity > 0:
+            self._state[_REQUESTS] = min(self.request_capacity, self._state[_REQUESTS] + elapsed * self.request_rate)
+        if self.token_capacity > 0:
+            self._state[_TOKENS] = min(self.token_capacity, self._state[_TOKENS] + elapsed * self.token_rate)
+
+    def try_acquire(self, tokens):
+        if not self.enabled:
+            return 0.0
+        tokens = min(tokens, self.token_capacity) if self.token_capacity > 0 else 0
+        with self._lock:
+            self._refill(time.time())
+            wait = 0.0
+            if self.request_capacity > 0 and self._state[_REQUESTS] < 1:
+                wait = max(wait, (1 - self._state[_REQUESTS]) / self.request_rate)
+            if self.token_capacity > 0 and self._state[_TOKENS] < tokens:
+                wait = max(wait, (tokens - self._state[_TOKENS]) / self.token_rate)
+            if wait > 0:
+                return wait
+            if self.request_capacity > 0:
+                self._state[_REQUESTS] -= 1
+            if self.token_capacity > 0:
+                self._state[_TOKENS] -= tokens
+            self._state[_ADMITTED] += 1
+            self._state[_TOKENS_CHARGED] += tokens
+            return 0.0
+
+    async def acquire(self, tokens):
+        throttled = False
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return
+            if not throttled:
+                throttled = True
+                with self._lock:
+                    self._state[_THROTTLED] += 1
+            with self._lock:
+                self._state[_WAIT_SECONDS] += wait
+            await asyncio.sleep(wait)
+
+    def reconcile(self, estimated_tokens, actual_tokens):
+        if self.token_capacity <= 0:
+            return
+        estimated_tokens = min(estimated_tokens, self.token_capacity)
+        with self._lock:
+            self._refill(time.time())
+            self._state[_TOKENS] -= actual_tokens - estimated_tokens
+            self._state[_TOKENS_CHARGED] += actual_tokens - estimated_tokens
+
+    def stats(self):
+        with self._lock:
+            return {
+                "admitted": int(self._state[_ADMITTED]),
+                "throttled": int(self._state[_THROTTLED]),
+                "wait_seconds": self._state[_WAIT_SECONDS],
+                "tokens_charged": int(self._state[_TOKENS_CHARGED]),
+                "requests_available": self._state[_REQUESTS],
+                "tokens_available": self._state[_TOKENS],
+            }
@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import deque
+
+from utils.config import (
+    API_BASE_URL, API_FALLBACK_BASE_URLS, FALLBACK_MODELS,
+    LLM_ROUTER_WINDOW, LLM_ROUTER_PRIOR_LATENCY, LLM_ROUTER_ERROR_PENALTY,
+    LLM_ROUTER_SATURATION_COOLDOWN
+)
+
+
+class Endpoint:
+    def __init__(self, base_url, model, order=0):
+        self.base_url = base_url
+        self.model = model
+        self.order = order
+        self.samples = deque(maxlen=LLM_ROUTER_WINDOW)
+        self.cooldown_until = 0.0
+        self.calls = 0
+        self.failures = 0
+        self.saturations = 0
+
+    @property
+    def key(self):
+        return f"{self.base_url}|{self.model}"
+
+    def mean_latency(self):
+        latencies = [latency for latency, ok in self.samples if ok]
+        if not latencies:
+            return LLM_ROUTER_PRIOR_LATENCY
+        return sum(latencies) / len(latencies)
+
+    def error_rate(self):
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def score(self):
+        return self.mean_latency() * (1 + LLM_ROUTER_ERROR_PENALTY * self.error_rate())
+
+    def is_cooling_down(self, now):
+        return now < self.cooldown_until
+
+
+class EndpointRouter:
+    def __init__(self, base_urls=None, models=None):
+        base_urls = base_urls or [API_BASE_URL] + list(API_FALLBACK_BASE_URLS)
+        models = models or list(FALLBACK_MODELS)
+        self.endpoints = []
+        for base_url in base_urls:
+            for model in models:
+                self.endpoints.append(Endpoint(base_url, model, order=len(self.endpoints)))
+        self._lock = threading.Lock()
+
+    @property
+    def primary(self):
+        return self.endpoints[0]
+
+    def choose(self, exclude=()):
+        now = time.time()
+        with self._lock:
+            candidates = [e for e in self.endpoints if e.key not in exclude] or list(self.endpoints)
+            available = [e for e in candidates if not e.is_cooling_down(now)]
+            if not available:
+                return min(candidates, key=lambda e: (e.cooldown_until, e.order))
+            return min(available, key=lambda e: (e.score(), e.order))
+
+    def has_alternative(self, endpoint):
+        now = time.time()
+        with self._lock:
+            return any(e is not endpoint and not e.is_cooling_down(now) for e in self.endpoints)
+
+    def record_success(self, endpoint, latency):
+        with self._lock:
+            endpoint.calls += 1
+            endpoint.samples.append((latency, True))
+
+    def record_failure(self, endpoint, latency, saturated=False):
+        with self._lock:
+            endpoint.calls += 1
+            endpoint.failures += 1
+            endpoint.samples.append((latency, False))
+            if saturated:
+                endpoint.saturations += 1
+                endpoint.cooldown_until = time.time() + LLM_ROUTER_SATURATION_COOLDOWN
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    "base_url": e.base_url,
+                    "model": e.model,
+                    "calls": e.calls,
+                    "failures": e.failures,
+                    "saturations": e.saturations,
+                    "mean_latency": e.mean_latency(),
+                    "error_rate": e.error_rate(),
+                    "cooling_down": e.is_cooling_down(now),
+                }
+                for e in self.endpoints
+            ]
@@ -0,0 +1,107 @@
+import asyncio
+import heapq
+import itertools
+
+from utils.config import (
+    LLM_SCHEDULER_ENABLED, LLM_PRIORITY_CLASSES, LLM_PRIORITY_ORDER, LLM_PRIORITY_SHARES
+)
+
+
+class PriorityScheduler:
+    def __init__(self, capacity, enabled=LLM_SCHEDULER_ENABLED, classes=None, order=None, shares=None):
+        self.capacity = capacity
+        self.enabled = enabled
+        self.classes = dict(LLM_PRIORITY_CLASSES if classes is None else classes)
+        self.order = list(LLM_PRIORITY_ORDER if order is None else order)
+        self.shares = dict(LLM_PRIORITY_SHARES if shares is None else shares)
+        self.active = {name: 0 for name in self.order}
+        self.waiting = {name: 0 for name in self.order}
+        self.admitted = {name: 0 for name in self.order}
+        self.queued = {name: 0 for name in self.order}
+        self.wait_seconds = {name: 0.0 for name in self.order}
+        self._heap = []
+        self._seq = itertools.count()
+
+    def class_of(self, action_type):
+        return self.classes.get(action_type, self.order[-1])
+
+    def _rank(self, name):
+        return self.order.index(name)
+
+    def _limit(self):
+        return max(1, int(self.capacity()))
+
+    def _share_cap(self, name):
+        return max(1, int(self.shares.get(name, 1.0) * self._limit()))
+
+    def _higher_priority_busy(self, name):
+        return any(self.active[other] or self.waiting[other] for other in self.order[:self._rank(name)])
+
+    def _admissible(self, name):
+        if sum(self.active.values()) >= self._limit():
+            return False
+        return self.active[name] < self._share_cap(name) or not self._higher_priority_busy(name)
+
+    def _dispatch(self):
+        deferred = []
+        while self._heap and sum(self.active.values()) < self._limit():
+            entry = heapq.heappop(self._heap)
+            _, _, name, future = entry
+            if future.done():
+                continue
+            if not self._admissible(name):
+                deferred.append(entry)
+                continue
+            self.waiting[name] -= 1
+            self.active[name] += 1
+            future.set_result(None)
+        for entry in deferred:
+            heapq.heappush(self._heap, entry)
+
+    async def acquire(self, action_type):
+        name = self.class_of(action_type)
+        if not self.enabled:
+            return name
+        self.admitted[name] += 1
+        if (not self._heap or self._heap[0][0] > self._rank(name)) and self._admissible(name):
+            self.active[name] += 1
+            return name
+
+        self.queued[name] += 1
+        self.waiting[name] += 1
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._heap, (self._rank(name), next(self._seq), name, future))
+        started = loop.time()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(name)
+            else:
+                self.waiting[name] -= 1
+            raise
+        finally:
+            self.wait_seconds[name] += loop.time() - started
+        return name
+
+    def release(self, name):
+        if not self.enabled:
+            return
+        self.active[name] -= 1
+        self._dispatch()
+
+    def wake(self):
+        if self.enabled:
+            self._dispatch()
+
+    def stats(self):
+        return {
+            name: {
+                "admitted": self.admitted[name],
+                "queued": self.queued[name],
+                "wait_seconds": self.wait_seconds[name],
+                "share": self.shares.get(name, 1.0),
+            }
+            for name in self.order
+        }
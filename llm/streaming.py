@@ -0,0 +1,172 @@
+import json
+import re
+
+from utils.config import ACTION_TYPES, LLM_STREAM_MAX_CHARS, LLM_STREAM_MAX_PREAMBLE
+from llm.tokenizer import count_tokens
+
+STREAM_PENDING = "pending"
+STREAM_COMPLETE = "complete"
+STREAM_MALFORMED = "malformed"
+
+REQUIRED_KEYS = {
+    "post_creation": ("content",),
+    "interaction_decision": ("actions",),
+    "environment_evaluation": ("score",),
+    "stance_adjustment": ("new_stance",),
+    "fused_turn": ("actions", "evaluation"),
+}
+ACTION_SCHEMA_TYPES = ("interaction_decision", "fused_turn")
+
+_CLOSERS = {"{": "}", "[": "]"}
+_ACTION_TYPE_RE = re.compile(r'"type"\s*:\s*"([^"\\]*)"')
+
+
+class JSONStreamScanner:
+    def __init__(self, expect_array=False, action_type="unknown", max_chars=LLM_STREAM_MAX_CHARS,
+                 max_preamble=LLM_STREAM_MAX_PREAMBLE):
+        self.opener = "[" if expect_array else "{"
+        self.action_type = action_type
+        self.max_chars = max_chars
+        self.max_preamble = max_preamble
+        self.text = ""
+        self.start = None
+        self.end = None
+        self.state = STREAM_PENDING
+        self.error = ""
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._checked_types = 0
+
+    @property
+    def json_text(self):
+        if self.start is None:
+            return ""
+        return self.text[self.start:self.end]
+
+    def feed(self, chunk):
+        if self.state != STREAM_PENDING:
+            return self.state
+        self.text += chunk
+        while self._pos < len(self.text):
+            ch = self.text[self._pos]
+            if self.start is None:
+                if ch in _CLOSERS:
+                    if ch != self.opener:
+                        return self._fail(f"expected '{self.opener}' but response starts with '{ch}'")
+                    self.start = self._pos
+                    self._stack.append(ch)
+                elif self._pos >= self.max_preamble:
+                    return self._fail(f"no JSON after {self.max_preamble} characters")
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in _CLOSERS:
+                self._stack.append(ch)
+            elif ch in "}]":
+                if not self._stack or _CLOSERS[self._stack[-1]] != ch:
+                    return self._fail(f"unbalanced '{ch}'")
+                self._stack.pop()
+                if not self._stack:
+                    self.end = self._pos + 1
+                    return self._finish()
+            self._pos += 1
+
+        if self.action_type in ACTION_SCHEMA_TYPES and self.start is not None:
+            for match in list(_ACTION_TYPE_RE.finditer(self.text, self.start))[self._checked_types:]:
+                self._checked_types += 1
+                if match.group(1) not in ACTION_TYPES:
+                    return self._fail(f"unknown action type '{match.group(1)}'")
+        if len(self.text) > self.max_chars:
+            return self._fail(f"no complete JSON within {self.max_chars} characters")
+        return self.state
+
+    def _finish(self):
+        try:
+            value = json.loads(self.json_text)
+        except json.JSONDecodeError as e:
+            return self._fail(f"invalid JSON ({e.msg})")
+        if isinstance(value, dict):
+            missing = [key for key in REQUIRED_KEYS.get(self.action_type, ()) if key not in value]
+            if missing:
+                return self._fail(f"missing keys {missing}")
+            if self.action_type in ACTION_SCHEMA_TYPES:
+                actions = value["actions"]
+                if not isinstance(actions, list) or not all(isinstance(a, dict) and a.get("type") in ACTION_TYPES
+                                                            for a in actions):
+                    return self._fail("actions do not match the action schema")
+        self.state = STREAM_COMPLETE
+        return self.state
+
+    def _fail(self, error):
+        self.state = STREAM_MALFORMED
+        self.error = error
+        return self.state
+
+
+class StreamedCompletion:
+    status_code = 200
+
+    def __init__(self, content, usage, model=None, scanner=None):
+        self.content = content
+        self.usage = usage
+        self.model = model
+        self.scanner = scanner
+
+    @property
+    def text(self):
+        return self.content
+
+    @property
+    def malformed(self):
+        return self.scanner is not None and self.scanner.state == STREAM_MALFORMED
+
+    def json(self):
+        response_data = {"choices": [{"message": {"role": "assistant", "content": self.content}}]}
+        if self.usage:
+            response_data["usage"] = self.usage
+        if self.model:
+            response_data["model"] = self.model
+        return response_data
+
+
+async def read_chat_stream(response, scanner=None, prompt_tokens=0):
+    parts = []
+    usage = {}
+    model = None
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        payload = line[5:].strip()
+        if payload == "[DONE]":
+            break
+        chunk = json.loads(payload)
+        model = chunk.get("model", model)
+        if chunk.get("usage"):
+            usage = chunk["usage"]
+        stop = False
+        for choice in chunk.get("choices") or []:
+            delta = (choice.get("delta") or {}).get("content")
+            if delta:
+                parts.append(delta)
+                if scanner is not None and scanner.feed(delta) != STREAM_PENDING:
+                    stop = True
+        if stop:
+            break
+
+    content = "".join(parts)
+    if not usage:
+        completion_tokens = count_tokens(content)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+    return StreamedCompletion(content, usage, model, scanner)
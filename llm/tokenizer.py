@@ -0,0 +1,106 @@
+import math
+import re
+import threading
+from functools import lru_cache
+
+from utils.config import LLM_TOKENIZER, LLM_TOKENIZER_ENCODING, LLM_TOKENIZER_CALIBRATION
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_PIECE_RE = re.compile(r"[\u4e00-\u9fff]|[A-Za-z]+|\d+| +|\t+|[^\sA-Za-z\d\u4e00-\u9fff]+")
+
+
+class HeuristicTokenizer:
+    name = "heuristic"
+
+    def __init__(self, calibration=LLM_TOKENIZER_CALIBRATION):
+        self.calibration = calibration
+
+    def _piece_tokens(self, piece):
+        first = piece[0]
+        if "\u4e00" <= first <= "\u9fff":
+            return 1.0
+        if first.isalpha():
+            return 1.0 if len(piece) <= 8 else math.ceil(len(piece) / 6)
+        if first.isdigit():
+            return math.ceil(len(piece) / 3)
+        if first in " \t":
+            return 0.0 if len(piece) == 1 else 1.0
+        return math.ceil(len(piece) / 2)
+
+    def count_line(self, line):
+        return sum(self._piece_tokens(piece) for piece in _PIECE_RE.findall(line)) * self.calibration
+
+    def truncate_line(self, line, max_tokens):
+        total = 0.0
+        for match in _PIECE_RE.finditer(line):
+            total += self._piece_tokens(match.group()) * self.calibration
+            if total > max_tokens:
+                return line[:match.start()]
+        return line
+
+
+class TiktokenTokenizer:
+    name = "tiktoken"
+
+    def __init__(self, encoding_name=LLM_TOKENIZER_ENCODING):
+        self.encoding = tiktoken.get_encoding(encoding_name)
+
+    def count_line(self, line):
+        return len(self.encoding.encode(line, disallowed_special=()))
+
+    def truncate_line(self, line, max_tokens):
+        tokens = self.encoding.encode(line, disallowed_special=())
+        return self.encoding.decode(tokens[:max(0, int(max_tokens))])
+
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+
+def get_tokenizer():
+    global _tokenizer
+    with _tokenizer_lock:
+        if _tokenizer is None:
+            _tokenizer = _create_tokenizer(LLM_TOKENIZER)
+        return _tokenizer
+
+
+def _create_tokenizer(kind):
+    if kind in ("auto", "tiktoken") and tiktoken is not None:
+        try:
+            return TiktokenTokenizer()
+        except Exception as e:
+            print(f"⚠️ tiktoken encoding '{LLM_TOKENIZER_ENCODING}' unavailable ({e}), using heuristic token counts")
+    elif kind == "tiktoken":
+        print("⚠️ tiktoken is not installed, using heuristic token counts")
+    return HeuristicTokenizer()
+
+
+@lru_cache(maxsize=16384)
+def _count_line(line):
+    return get_tokenizer().count_line(line)
+
+
+def count_tokens(text: str) -> int:
+    lines = text.split("\n")
+    return int(round(sum(_count_line(line) for line in lines) + len(lines) - 1))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, suffix: str = "") -> str:
+    if count_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens - (count_tokens(suffix) if suffix else 0)
+    lines = text.split("\n")
+    used = 0.0
+    for i, line in enumerate(lines):
+        line_tokens = _count_line(line) + (1 if i else 0)
+        if used + line_tokens > budget:
+            partial = get_tokenizer().truncate_line(line, budget - used - (1 if i else 0))
+            kept = lines[:i] + ([partial] if partial else [])
+            return "\n".join(kept) + suffix
+        used += line_tokens
+    return text
@@ -0,0 +1,66 @@
+import httpx
+
+from llm.streaming import read_chat_stream
+
+from utils.config import (
+    API_KEY, API_BASE_URL,
+    LLM_POOL_SIZE, LLM_KEEPALIVE_EXPIRY, LLM_HTTP2
+)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class HTTPTransport:
+    def __init__(self, api_key=API_KEY, base_url=API_BASE_URL, pool_size=LLM_POOL_SIZE,
+                 keepalive_expiry=LLM_KEEPALIVE_EXPIRY, http2=LLM_HTTP2):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.pool_size = max(1, pool_size)
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = bool(http2) and HTTP2_AVAILABLE
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None:
+            self._session = httpx.AsyncClient(
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                },
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size,
+                    keepalive_expiry=self.keepalive_expiry
+                ),
+                http2=self.http2
+            )
+        return self._session
+
+    async def post_chat(self, data, timeout=60, base_url=None):
+        return await self._get_session().post(
+            f"{base_url or self.base_url}/chat/completions",
+            json=data,
+            timeout=timeout
+        )
+
+    async def stream_chat(self, data, timeout=60, base_url=None, scanner=None, prompt_tokens=0):
+        request_data = dict(data, stream=True, stream_options={"include_usage": True})
+        async with self._get_session().stream(
+            "POST",
+            f"{base_url or self.base_url}/chat/completions",
+            json=request_data,
+            timeout=timeout
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                return response
+            return await read_chat_stream(response, scanner, prompt_tokens)
+
+    async def aclose(self):
+        if self._session is not None:
+            await self._session.aclose()
+            self._session = None
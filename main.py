@@ -1,9 +1,14 @@
-import random
+import argparse
+import sys
 import time
 import os
 import json
 from models.social_network import SocialNetwork
+from models.round_engine import RoundEngine, RoundFinalizer, run_agent_turns
+from models.sharding import ShardCoordinator
 from agents.social_agent import SocialAgent
+from agents.decision_groups import DecisionGrouper
+from utils.seeding import set_run_seed, rng_stream
 from utils.logger import (
     load_profiles, 
     set_output_directory
@@ -11,24 +16,45 @@ from utils.logger import (
 from utils.config import (
     TOTAL_ROUNDS, KEY_ROUNDS, SERVERS, PROFILES_FILE,
     OUTPUT_DIR, FINAL_STATISTICS_TXT, FINAL_PROFILES_JSON,
-    NETWORK_ANALYSIS_PREFIX
+    NETWORK_ANALYSIS_PREFIX, SIMULATION_SEED, ROUND_PIPELINE_ENABLED, MAX_AGENTS
 )
+from llm.client import get_default_client
 
 
-def main():
+def finalize_round(network, agents, round_num, output_dir):
+    if round_num in KEY_ROUNDS:
+        print(f"\n=== Round {round_num} Analysis ===")
+        
+        network.visualize_network(round_num, output_dir, agents)
+        
+        network.analyze_network_metrics(round_num, output_dir, agents)
+        
+        print(f"- Round {round_num} network graph saved to '{output_dir}/social_network_round_{round_num}.png'")
+        print(f"- Round {round_num} analysis results saved to '{output_dir}/network_analysis_round_{round_num}.txt'")
+    
+    network.save_network_state(round_num)
+
+
+def main(resume=None):
     output_dir = OUTPUT_DIR
     os.makedirs(output_dir, exist_ok=True)
     
     set_output_directory(output_dir)
     
+    run_seed = set_run_seed(SIMULATION_SEED)
+    print(f"🎲 Run seed: {run_seed}")
+    
     network = SocialNetwork()
     profiles = load_profiles(PROFILES_FILE)
+    if MAX_AGENTS is not None:
+        profiles = profiles[:MAX_AGENTS]
     
     latest_round = network.get_latest_saved_round()
     if latest_round is not None:
         print(f"\nFound saved state: Round {latest_round}")
-        choice = input("Continue from saved state? (y/n): ").lower()
-        if choice == 'y':
+        if resume is None and sys.stdin.isatty():
+            resume = input("Continue from saved state? (y/n): ").lower() == 'y'
+        if resume:
             if network.load_network_state(latest_round):
                 start_round = latest_round + 1
                 print(f"Will continue from round {start_round}")
@@ -42,12 +68,22 @@ def main():
         print("No saved state found, starting from beginning")
         start_round = 1
     
+    llm_client = get_default_client()
+    decision_grouper = DecisionGrouper(llm_client)
+    round_engine = RoundEngine(network)
+    round_finalizer = RoundFinalizer()
+    if round_engine.enabled:
+        print("🧊 Round engine on: agents in a phase see the network as it was when the phase started, "
+              "not each other's actions (ROUND_ENGINE_ENABLED = False restores live feeds)")
+    
     agents = []
     for i, profile in enumerate(profiles):
         initial_server = SERVERS[i % 3]
-        agent = SocialAgent(profile, i, network, initial_server)
+        agent = SocialAgent(profile, i, network, initial_server, llm_client=llm_client)
         agents.append(agent)
     
+    shard_coordinator = ShardCoordinator(network, agents, round_engine, llm_client, grouper=decision_grouper).start()
+    
     if start_round == 1:
         print("\n=== Initial Server Distribution ===")
         server_stats = {'A': 0, 'B': 0, 'C': 0}
@@ -61,6 +97,7 @@ def main():
         
         for agent in agents:
             agent.current_round = round_num
+        llm_client.governor.start_round(round_num)
         
         server_stats = {'A': 0, 'B': 0, 'C': 0}
         for agent in agents:
@@ -71,24 +108,58 @@ def main():
         
         min_posters = 3
         max_posters = max(min_posters + 1, len(agents) // 4)
-        num_posters = random.randint(min_posters, max_posters)
+        poster_rng = rng_stream(round_num, "posters")
+        num_posters = poster_rng.randint(min_posters, max_posters)
         
-        posters = random.sample(agents, num_posters)
+        posters = poster_rng.sample(agents, num_posters)
         print(f"\nThis round will have {num_posters} users posting (out of {len(agents)} total)")
         
-        for agent in posters:
-            agent.create_post()
+        if shard_coordinator.enabled:
+            shard_coordinator.run_phase("post", posters, round_num)
+        else:
+            round_engine.run_phase(posters, lambda agent: agent.create_post(),
+                                   lambda items, turn: run_agent_turns(items, turn, batch=llm_client.batch,
+                                                                       label=f"round{round_num}_posts"))
         
-        active_users = set()
         poster_ids = {agent.user_id for agent in posters}
-        for agent in agents:
-            before = len(network.graph.edges())
+        
+        interacting_agents = llm_client.governor.sample_agents(agents)
+        if len(interacting_agents) < len(agents):
+            print(f"\n💸 Token budget: {len(interacting_agents)} of {len(agents)} users interact this round")
+        
+        decisions = {}
+        if decision_grouper.enabled and not shard_coordinator.enabled:
+            groups = decision_grouper.group(interacting_agents, round_num)
+            if ROUND_PIPELINE_ENABLED and not llm_client.batch.enabled:
+                decisions = decision_grouper.pending(groups, round_num)
+            else:
+                for group_decisions in run_agent_turns(groups, lambda group: decision_grouper.decide(group, round_num),
+                                                       batch=llm_client.batch, label=f"round{round_num}_group_decisions"):
+                    decisions.update(group_decisions)
+        
+        def interaction_turn(agent):
             has_posted = agent.user_id in poster_ids
-            agent.interact_with_posts(round_num, has_posted)
-            after = len(network.graph.edges())
-            if after > before:
-                active_users.add(agent.user_id)
+            agent.interact_with_posts(round_num, has_posted, decision=decisions.get(agent.user_id))
+        
+        out_degrees = {agent.user_id: network.graph.out_degree(agent.user_id) for agent in interacting_agents}
+        if shard_coordinator.enabled:
+            shard_coordinator.run_phase("interact", interacting_agents, round_num, poster_ids)
+        else:
+            round_engine.run_phase(interacting_agents, interaction_turn,
+                                   lambda items, turn: run_agent_turns(items, turn, batch=llm_client.batch,
+                                                                       label=f"round{round_num}_interactions"))
+        active_users = {user_id for user_id, before in out_degrees.items()
+                        if network.graph.out_degree(user_id) > before}
         network.last_active_users = active_users
+        
+        if decision_grouper.enabled and not shard_coordinator.enabled:
+            group_stats = decision_grouper.stats()
+            print(f"\n👥 Grouped decisions: {len(decisions)} users in {len(groups)} prompts "
+                  f"(total saved: {group_stats['calls_saved']} calls, {group_stats['tokens_saved']:,} prompt tokens)")
+        
+        concurrency_state = llm_client.concurrency.state()
+        print(f"\nLLM concurrency limit: {concurrency_state['limit']}, circuit breaker: {concurrency_state['breaker_state']} "
+              f"(error rate {concurrency_state['error_rate']:.0%})")
 
         print("\n=== Server Distribution After This Round ===")
         server_stats = {'A': 0, 'B': 0, 'C': 0}
@@ -118,20 +189,14 @@ def main():
         for stance, count in stance_counts.items():
             print(f"{stance_label[stance]}({stance}): {count} users")
         
-        if round_num in KEY_ROUNDS:
-            print(f"\n=== Round {round_num} Analysis ===")
-            
-            network.visualize_network(round_num, output_dir, agents)
-            
-            network.analyze_network_metrics(round_num, output_dir, agents)
-            
-            print(f"- Round {round_num} network graph saved to '{output_dir}/social_network_round_{round_num}.png'")
-            print(f"- Round {round_num} analysis results saved to '{output_dir}/network_analysis_round_{round_num}.txt'")
-        
-        network.save_network_state(round_num)
+        round_finalizer.submit(finalize_round, network, agents, round_num, output_dir)
         
         
-        time.sleep(0.5)
+        if not llm_client.journal.replaying:
+            time.sleep(0.5)
+    
+    round_finalizer.close()
+    shard_coordinator.stop()
     
     print("\n=== Generating Final Statistics Report ===")
     
@@ -142,6 +207,7 @@ def main():
         
         f.write("Overall Statistics:\n")
         f.write(f"- Total Rounds: {TOTAL_ROUNDS}\n")
+        f.write(f"- Run Seed: {run_seed}\n")
         f.write(f"- Total Posts: {len(network.posts_A) + len(network.posts_B) + len(network.posts_C)}\n")
         f.write(f"- Total Users: {len(agents)}\n")
         f.write(f"- Active Users: {len(network.graph.nodes)}\n")
@@ -222,8 +288,103 @@ def main():
         json.dump(final_profiles, f, ensure_ascii=False, indent=2)
     print(f"- Final user profiles saved to '{final_profiles_file}'")
     
+    if round_engine.enabled:
+        engine_stats = round_engine.stats()
+        print(f"\n=== Round Engine (snapshot feeds, deterministic commit) ===")
+        print(f"Phases: {engine_stats['phases']}, Agent turns: {engine_stats['turns']}, "
+              f"Snapshot time: {engine_stats['snapshot_seconds']:.2f}s, Commit time: {engine_stats['commit_seconds']:.2f}s")
+        print("Committed intents: " + ", ".join(f"{name}={count}" for name, count in sorted(engine_stats['intents'].items())))
+    if shard_coordinator.enabled:
+        shard_stats = shard_coordinator.stats()
+        print(f"\n=== Server Shards ({shard_stats['shards']} worker processes) ===")
+        print("Agent turns per shard: " + ", ".join(f"{server}={turns}" for server, turns in shard_stats['turns'].items()))
+        print(f"Users moved between shards: {shard_stats['moved_agents']}, Posts shipped in feed deltas: "
+              f"{shard_stats['posts_shipped']:,}, Phase time: {shard_stats['phase_seconds']:.1f}s")
+    if round_finalizer.enabled:
+        finalizer_stats = round_finalizer.stats()
+        print(f"\n=== Pipelined Round Finalization ===")
+        print(f"Rounds rendered/checkpointed in background: {finalizer_stats['submitted']}, "
+              f"Background time: {finalizer_stats['background_seconds']:.1f}s, "
+              f"Stalls: {finalizer_stats['stalls']} ({finalizer_stats['stall_seconds']:.1f}s)")
+    cache_stats = llm_client.cache.stats()
+    if llm_client.cache.enabled:
+        print(f"\n=== LLM Response Cache ({cache_stats['mode']}) ===")
+        print(f"Hits: {cache_stats['hits']}, Misses: {cache_stats['misses']}, Hit rate: {cache_stats['hit_rate']:.2%}")
+        print(f"Stores: {cache_stats['stores']}, Evictions: {cache_stats['evictions']}, Tokens saved: {cache_stats['tokens_saved']:,}")
+    if llm_client.single_flight_enabled and not llm_client.batch.enabled:
+        flight_stats = llm_client.single_flight.stats()
+        print(f"\n=== LLM Single-Flight Coalescing ===")
+        if llm_client.coalesces():
+            print(f"Unique calls: {flight_stats['leaders']}, Coalesced calls: {flight_stats['coalesced']}")
+        else:
+            print("Inactive: only temperature 0 calls are coalesced and LLM_TEMPERATURE is above 0 "
+                  "(see LLM_SINGLE_FLIGHT_BYPASS_NONZERO_TEMPERATURE)")
+    if decision_grouper.enabled:
+        group_stats = decision_grouper.stats()
+        print(f"\n=== Grouped Decision Prompts (up to {group_stats['group_size']} users) ===")
+        print(f"Group prompts: {group_stats['groups']}, Users decided in groups: {group_stats['grouped_agents']}, "
+              f"Fallbacks: {group_stats['fallbacks']}")
+        print(f"Calls saved: {group_stats['calls_saved']}, Prompt tokens saved: {group_stats['tokens_saved']:,}")
+    if llm_client.batch.enabled:
+        batch_stats = llm_client.batch.stats()
+        print(f"\n=== LLM Batch Submission ({batch_stats['mode']}) ===")
+        print(f"Batches: {batch_stats['batches']}, Requests: {batch_stats['requests']}, "
+              f"Failed batches: {batch_stats['failed_batches']}")
+    if llm_client.rate_limiter.enabled:
+        limiter_stats = llm_client.rate_limiter.stats()
+        print(f"\n=== LLM Rate Limiter ===")
+        print(f"Admitted: {limiter_stats['admitted']}, Throttled: {limiter_stats['throttled']}, "
+              f"Total wait: {limiter_stats['wait_seconds']:.1f}s, Tokens charged: {limiter_stats['tokens_charged']:,}")
+    concurrency_state = llm_client.concurrency.state()
+    print(f"\n=== LLM Concurrency Control ===")
+    print(f"Final limit: {concurrency_state['limit']}, Breaker: {concurrency_state['breaker_state']}, "
+          f"Limit decreases: {concurrency_state['decreases']}, Breaker trips: {concurrency_state['breaker_trips']}, "
+          f"Rejected: {concurrency_state['rejected']}")
+    if llm_client.governor.enabled:
+        budget_stats = llm_client.governor.stats()
+        print(f"\n=== LLM Budget Governor ===")
+        print(f"Tokens used: {budget_stats['run_tokens']:,}, Estimated cost: ${budget_stats['run_cost']:.4f}, "
+              f"Final level: {budget_stats['level']}, Steps: {budget_stats['steps']}")
+        print(f"Skipped interactions: {budget_stats['skipped_agents']}, "
+              f"Skipped reflections: {budget_stats['skipped_reflections']}")
+    if llm_client.scheduler.enabled:
+        print(f"\n=== LLM Priority Scheduler ===")
+        for name, class_stats in llm_client.scheduler.stats().items():
+            print(f"{name} (share {class_stats['share']:.0%}): {class_stats['admitted']} calls, "
+                  f"{class_stats['queued']} queued, total wait {class_stats['wait_seconds']:.1f}s")
+    parse_stats = llm_client.parse_summary()
+    print(f"\n=== LLM JSON Parsing ===")
+    print(f"Clean: {parse_stats['clean']}, Repaired: {parse_stats['repaired']} ({parse_stats['repair_rate']:.2%}), "
+          f"Retried: {parse_stats['retried']} ({parse_stats['retry_rate']:.2%}), Failed: {parse_stats['failed']}, "
+          f"Tokens saved by repair: {parse_stats['saved_tokens']:,}")
+    if llm_client.hedge.enabled:
+        hedge_stats = llm_client.hedge.stats()
+        print(f"\n=== LLM Hedged Requests ===")
+        print(f"Calls: {hedge_stats['calls']}, Hedged: {hedge_stats['hedged']} ({hedge_stats['hedge_rate']:.2%}), "
+              f"Hedge wins: {hedge_stats['hedge_wins']} ({hedge_stats['win_rate']:.2%}), "
+              f"Over budget: {hedge_stats['over_budget']}, No alternate endpoint: {hedge_stats['no_alternative']}")
+    if len(llm_client.router.endpoints) > 1:
+        print(f"\n=== LLM Endpoint Health ===")
+        for endpoint_stats in llm_client.router.stats():
+            print(f"{endpoint_stats['model']} @ {endpoint_stats['base_url']}: {endpoint_stats['calls']} calls, "
+                  f"error rate {endpoint_stats['error_rate']:.2%}, mean latency {endpoint_stats['mean_latency']:.2f}s, "
+                  f"{endpoint_stats['saturations']} saturations")
+    if llm_client.journal.enabled:
+        journal_stats = llm_client.journal.stats()
+        print(f"\n=== LLM Call Journal ({journal_stats['mode']}) ===")
+        print(f"Recorded: {journal_stats['recorded']}, Replayed: {journal_stats['replayed']}, "
+              f"Replay misses: {journal_stats['replay_misses']}, Prompt mismatches: {journal_stats['prompt_mismatches']}")
+    llm_client.close()
+    
     print("\nSimulation completed!")
     print(f"- Final statistics report saved to '{os.path.join(output_dir, FINAL_STATISTICS_TXT)}'")
+    return network, agents
 
 if __name__ == "__main__":
-    main() 
+    parser = argparse.ArgumentParser(description="Run the decentralized social network simulation")
+    resume_group = parser.add_mutually_exclusive_group()
+    resume_group.add_argument("--resume", dest="resume", action="store_true", default=None,
+                              help="Continue from the latest saved round without asking")
+    resume_group.add_argument("--fresh", dest="resume", action="store_false",
+                              help="Start from round 1 even if a saved state exists")
+    main(resume=parser.parse_args().resume) 
@@ -0,0 +1,211 @@
+import copy
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+
+from utils.config import (
+    LLM_MAX_CONCURRENCY, ROUND_ENGINE_ENABLED, ROUND_PIPELINE_ENABLED, ROUND_PIPELINE_MAX_PENDING
+)
+from models.social_network import SocialNetwork
+
+
+def run_agent_turns(agents, turn, max_workers=LLM_MAX_CONCURRENCY, batch=None, label="turn"):
+    if batch is not None and batch.enabled:
+        return batch.run(agents, turn, label)
+    if max_workers <= 1 or len(agents) <= 1:
+        return [turn(agent) for agent in agents]
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent") as pool:
+        return list(pool.map(turn, agents))
+
+
+def snapshot_network(network):
+    with network._lock:
+        return {
+            "servers": list(network.servers),
+            "posts_A": copy.deepcopy(network.posts_A),
+            "posts_B": copy.deepcopy(network.posts_B),
+            "posts_C": copy.deepcopy(network.posts_C),
+            "user_likes": {user_id: frozenset(posts) for user_id, posts in network.user_likes.items()},
+            "user_following": {user_id: frozenset(users) for user_id, users in network.user_following.items()},
+            "user_servers": dict(network.user_servers),
+        }
+
+
+class StagedNetwork:
+    get_server_posts = SocialNetwork.get_server_posts
+    get_mixed_posts_for_user = SocialNetwork._get_mixed_posts_for_user
+    get_following = SocialNetwork.get_following
+    is_following = SocialNetwork.is_following
+
+    def __init__(self, snapshot, user_id):
+        self.user_id = user_id
+        self.servers = snapshot["servers"]
+        self.posts_A = snapshot["posts_A"]
+        self.posts_B = snapshot["posts_B"]
+        self.posts_C = snapshot["posts_C"]
+        self.user_likes = dict(snapshot["user_likes"])
+        self.user_likes[user_id] = set(snapshot["user_likes"].get(user_id, ()))
+        self.user_following = dict(snapshot["user_following"])
+        self.user_following[user_id] = set(snapshot["user_following"].get(user_id, ()))
+        self.user_servers = dict(snapshot["user_servers"])
+        self.migration_reasons = []
+        self.intents = []
+
+    def _stage(self, name, *args):
+        self.intents.append((name, args))
+
+    def add_user(self, user_id):
+        self._stage("add_user", user_id)
+
+    def add_post(self, post, server):
+        self._stage("add_post", post, server)
+
+    def add_interaction(self, user_id, post_id, action, content=None):
+        if action == "like_post":
+            self.user_likes[user_id].add(str(post_id))
+        self._stage("add_interaction", user_id, post_id, action, content)
+
+    def follow_user(self, follower_id, target_user_id):
+        if follower_id == target_user_id:
+            return False
+        following = self.user_following[follower_id]
+        if target_user_id in following:
+            print(f"{follower_id} is already following {target_user_id}")
+            return False
+        following.add(target_user_id)
+        self._stage("follow_user", follower_id, target_user_id)
+        return True
+
+    def unfollow_user(self, follower_id, target_user_id):
+        following = self.user_following[follower_id]
+        if target_user_id not in following:
+            print(f"{follower_id} is not following {target_user_id}")
+            return False
+        following.remove(target_user_id)
+        self._stage("unfollow_user", follower_id, target_user_id)
+        return True
+
+    def change_user_server(self, user_id, new_server):
+        self.user_servers[user_id] = new_server
+        self._stage("change_user_server", user_id, new_server)
+
+    def record_satisfaction(self, user_id, server, satisfaction_data):
+        self._stage("record_satisfaction", user_id, server, satisfaction_data)
+
+
+class RoundEngine:
+    def __init__(self, network, enabled=ROUND_ENGINE_ENABLED):
+        self.network = network
+        self.enabled = enabled
+        self.phases = 0
+        self.turns = 0
+        self.intents = {}
+        self.snapshot_seconds = 0.0
+        self.commit_seconds = 0.0
+
+    def run_phase(self, agents, turn, run_turns):
+        if not self.enabled:
+            return run_turns(agents, turn)
+
+        started = time.monotonic()
+        snapshot = snapshot_network(self.network)
+        staged = [(agent, StagedNetwork(snapshot, agent.user_id)) for agent in agents]
+        self.snapshot_seconds += time.monotonic() - started
+
+        def staged_turn(item):
+            agent, view = item
+            agent.network = view
+            try:
+                return turn(agent)
+            finally:
+                agent.network = self.network
+
+        try:
+            results = run_turns(staged, staged_turn)
+        finally:
+            self.commit([view for _, view in staged])
+        return results
+
+    def commit(self, views):
+        started = time.monotonic()
+        for view in views:
+            for name, args in view.intents:
+                if name == "add_post":
+                    args[0]["timestamp"] = datetime.now().isoformat()
+                getattr(self.network, name)(*args)
+                self.intents[name] = self.intents.get(name, 0) + 1
+            self.network.migration_reasons.extend(view.migration_reasons)
+        self.phases += 1
+        self.turns += len(views)
+        self.commit_seconds += time.monotonic() - started
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "phases": self.phases,
+            "turns": self.turns,
+            "intents": dict(self.intents),
+            "snapshot_seconds": self.snapshot_seconds,
+            "commit_seconds": self.commit_seconds,
+        }
+
+
+def freeze_agents(agents):
+    return [SimpleNamespace(user_id=agent.user_id, profile=copy.deepcopy(agent.profile)) for agent in agents]
+
+
+class RoundFinalizer:
+    def __init__(self, enabled=ROUND_PIPELINE_ENABLED, max_pending=ROUND_PIPELINE_MAX_PENDING):
+        self.enabled = enabled
+        self.max_pending = max(1, max_pending)
+        self.submitted = 0
+        self.stalls = 0
+        self.stall_seconds = 0.0
+        self.background_seconds = 0.0
+        self._pending = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="round-finalize") if enabled else None
+
+    def submit(self, finalize, network, agents, *args):
+        self.submitted += 1
+        if not self.enabled:
+            return finalize(network, agents, *args)
+
+        for future in [future for future in self._pending if future.done()]:
+            self._pending.remove(future)
+            future.result()
+        if len(self._pending) >= self.max_pending:
+            started = time.monotonic()
+            self.stalls += 1
+            self._pending.pop(0).result()
+            self.stall_seconds += time.monotonic() - started
+
+        def timed(*job_args):
+            started = time.monotonic()
+            try:
+                return finalize(*job_args)
+            finally:
+                self.background_seconds += time.monotonic() - started
+
+        self._pending.append(self._executor.submit(timed, network.frozen_copy(), freeze_agents(agents), *args))
+
+    def drain(self):
+        if not self.enabled:
+            return
+        pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+
+    def close(self):
+        self.drain()
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "submitted": self.submitted,
+            "stalls": self.stalls,
+            "stall_seconds": self.stall_seconds,
+            "background_seconds": self.background_seconds,
+        }
@@ -0,0 +1,350 @@
+import multiprocessing
+import time
+import traceback
+from types import SimpleNamespace
+
+from utils.config import MAX_FOLLOWING_POSTS, MAX_SERVER_POSTS, SHARDED_SERVERS
+from utils.logger import add_token_usage_listener, notify_token_usage, reset_token_usage_listeners
+from agents.social_agent import SocialAgent
+from agents.decision_groups import DecisionGrouper
+from llm.budget import BudgetGovernor
+from llm.cache import ResponseCache
+from llm.client import AsyncLLMClient
+from llm.journal import CallJournal
+from models.round_engine import StagedNetwork, run_agent_turns
+
+AGENT_LOCAL_FIELDS = ("network", "llm_client")
+CACHE_COUNTERS = ("hits", "misses", "tokens_saved")
+JOURNAL_COUNTERS = ("replayed", "replay_misses", "prompt_mismatches")
+GROUP_COUNTERS = ("groups", "grouped_agents", "fallbacks", "calls_saved", "tokens_saved")
+FEED_WINDOW = max(MAX_FOLLOWING_POSTS, MAX_SERVER_POSTS)
+
+
+def agent_state(agent):
+    return {key: value for key, value in vars(agent).items() if key not in AGENT_LOCAL_FIELDS}
+
+
+def restore_agent(state, llm_client):
+    agent = SocialAgent.__new__(SocialAgent)
+    vars(agent).update(state)
+    agent.network = None
+    agent.llm_client = llm_client
+    return agent
+
+
+def shard_snapshot(network, user_ids):
+    with network._lock:
+        return {
+            "servers": list(network.servers),
+            "user_likes": {user_id: frozenset(network.user_likes.get(user_id, ())) for user_id in user_ids},
+            "user_following": {user_id: frozenset(network.user_following.get(user_id, ())) for user_id in user_ids},
+            "user_servers": {user_id: network.user_servers[user_id] for user_id in user_ids},
+        }
+
+
+def author_window(posts, size=FEED_WINDOW):
+    counts = {}
+    kept = []
+    for post in reversed(posts):
+        author = post.get("author")
+        if counts.get(author, 0) < size:
+            counts[author] = counts.get(author, 0) + 1
+            kept.append(post)
+    kept.reverse()
+    return kept
+
+
+def merge_posts(local, changed):
+    index = {post["post_id"]: i for i, post in enumerate(local)}
+    for post in changed:
+        i = index.get(post["post_id"])
+        if i is None:
+            index[post["post_id"]] = len(local)
+            local.append(post)
+        else:
+            local[i] = post
+    local.sort(key=lambda post: post["timestamp"])
+
+
+def apply_post_delta(posts, own_server, delta):
+    for server, changed in delta.items():
+        local = posts.setdefault(server, [])
+        merge_posts(local, changed)
+        if server != own_server:
+            local[:] = author_window(local)
+
+
+def _post_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def counter_delta(stats, reported, keys):
+    delta = {key: stats[key] - reported.get(key, 0) for key in keys}
+    reported.update({key: stats[key] for key in keys})
+    return delta
+
+
+def _run_shard_phase(server, agents, posts, llm_client, grouper, message, usage, reported):
+    kind = message["kind"]
+    round_num = message["round_num"]
+    llm_client.governor.set_level(message["budget_level"])
+    apply_post_delta(posts, server, message["posts"])
+    snapshot = dict(message["snapshot"])
+    for srv in snapshot["servers"]:
+        snapshot[f"posts_{srv}"] = posts.setdefault(srv, [])
+    items = []
+    for user_id, has_posted in message["plan"]:
+        agent = agents[user_id]
+        agent.current_round = round_num
+        agent.network = StagedNetwork(snapshot, user_id)
+        items.append((agent, has_posted))
+
+    decisions = {}
+    if kind == "interact" and grouper.enabled and not llm_client.batch.enabled:
+        decisions = grouper.pending(grouper.group([agent for agent, _ in items], round_num), round_num)
+
+    def turn(item):
+        agent, has_posted = item
+        if kind == "post":
+            agent.create_post()
+        else:
+            agent.interact_with_posts(round_num, has_posted, decision=decisions.get(agent.user_id))
+
+    try:
+        run_agent_turns(items, turn, batch=llm_client.batch, label=f"round{round_num}_{kind}_{server}")
+        results = [(agent.user_id, agent.network.intents, agent.network.migration_reasons, agent.profile)
+                   for agent, _ in items]
+    finally:
+        for agent, _ in items:
+            agent.network = None
+    records, usage[:] = list(usage), []
+    return {
+        "results": results,
+        "usage": records,
+        "journal": llm_client.journal.take_forwarded(),
+        "journal_counts": counter_delta(llm_client.journal.stats(), reported.setdefault("journal", {}), JOURNAL_COUNTERS),
+        "cache_stores": llm_client.cache.take_forwarded(),
+        "cache_counts": counter_delta(llm_client.cache.stats(), reported.setdefault("cache", {}), CACHE_COUNTERS),
+        "group_counts": counter_delta(grouper.stats(), reported.setdefault("groups", {}), GROUP_COUNTERS),
+    }
+
+
+def _shard_main(server, conn, client_factory):
+    llm_client = client_factory()
+    grouper = DecisionGrouper(llm_client)
+    agents = {}
+    posts = {}
+    usage = []
+    reported = {}
+    reset_token_usage_listeners()
+    add_token_usage_listener(usage.append)
+    try:
+        while True:
+            message = conn.recv()
+            command = message["command"]
+            if command == "stop":
+                break
+            try:
+                if command == "adopt":
+                    for state in message["states"]:
+                        agents[state["user_id"]] = restore_agent(state, llm_client)
+                    reply = {"agents": len(agents)}
+                elif command == "release":
+                    reply = {"states": [agent_state(agents.pop(user_id)) for user_id in message["user_ids"]]}
+                elif command == "phase":
+                    reply = _run_shard_phase(server, agents, posts, llm_client, grouper, message, usage, reported)
+                else:
+                    reply = {"error": f"Unknown shard command {command}"}
+            except Exception:
+                reply = {"error": traceback.format_exc()}
+            conn.send(reply)
+    finally:
+        llm_client.close()
+        conn.close()
+
+
+class ShardCoordinator:
+    def __init__(self, network, agents, engine, llm_client, enabled=SHARDED_SERVERS, client_factory=None,
+                 grouper=None):
+        self.network = network
+        self.agents = {agent.user_id: agent for agent in agents}
+        self.engine = engine
+        self.llm_client = llm_client
+        self.grouper = grouper
+        self.enabled = enabled
+        self.client_factory = client_factory or self._default_client_factory
+        self.shards = {}
+        self.location = {}
+        self.post_index = {}
+        self.pending_posts = {}
+        self.phases = 0
+        self.turns = {}
+        self.moved_agents = 0
+        self.posts_shipped = 0
+        self.phase_seconds = 0.0
+
+    def _default_client_factory(self):
+        cache = self.llm_client.cache
+        journal = self.llm_client.journal
+        return AsyncLLMClient(
+            rate_limiter=self.llm_client.rate_limiter,
+            governor=BudgetGovernor(0, 0),
+            cache=ResponseCache(path=cache.path, mode=cache.mode, max_bytes=cache.max_bytes,
+                                bypass_nonzero_temperature=cache.bypass_nonzero_temperature, salt=cache.salt,
+                                forward=True),
+            journal=CallJournal(path=journal.path, mode=journal.mode, forward=True),
+        )
+
+    def start(self):
+        if not self.enabled or self.shards:
+            return self
+        context = multiprocessing.get_context("fork")
+        for server in self.network.servers:
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=_shard_main, args=(server, child_conn, self.client_factory),
+                                      name=f"shard-{server}", daemon=True)
+            process.start()
+            child_conn.close()
+            self.shards[server] = (process, parent_conn)
+            self.turns[server] = 0
+            self.pending_posts[server] = {}
+        with self.network._lock:
+            for server in self.network.servers:
+                for post in self.network.get_server_posts(server):
+                    self._queue_post(server, post)
+        placement = {server: [] for server in self.shards}
+        for user_id, agent in self.agents.items():
+            server = self.network.user_servers[user_id]
+            placement[server].append(agent_state(agent))
+            self.location[user_id] = server
+        for server, states in placement.items():
+            self._request(server, {"command": "adopt", "states": states})
+        print(f"🧩 Started {len(self.shards)} server shards: "
+              + ", ".join(f"{server}={len(states)} users" for server, states in placement.items()))
+        return self
+
+    def _request(self, server, message):
+        _, conn = self.shards[server]
+        conn.send(message)
+        return self._receive(server)
+
+    def _receive(self, server):
+        reply = self.shards[server][1].recv()
+        if "error" in reply:
+            raise RuntimeError(f"Shard {server} failed:\n{reply['error']}")
+        return reply
+
+    def _queue_post(self, server, post):
+        self.post_index[post["post_id"]] = (server, post)
+        for pending in self.pending_posts.values():
+            pending[post["post_id"]] = (server, post)
+
+    def _queue_committed_posts(self, views):
+        for view in views:
+            for name, args in view.intents:
+                if name == "add_post" and "post_id" in args[0] and "author" in args[0]:
+                    self._queue_post(args[1], args[0])
+                elif name == "add_interaction":
+                    entry = self.post_index.get(_post_id(args[1]))
+                    if entry is not None:
+                        self._queue_post(*entry)
+
+    def _take_post_delta(self, server):
+        delta = {}
+        for srv, post in self.pending_posts[server].values():
+            delta.setdefault(srv, []).append(post)
+        self.pending_posts[server] = {}
+        return delta
+
+    def _rebalance(self):
+        moves = {}
+        for user_id, server in self.location.items():
+            current = self.network.user_servers[user_id]
+            if current != server:
+                moves.setdefault(server, []).append((user_id, current))
+        if not moves:
+            return
+        arrivals = {}
+        for old_server, moved in moves.items():
+            reply = self._request(old_server, {"command": "release", "user_ids": [user_id for user_id, _ in moved]})
+            for (user_id, new_server), state in zip(moved, reply["states"]):
+                arrivals.setdefault(new_server, []).append(state)
+                self.location[user_id] = new_server
+                self.moved_agents += 1
+        for new_server, states in arrivals.items():
+            self._request(new_server, {"command": "adopt", "states": states})
+        print(f"🧩 Moved {sum(len(states) for states in arrivals.values())} migrated users between shards")
+
+    def run_phase(self, kind, agents, round_num, poster_ids=()):
+        started = time.monotonic()
+        self._rebalance()
+        plans = {server: [] for server in self.shards}
+        for agent in agents:
+            plans[self.location[agent.user_id]].append((agent.user_id, agent.user_id in poster_ids))
+
+        budget_level = self.llm_client.governor.level
+        active = []
+        for server, plan in plans.items():
+            if not plan:
+                continue
+            snapshot = shard_snapshot(self.network, [user_id for user_id, _ in plan])
+            posts = self._take_post_delta(server)
+            self.posts_shipped += sum(len(changed) for changed in posts.values())
+            self.shards[server][1].send({
+                "command": "phase",
+                "kind": kind,
+                "round_num": round_num,
+                "plan": plan,
+                "snapshot": snapshot,
+                "posts": posts,
+                "budget_level": budget_level,
+            })
+            active.append(server)
+
+        views = {}
+        for server in active:
+            reply = self._receive(server)
+            for user_id, intents, migration_reasons, profile in reply["results"]:
+                views[user_id] = SimpleNamespace(intents=intents, migration_reasons=migration_reasons)
+                self.agents[user_id].profile = profile
+            for record in reply["usage"]:
+                notify_token_usage(record)
+            for entry in reply["journal"]:
+                self.llm_client.journal.write_entry(entry)
+            self.llm_client.journal.absorb(reply["journal_counts"])
+            for key, content, total_tokens in reply["cache_stores"]:
+                self.llm_client.cache.put(key, content, total_tokens)
+            self.llm_client.cache.absorb(reply["cache_counts"])
+            if self.grouper is not None:
+                self.grouper.absorb(reply["group_counts"])
+            self.turns[server] += len(plans[server])
+
+        committed = [views[agent.user_id] for agent in agents if agent.user_id in views]
+        self.engine.commit(committed)
+        self._queue_committed_posts(committed)
+        self.phases += 1
+        self.phase_seconds += time.monotonic() - started
+
+    def stop(self):
+        for server, (process, conn) in self.shards.items():
+            try:
+                conn.send({"command": "stop"})
+            except (BrokenPipeError, OSError):
+                pass
+            process.join(timeout=30)
+            conn.close()
+        self.shards = {}
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "shards": len(self.turns),
+            "phases": self.phases,
+            "turns": dict(self.turns),
+            "moved_agents": self.moved_agents,
+            "posts_shipped": self.posts_shipped,
+            "phase_seconds": self.phase_seconds,
+        }
@@ -1,10 +1,12 @@
 import networkx as nx
 import matplotlib.pyplot as plt
+import copy
 import json
 import csv
 import time
 import os
 import pickle
+import threading
 from datetime import datetime
 from utils.config import (
     OUTPUT_DIR,
@@ -28,12 +30,17 @@ class SocialNetwork:
         self.user_servers = {}
         self.migration_reasons = []
         self.server_satisfaction_history = {}
+        self._lock = threading.RLock()
         
         self.save_dir = OUTPUT_DIR
         if not os.path.exists(self.save_dir):
             os.makedirs(self.save_dir)
     
     def add_post(self, post, server):
+        with self._lock:
+            self._add_post(post, server)
+    
+    def _add_post(self, post, server):
         if "post_id" not in post:
             post["post_id"] = self.post_counter
         if "likes" not in post:
@@ -72,6 +79,10 @@ class SocialNetwork:
             return self.posts_C
     
     def get_mixed_posts_for_user(self, user_id, server, max_following_posts=3, max_server_posts=6):
+        with self._lock:
+            return self._get_mixed_posts_for_user(user_id, server, max_following_posts, max_server_posts)
+    
+    def _get_mixed_posts_for_user(self, user_id, server, max_following_posts=3, max_server_posts=6):
         following = self.user_following.get(user_id, set())
         
         following_posts = []
@@ -93,10 +104,18 @@ class SocialNetwork:
         return mixed_posts
     
     def change_user_server(self, user_id, new_server):
+        with self._lock:
+            self._change_user_server(user_id, new_server)
+    
+    def _change_user_server(self, user_id, new_server):
         self.user_servers[user_id] = new_server
         print(f"{user_id} migrated to server {new_server}")
     
     def record_satisfaction(self, user_id, server, satisfaction_data):
+        with self._lock:
+            self._record_satisfaction(user_id, server, satisfaction_data)
+    
+    def _record_satisfaction(self, user_id, server, satisfaction_data):
         if user_id not in self.server_satisfaction_history:
             self.server_satisfaction_history[user_id] = {}
         
@@ -132,11 +151,16 @@ class SocialNetwork:
         print(f"Satisfaction history saved to: {satisfaction_file}")
 
     def add_user(self, user_id):
-        if user_id not in self.graph:
-            self.graph.add_node(user_id)
-            print(f"Added user node: {user_id}")
+        with self._lock:
+            if user_id not in self.graph:
+                self.graph.add_node(user_id)
+                print(f"Added user node: {user_id}")
     
     def add_interaction(self, user_id, post_id, action, content=None):
+        with self._lock:
+            self._add_interaction(user_id, post_id, action, content)
+    
+    def _add_interaction(self, user_id, post_id, action, content=None):
         try:
             post = next((p for p in self.posts_A if p["post_id"] == int(post_id)), None)
             if not post:
@@ -196,6 +220,10 @@ class SocialNetwork:
             print(f"Error processing interaction: {e}")
     
     def follow_user(self, follower_id, target_user_id):
+        with self._lock:
+            return self._follow_user(follower_id, target_user_id)
+    
+    def _follow_user(self, follower_id, target_user_id):
         if follower_id == target_user_id:
             return False
         
@@ -220,6 +248,10 @@ class SocialNetwork:
             return False
     
     def unfollow_user(self, follower_id, target_user_id):
+        with self._lock:
+            return self._unfollow_user(follower_id, target_user_id)
+    
+    def _unfollow_user(self, follower_id, target_user_id):
         if follower_id not in self.user_following:
             return False
         
@@ -245,6 +277,10 @@ class SocialNetwork:
         return self.user_following.get(user_id, set())
     
     def get_followers(self, user_id):
+        with self._lock:
+            return self._get_followers(user_id)
+    
+    def _get_followers(self, user_id):
         followers = set()
         for follower, following_set in self.user_following.items():
             if user_id in following_set:
@@ -826,6 +862,17 @@ class SocialNetwork:
             print(f"Error loading network state: {e}")
             return False
     
+    def frozen_copy(self):
+        with self._lock:
+            frozen = copy.copy(self)
+            for name in ('graph', 'posts_A', 'posts_B', 'posts_C', 'user_likes', 'user_comments', 'user_following',
+                         'user_servers', 'migration_reasons', 'server_satisfaction_history'):
+                setattr(frozen, name, copy.deepcopy(getattr(self, name)))
+            if hasattr(self, 'last_active_users'):
+                frozen.last_active_users = set(self.last_active_users)
+            frozen._lock = threading.RLock()
+            return frozen
+    
     def get_latest_saved_round(self):
         try:
             state_files = [f for f in os.listdir(self.save_dir) if f.startswith(NETWORK_STATE_PREFIX)]
@@ -0,0 +1,211 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import re
+import secrets
+import sys
+import time
+import traceback
+import multiprocessing
+from multiprocessing.connection import wait
+
+import utils.config as config
+from utils.config import SWEEP_OUTPUT_DIR, SWEEP_MAX_JOBS, SWEEP_SUMMARY_CSV, SWEEP_CACHE_MODE
+from llm.rate_limiter import TokenBucketRateLimiter
+
+SWEEP_RESULT_JSON = "sweep_result.json"
+SWEEP_CACHE_FILE = "llm_cache.sqlite"
+METRIC_COLUMNS = [
+    "users", "posts", "interactions", "migrations", "stance_changes", "polarization", "pole_distance",
+    "mean_stance", "mean_satisfaction", "llm_calls", "prompt_tokens", "completion_tokens", "cached_tokens",
+    "cache_hits", "estimated_cost",
+]
+TABLE_COLUMNS = ["posts", "interactions", "migrations", "polarization", "mean_satisfaction", "llm_calls",
+                 "estimated_cost"]
+
+
+def expand_sweep(spec):
+    base = spec.get("base", {})
+    configs = [dict(base, **run) for run in spec.get("runs", [])]
+    grid = spec.get("grid", {})
+    if grid:
+        keys = list(grid)
+        for values in itertools.product(*(grid[key] for key in keys)):
+            configs.append(dict(base, **dict(zip(keys, values))))
+    if not configs:
+        configs.append(dict(base))
+    for overrides in configs:
+        unknown = [key for key in overrides if not hasattr(config, key)]
+        if unknown:
+            raise ValueError(f"Unknown config settings in sweep: {', '.join(unknown)}")
+    return configs
+
+
+def varying_keys(configs):
+    keys = list(dict.fromkeys(key for overrides in configs for key in overrides))
+    return [key for key in keys if len({json.dumps(overrides.get(key), sort_keys=True) for overrides in configs}) > 1]
+
+
+def job_name(index, overrides, keys):
+    label = "_".join(f"{key}-{re.sub(r'[^A-Za-z0-9.]+', '-', str(overrides.get(key)))}" for key in keys)
+    return f"{index:03d}_{label}" if label else f"{index:03d}"
+
+
+def job_metrics(network, agents):
+    stances = [agent.profile.get('stance', 0) for agent in agents]
+    polarization, pole_distance = network.compute_polarization_index(agents)
+    latest = {}
+    for servers in network.server_satisfaction_history.values():
+        for records in servers.values():
+            for record in records:
+                latest.setdefault(record.get("round"), []).append(record.get("score", 0))
+    rounds = [round_num for round_num in latest if isinstance(round_num, int)]
+    last_scores = latest[max(rounds)] if rounds else []
+    return {
+        "users": len(agents),
+        "posts": len(network.posts_A) + len(network.posts_B) + len(network.posts_C),
+        "interactions": len(network.graph.edges),
+        "migrations": len(network.migration_reasons),
+        "stance_changes": sum(len(agent.profile.get('stance_history', [])) for agent in agents),
+        "polarization": round(polarization, 4),
+        "pole_distance": round(pole_distance, 4),
+        "mean_stance": round(sum(stances) / len(stances), 4) if stances else 0,
+        "mean_satisfaction": round(sum(last_scores) / len(last_scores), 4) if last_scores else 0,
+    }
+
+
+def run_job(overrides, job_dir, rate_limiter, cache_mode, cache_path):
+    os.makedirs(job_dir, exist_ok=True)
+    log = open(os.path.join(job_dir, "run.log"), "w", encoding="utf-8", buffering=1)
+    sys.stdout = sys.stderr = log
+
+    for key, value in overrides.items():
+        setattr(config, key, value)
+    config.OUTPUT_DIR = job_dir
+    if config.SIMULATION_SEED is None:
+        config.SIMULATION_SEED = secrets.randbits(63)
+    cache_salt = f"seed-{config.SIMULATION_SEED}" if config.LLM_TEMPERATURE > 0 else None
+    if "TOTAL_ROUNDS" in overrides and "KEY_ROUNDS" not in overrides:
+        config.KEY_ROUNDS = [round_num for round_num in config.KEY_ROUNDS if round_num <= config.TOTAL_ROUNDS]
+
+    from utils.logger import add_token_usage_listener
+    from llm.budget import estimate_cost
+    from llm.cache import ResponseCache
+    from llm.client import AsyncLLMClient, set_default_client
+
+    usage = {"llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+
+    def count_usage(record):
+        if record.get("source") in ("coalesced", "grouped"):
+            return
+        usage["llm_calls"] += 1
+        for key in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+            usage[key] += int(record.get(key) or 0)
+
+    add_token_usage_listener(count_usage)
+    llm_client = set_default_client(AsyncLLMClient(rate_limiter=rate_limiter,
+                                                   cache=ResponseCache(path=cache_path, mode=cache_mode,
+                                                                       salt=cache_salt)))
+    started = time.monotonic()
+    result = {"status": "ok"}
+    try:
+        import main
+        network, agents = main.main(resume=False)
+        result.update(job_metrics(network, agents))
+    except Exception as e:
+        traceback.print_exc()
+        result = {"status": f"failed: {e}"}
+    result["seed"] = config.SIMULATION_SEED
+    result.update(usage)
+    result["cache_hits"] = llm_client.cache.stats()["hits"]
+    result["estimated_cost"] = round(estimate_cost(usage["prompt_tokens"], usage["completion_tokens"],
+                                                   usage["cached_tokens"]), 6)
+    result["seconds"] = round(time.monotonic() - started, 1)
+    with open(os.path.join(job_dir, SWEEP_RESULT_JSON), "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    log.close()
+
+
+def read_result(job_dir, exitcode):
+    path = os.path.join(job_dir, SWEEP_RESULT_JSON)
+    if not os.path.exists(path):
+        return {"status": f"crashed (exit code {exitcode})"}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def run_sweep(configs, output_dir=SWEEP_OUTPUT_DIR, max_jobs=SWEEP_MAX_JOBS, cache_mode=SWEEP_CACHE_MODE):
+    os.makedirs(output_dir, exist_ok=True)
+    context = multiprocessing.get_context("fork")
+    rate_limiter = TokenBucketRateLimiter()
+    cache_path = os.path.join(output_dir, SWEEP_CACHE_FILE)
+    keys = varying_keys(configs)
+    names = [job_name(index, overrides, keys) for index, overrides in enumerate(configs)]
+    pending = list(enumerate(configs))
+    running = {}
+    results = {}
+    print(f"🧪 Sweep of {len(configs)} configs, {max_jobs} parallel jobs, output in '{output_dir}'")
+    while pending or running:
+        while pending and len(running) < max(1, max_jobs):
+            index, overrides = pending.pop(0)
+            name = names[index]
+            job_dir = os.path.join(output_dir, name)
+            process = context.Process(target=run_job, args=(overrides, job_dir, rate_limiter, cache_mode, cache_path),
+                                      name=f"sweep-{index}")
+            process.start()
+            running[process.sentinel] = (index, name, job_dir, process)
+            print(f"▶️ Started {name}")
+        for sentinel in wait(list(running)):
+            index, name, job_dir, process = running.pop(sentinel)
+            process.join()
+            results[index] = read_result(job_dir, process.exitcode)
+            print(f"{'✅' if results[index]['status'] == 'ok' else '❌'} Finished {name}: {results[index]['status']} "
+                  f"({results[index].get('seconds', 0)}s)")
+
+    rows = [(names[index], overrides, results[index]) for index, overrides in enumerate(configs)]
+    write_summary(rows, os.path.join(output_dir, SWEEP_SUMMARY_CSV))
+    print_summary(rows)
+    return rows
+
+
+def write_summary(rows, path):
+    override_keys = list(dict.fromkeys(key for _, overrides, _ in rows for key in overrides))
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["job", "status", "seconds", "seed"] + override_keys + METRIC_COLUMNS)
+        for name, overrides, result in rows:
+            writer.writerow([name, result.get("status", ""), result.get("seconds", ""), result.get("seed", "")]
+                            + [json.dumps(overrides[key]) if key in overrides else "" for key in override_keys]
+                            + [result.get(column, "") for column in METRIC_COLUMNS])
+    print(f"\nSweep summary saved to '{path}'")
+
+
+def print_summary(rows):
+    name_width = max(len(name) for name, _, _ in rows)
+    print(f"\n=== Sweep Summary ===")
+    print(f"{'job':<{name_width}}  {'status':<8}" + "".join(f"{column:>18}" for column in TABLE_COLUMNS))
+    for name, _, result in rows:
+        status = result.get("status", "")
+        print(f"{name:<{name_width}}  {status[:8]:<8}" + "".join(f"{str(result.get(column, '')):>18}"
+                                                              for column in TABLE_COLUMNS))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a headless parameter sweep of the simulation")
+    parser.add_argument("spec", help="JSON file with 'base' overrides plus a 'grid' and/or a list of 'runs'")
+    parser.add_argument("--output", default=None, help=f"Sweep output directory (default: {SWEEP_OUTPUT_DIR}/<spec name>)")
+    parser.add_argument("--jobs", type=int, default=SWEEP_MAX_JOBS, help="Number of simulations to run in parallel")
+    parser.add_argument("--cache", default=SWEEP_CACHE_MODE, help="Shared response cache mode (off, read-write, read-only)")
+    args = parser.parse_args()
+
+    with open(args.spec, "r", encoding="utf-8") as f:
+        spec = json.load(f)
+    output_dir = args.output or os.path.join(SWEEP_OUTPUT_DIR, spec.get("name")
+                                             or os.path.splitext(os.path.basename(args.spec))[0])
+    run_sweep(expand_sweep(spec), output_dir, args.jobs, args.cache)
+
+
+if __name__ == "__main__":
+    main()
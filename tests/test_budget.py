@@ -0,0 +1,85 @@
+import pytest
+
+from llm.budget import (
+    BudgetGovernor, LEVEL_NORMAL, LEVEL_SHORT_PROMPTS, LEVEL_SAMPLE_AGENTS, LEVEL_SKIP_REFLECTIONS
+)
+from utils import prompt_budget
+from utils.logger import reset_token_usage_listeners, set_output_directory
+
+
+@pytest.fixture(autouse=True)
+def isolated_governor(tmp_path):
+    set_output_directory(str(tmp_path))
+    yield
+    reset_token_usage_listeners()
+    prompt_budget.set_section_budget_scale(1.0)
+
+
+def usage(total, source="api"):
+    return {"total_tokens": total, "prompt_tokens": total, "completion_tokens": 0, "source": source}
+
+
+def test_overspending_mid_round_changes_the_level_only_at_the_next_round():
+    governor = BudgetGovernor(round_budget=1000, run_budget=0, total_rounds=10, recovery_ratio=0.5)
+    governor.start_round(1)
+    governor.observe(usage(800))
+    governor.observe(usage(800))
+    assert governor.level == LEVEL_NORMAL
+    governor.observe(usage(5000))
+    assert governor.level == LEVEL_NORMAL
+    assert prompt_budget._BUDGET_SCALE == 1.0
+
+    governor.start_round(2)
+    assert governor.level == LEVEL_SHORT_PROMPTS
+    assert prompt_budget._BUDGET_SCALE == governor.prompt_scale
+    assert governor.steps == 1
+
+
+def test_levels_step_one_at_a_time_and_recover_under_low_pressure():
+    governor = BudgetGovernor(round_budget=1000, run_budget=0, total_rounds=10, recovery_ratio=0.5)
+    levels = []
+    for round_num, tokens in enumerate([1500, 1500, 1500, 1500, 900, 100, 100, 100], start=1):
+        governor.start_round(round_num)
+        levels.append(governor.level)
+        governor.observe(usage(tokens))
+    governor.start_round(9)
+    levels.append(governor.level)
+
+    assert levels == [LEVEL_NORMAL, LEVEL_SHORT_PROMPTS, LEVEL_SAMPLE_AGENTS, LEVEL_SKIP_REFLECTIONS,
+                      LEVEL_SKIP_REFLECTIONS, LEVEL_SKIP_REFLECTIONS, LEVEL_SAMPLE_AGENTS, LEVEL_SHORT_PROMPTS,
+                      LEVEL_NORMAL]
+
+
+def test_exhausted_run_budget_jumps_to_skip_reflections_at_round_start():
+    governor = BudgetGovernor(round_budget=0, run_budget=10000, total_rounds=10)
+    governor.start_round(1)
+    governor.observe(usage(12000))
+    assert governor.level == LEVEL_NORMAL
+    assert governor.allow_reflection()
+
+    governor.start_round(2)
+    assert governor.level == LEVEL_SKIP_REFLECTIONS
+    assert not governor.allow_reflection()
+    assert governor.stats()["skipped_reflections"] == 1
+
+
+def test_coalesced_and_grouped_usage_is_not_charged():
+    governor = BudgetGovernor(round_budget=1000, run_budget=0, total_rounds=10)
+    governor.start_round(1)
+    governor.observe(usage(5000, source="coalesced"))
+    governor.observe(usage(5000, source="grouped"))
+    governor.start_round(2)
+    assert governor.level == LEVEL_NORMAL
+    assert governor.run_tokens == 0
+
+
+def test_sampling_only_applies_from_the_sample_agents_level():
+    governor = BudgetGovernor(round_budget=1000, run_budget=0, total_rounds=10, sample_rate=0.5)
+    agents = list(range(10))
+    governor.start_round(1)
+    assert governor.sample_agents(agents) == agents
+    governor.set_level(LEVEL_SAMPLE_AGENTS)
+    sampled = governor.sample_agents(agents)
+    assert len(sampled) == 5
+    assert set(sampled) <= set(agents)
+    assert governor.stats()["skipped_agents"] == 5
@@ -0,0 +1,37 @@
+import asyncio
+import time
+
+from llm.concurrency import AdaptiveConcurrencyController, BREAKER_OPEN, BREAKER_HALF_OPEN
+
+
+def test_cancelled_half_open_probe_frees_the_probe_slot():
+    async def scenario():
+        controller = AdaptiveConcurrencyController(max_limit=4, min_limit=1, initial_limit=4)
+        controller.breaker_state = BREAKER_OPEN
+        controller._opened_at = time.monotonic() - 3600
+
+        async def probe():
+            await controller.acquire()
+            try:
+                await asyncio.Event().wait()
+            except BaseException:
+                await controller.release(None)
+                raise
+
+        task = asyncio.create_task(probe())
+        await asyncio.sleep(0)
+        assert controller.breaker_state == BREAKER_HALF_OPEN
+        assert controller._probe_in_flight
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+        assert not controller._probe_in_flight
+        await asyncio.wait_for(controller.acquire(), timeout=1)
+        assert controller._probe_in_flight
+        await controller.release(True)
+        assert controller.in_flight == 0
+
+    asyncio.run(scenario())
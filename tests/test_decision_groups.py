@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+import pytest
+
+from agents.decision_groups import DecisionGrouper
+from agents.social_agent import SocialAgent
+from models.social_network import SocialNetwork
+from utils.logger import set_output_directory
+
+
+class RecordingClient:
+    def __init__(self):
+        self.prompts = []
+        self.router = SimpleNamespace(primary=SimpleNamespace(model="mock"))
+
+    def chat(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return {"user_0": {"actions": [{"type": "silent"}]}, "user_1": {"actions": [{"type": "silent"}]}}
+
+
+@pytest.fixture
+def setup(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    set_output_directory(str(tmp_path))
+    network = SocialNetwork()
+    client = RecordingClient()
+    agents = [SocialAgent({"name": f"u{i}", "stance": 0, "age": 30, "interests": []}, i, network, "A",
+                          llm_client=client) for i in range(2)]
+    network.add_post({"author": "user_9", "content": "hello", "likes": 0, "comments": [], "stance": 0,
+                      "timestamp": "2026-01-01T00:00:00"}, "A")
+    return network, client, agents
+
+
+def test_group_prompt_uses_member_state_from_grouping_time(setup):
+    network, client, agents = setup
+    grouper = DecisionGrouper(client, group_size=2)
+    groups = grouper.group(agents, 1)
+    assert len(groups) == 1
+
+    agents[1].profile["stance"] = 2
+    agents[1].profile["age"] = 99
+    agents[1].add_behavior_memory("like", "Liked a later post", "A", 2, "liked post by user_5")
+    agents[1].network = None
+
+    decisions = grouper.decide(groups[0], 1)
+
+    prompt = client.prompts[0]
+    assert "Age: 99" not in prompt
+    assert "Liked a later post" not in prompt
+    assert set(decisions) == {"user_0", "user_1"}
+    assert grouper.stats()["grouped_agents"] == 2
+
+
+def test_pending_decisions_are_computed_once_per_group(setup):
+    network, client, agents = setup
+    grouper = DecisionGrouper(client, group_size=2)
+    pending = grouper.pending(grouper.group(agents, 1), 1)
+
+    assert pending.get("user_0")[2] == {"actions": [{"type": "silent"}]}
+    assert pending.get("user_1")[2] == {"actions": [{"type": "silent"}]}
+    assert pending.get("user_7") is None
+    assert len(client.prompts) == 1
+    assert len(pending) == 2
@@ -0,0 +1,131 @@
+import asyncio
+
+import httpx
+
+from llm.hedging import HedgePolicy
+from llm.router import EndpointRouter
+
+
+def make_router(urls=("http://primary", "http://backup")):
+    router = EndpointRouter(base_urls=list(urls), models=["model"])
+    for endpoint in router.endpoints:
+        for _ in range(10):
+            router.record_success(endpoint, 0.05)
+    return router
+
+
+def make_policy():
+    return HedgePolicy(enabled=True, percentile=95, min_delay=0.01, min_samples=5, max_rate=1.0)
+
+
+class Sender:
+    def __init__(self, delays):
+        self.delays = delays
+        self.started = []
+        self.cancelled = []
+
+    async def __call__(self, endpoint, hedge):
+        self.started.append((endpoint.base_url, hedge))
+        try:
+            await asyncio.sleep(self.delays[endpoint.base_url])
+        except asyncio.CancelledError:
+            self.cancelled.append(endpoint.base_url)
+            raise
+        return httpx.Response(200, json={"from": endpoint.base_url})
+
+
+def test_backup_wins_and_the_slow_primary_is_cancelled():
+    async def scenario():
+        router = make_router()
+        policy = make_policy()
+        send = Sender({"http://primary": 5.0, "http://backup": 0.0})
+
+        response, endpoint, _ = await asyncio.wait_for(policy.run(send, router.primary, router), timeout=2)
+        await asyncio.sleep(0)
+
+        assert response.json() == {"from": "http://backup"}
+        assert endpoint.base_url == "http://backup"
+        assert send.started == [("http://primary", False), ("http://backup", True)]
+        assert send.cancelled == ["http://primary"]
+        assert policy.stats()["hedge_wins"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_primary_that_answers_before_the_delay_is_not_hedged():
+    async def scenario():
+        router = make_router()
+        policy = make_policy()
+        send = Sender({"http://primary": 0.0, "http://backup": 0.0})
+
+        response, endpoint, _ = await policy.run(send, router.primary, router)
+
+        assert endpoint is router.primary
+        assert send.started == [("http://primary", False)]
+        assert policy.stats()["hedged"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_primary_that_wins_the_race_cancels_the_backup():
+    async def scenario():
+        router = make_router()
+        policy = make_policy()
+        send = Sender({"http://primary": 0.12, "http://backup": 5.0})
+
+        response, endpoint, _ = await asyncio.wait_for(policy.run(send, router.primary, router), timeout=2)
+        await asyncio.sleep(0)
+
+        assert endpoint is router.primary
+        assert send.cancelled == ["http://backup"]
+        assert policy.stats()["hedged"] == 1
+        assert policy.stats()["hedge_wins"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_no_hedge_without_an_alternate_endpoint():
+    async def scenario():
+        router = make_router(urls=("http://primary",))
+        policy = make_policy()
+        send = Sender({"http://primary": 0.1})
+
+        response, endpoint, _ = await policy.run(send, router.primary, router)
+
+        assert endpoint is router.primary
+        assert send.started == [("http://primary", False)]
+        assert policy.stats()["no_alternative"] == 1
+        assert policy.stats()["hedged"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_no_hedge_while_every_alternate_is_cooling_down():
+    async def scenario():
+        router = make_router()
+        router.record_failure(router.endpoints[1], 0.05, saturated=True)
+        policy = make_policy()
+        send = Sender({"http://primary": 0.1, "http://backup": 0.0})
+
+        _, endpoint, _ = await policy.run(send, router.primary, router)
+
+        assert endpoint is router.primary
+        assert policy.stats()["no_alternative"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_hedges_stay_within_the_rate_budget():
+    async def scenario():
+        router = make_router()
+        policy = HedgePolicy(enabled=True, percentile=95, min_delay=0.01, min_samples=5, max_rate=0.5)
+        send = Sender({"http://primary": 0.1, "http://backup": 0.0})
+
+        for _ in range(4):
+            await policy.run(send, router.primary, router)
+
+        stats = policy.stats()
+        assert stats["hedged"] == 2
+        assert stats["over_budget"] == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,67 @@
+import pytest
+
+from llm.json_repair import repair_json
+
+
+@pytest.mark.parametrize("text, action_type, expected, repairs", [
+    ('{"score": 7, "reason": "ok"}', "environment_evaluation", {"score": 7, "reason": "ok"}, []),
+    ('{"score": 7, "reason": "ok",}', "environment_evaluation", {"score": 7, "reason": "ok"}, ["trailing_commas"]),
+    ('{"actions": [{"type": "like", "target_post_id": 3},],}', "interaction_decision",
+     {"actions": [{"type": "like", "target_post_id": 3}]}, ["trailing_commas"]),
+    ('```json\n{"new_stance": 1}\n```', "stance_adjustment", {"new_stance": 1}, ["fences"]),
+    ('```\n{"new_stance": -1}\n```', "stance_adjustment", {"new_stance": -1}, ["fences"]),
+    ('Sure! Here you go: {"score": 4} Hope that helps.', "environment_evaluation", {"score": 4}, ["extracted"]),
+    ("{'score': 5, 'reason': 'it\\'s fine'}", "environment_evaluation", {"score": 5, "reason": "it's fine"}, ["quotes"]),
+    ('{"migrate": True, "target": None}', "unknown", {"migrate": True, "target": None}, ["quotes"]),
+    ('{"reason": "say \\"hi\\"", "score": 6}', "environment_evaluation", {"reason": 'say "hi"', "score": 6}, []),
+    ('{"reason": "a } inside", "score": 6}', "environment_evaluation", {"reason": "a } inside", "score": 6}, []),
+])
+def test_repairs_malformed_json(text, action_type, expected, repairs):
+    value, applied = repair_json(text, action_type=action_type)
+    assert value == expected
+    assert applied == repairs
+
+
+@pytest.mark.parametrize("text, action_type, expected, repairs", [
+    ('{"score": "8/10"}', "environment_evaluation", {"score": 8}, ["score"]),
+    ('{"score": 14}', "environment_evaluation", {"score": 10}, ["score"]),
+    ('{"score": 6.6}', "environment_evaluation", {"score": 7}, ["score"]),
+    ('{"new_stance": "-3"}', "stance_adjustment", {"new_stance": -2}, ["new_stance"]),
+    ('{"actions": {"type": "Like", "target_post_id": 1}}', "interaction_decision",
+     {"actions": [{"type": "like", "target_post_id": 1}]}, ["actions_list", "action_types"]),
+    ('{"actions": ["silent"]}', "interaction_decision", {"actions": [{"type": "silent"}]}, ["action_strings"]),
+    ('{"actions": [{"type": "dance"}, {"type": "like", "target_post_id": 2}]}', "interaction_decision",
+     {"actions": [{"type": "like", "target_post_id": 2}]}, ["dropped_actions"]),
+    ('[{"type": "silent"}]', "interaction_decision", {"actions": [{"type": "silent"}]}, ["actions_wrapped"]),
+    ('[{"type": "like", "target_post_id": 1}, {"type": "follow", "target_user_id": 4}]', "interaction_decision",
+     {"actions": [{"type": "like", "target_post_id": 1}, {"type": "follow", "target_user_id": 4}]}, ["actions_wrapped"]),
+    ('{"actions": [{"type": "silent"}]}', "fused_turn", {"actions": [{"type": "silent"}]}, []),
+    ('{"evaluation": {"score": "9"}, "stance": {"new_stance": 2.2}}', "fused_turn",
+     {"evaluation": {"score": 9}, "stance": {"new_stance": 2}}, ["score", "new_stance"]),
+])
+def test_coerces_schema_fields(text, action_type, expected, repairs):
+    value, applied = repair_json(text, action_type=action_type)
+    assert value == expected
+    assert applied == repairs
+
+
+@pytest.mark.parametrize("text, action_type", [
+    ('{"score": 7, "reason": "unterminated}', "environment_evaluation"),
+    ('{"reason": "cut off mid', "environment_evaluation"),
+    ("no json here at all", "environment_evaluation"),
+    ('{"score": 7', "environment_evaluation"),
+    ('{"score": "great"}', "environment_evaluation"),
+    ('{"new_stance": true}', "stance_adjustment"),
+    ('{"actions": "like"}', "interaction_decision"),
+    ('{"actions": [{"type": "dance"}]}', "interaction_decision"),
+    ('{"a": 1 "b": 2}', "unknown"),
+])
+def test_rejects_unrecoverable_text(text, action_type):
+    with pytest.raises(ValueError):
+        repair_json(text, action_type=action_type)
+
+
+def test_expect_array_extracts_the_list():
+    value, applied = repair_json('Posts: [1, 2, 3,] done', expect_array=True)
+    assert value == [1, 2, 3]
+    assert applied == ["extracted", "trailing_commas"]
@@ -0,0 +1,72 @@
+import csv
+import os
+
+import pytest
+
+from utils import logger
+from utils.config import TOKEN_USAGE_CSV
+from utils.logger import log_token_usage, log_token_usage_separator, set_output_directory
+
+
+@pytest.fixture(autouse=True)
+def output_dir(tmp_path):
+    set_output_directory(str(tmp_path))
+    logger._CHECKED_HEADERS.clear()
+    yield tmp_path
+    logger._CHECKED_HEADERS.clear()
+
+
+def read_rows(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        return list(csv.reader(f))
+
+
+def record(**overrides):
+    return dict({"timestamp": "t", "round": 1, "user_id": 3, "action_type": "interaction_decision",
+                 "prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15, "model": "m"}, **overrides)
+
+
+def test_token_usage_rows_match_the_header(output_dir):
+    log_token_usage(record(source="cache", saved_tokens=15))
+    log_token_usage(record())
+    header, *rows = read_rows(output_dir / TOKEN_USAGE_CSV)
+    assert all(len(row) == len(header) for row in rows)
+    assert dict(zip(header, rows[0]))["source"] == "cache"
+    assert dict(zip(header, rows[1]))["cached_tokens"] == "0"
+
+
+def test_existing_file_with_an_old_header_is_rotated(output_dir):
+    path = output_dir / TOKEN_USAGE_CSV
+    old_header = ["timestamp", "round", "user_id", "action_type", "prompt_tokens", "completion_tokens",
+                  "total_tokens", "model"]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows([old_header, ["t", 1, 3, "x", 10, 5, 15, "m"]])
+
+    log_token_usage(record())
+
+    rotated = output_dir / (os.path.splitext(TOKEN_USAGE_CSV)[0] + ".old1.csv")
+    assert read_rows(rotated)[0] == old_header
+    header, row = read_rows(path)
+    assert len(header) == len(row) == 11
+
+
+def test_rotation_does_not_overwrite_earlier_rotations(output_dir):
+    path = output_dir / TOKEN_USAGE_CSV
+    for columns in (["a"], ["b"]):
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            csv.writer(f).writerow(columns)
+        logger._CHECKED_HEADERS.clear()
+        log_token_usage(record())
+    root = os.path.splitext(TOKEN_USAGE_CSV)[0]
+    assert read_rows(output_dir / f"{root}.old1.csv") == [["a"]]
+    assert read_rows(output_dir / f"{root}.old2.csv") == [["b"]]
+
+
+def test_matching_header_is_appended_to_on_resume(output_dir):
+    log_token_usage(record())
+    log_token_usage_separator(2)
+    logger._CHECKED_HEADERS.clear()
+    log_token_usage(record(round=2))
+    rows = read_rows(output_dir / TOKEN_USAGE_CSV)
+    assert len(rows) == 4
+    assert not any(name.endswith(".old1.csv") for name in os.listdir(output_dir))
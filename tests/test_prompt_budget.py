@@ -0,0 +1,77 @@
+import pytest
+
+from utils.prompt_budget import fit_items, prompt_profile, section_budgets, set_section_budget_scale
+from utils.prompts import build_create_post_prompt, build_environment_evaluation_prompt
+
+
+@pytest.fixture(autouse=True)
+def default_scale():
+    set_section_budget_scale(1.0)
+    yield
+    set_section_budget_scale(1.0)
+
+
+def make_profile(changes):
+    return {
+        "name": "u0",
+        "age": 30,
+        "stance": 1,
+        "history": [],
+        "stance_history": [{"old_stance": i % 3 - 1, "new_stance": i % 3, "change_type": f"change{i}"}
+                           for i in range(changes)],
+    }
+
+
+def test_fit_items_drops_oldest_items_first():
+    kept, text, dropped = fit_items(list(range(100)), 20, lambda items: " ".join(f"item{i}" for i in items))
+    assert kept == list(range(dropped, 100))
+    assert dropped > 0
+    assert kept[-1] == 99
+
+
+def test_profile_json_leaves_out_the_budgeted_lists():
+    profile = make_profile(3)
+    assert set(prompt_profile(profile)) == {"name", "age", "stance"}
+
+
+@pytest.mark.parametrize("build", [
+    lambda profile, report: build_create_post_prompt(profile, report),
+    lambda profile, report: build_environment_evaluation_prompt("user_0", profile, "A", [], [], report),
+])
+def test_short_stance_history_is_included_whole(build):
+    report = {}
+    prompt = build(make_profile(3), report)
+    assert all(f"change{i}" in prompt for i in range(3))
+    assert "stance_history" not in report["trimmed"]
+    assert report["sections"]["stance_history"] > 0
+
+
+@pytest.mark.parametrize("build", [
+    lambda profile, report: build_create_post_prompt(profile, report),
+    lambda profile, report: build_environment_evaluation_prompt("user_0", profile, "A", [], [], report),
+])
+def test_long_stance_history_is_trimmed_oldest_first(build):
+    report = {}
+    prompt = build(make_profile(50), report)
+    budget = section_budgets()["stance_history"]
+    assert report["trimmed"]["stance_history"] > 0
+    assert report["sections"]["stance_history"] <= budget
+    assert "change49" in prompt
+    assert "change0\"" not in prompt
+
+
+def test_budget_scale_shrinks_the_stance_history_section():
+    full = {}
+    build_create_post_prompt(make_profile(50), full)
+    set_section_budget_scale(0.5)
+    scaled = {}
+    build_create_post_prompt(make_profile(50), scaled)
+    assert scaled["sections"]["stance_history"] < full["sections"]["stance_history"]
+    assert scaled["trimmed"]["stance_history"] > full["trimmed"]["stance_history"]
+
+
+def test_empty_stance_history_adds_nothing():
+    report = {}
+    prompt = build_create_post_prompt(make_profile(0), report)
+    assert "stance changes" not in prompt
+    assert report["sections"]["stance_history"] == 0
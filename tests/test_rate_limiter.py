@@ -0,0 +1,71 @@
+import multiprocessing
+import time
+
+from llm import rate_limiter
+from llm.rate_limiter import TokenBucketRateLimiter, _LAST_REFILL
+
+
+def drain(limiter, count, tokens, results):
+    results.put([limiter.try_acquire(tokens) for _ in range(count)])
+
+
+def run_in_child(target, *args):
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    process = context.Process(target=target, args=args + (results,))
+    process.start()
+    waits = results.get(timeout=10)
+    process.join(timeout=10)
+    assert process.exitcode == 0
+    return waits
+
+
+def test_requests_taken_in_another_process_empty_the_shared_bucket():
+    limiter = TokenBucketRateLimiter(requests_per_minute=60, tokens_per_minute=0, headroom=1.0)
+
+    waits = run_in_child(drain, limiter, 60, 0)
+
+    assert waits == [0.0] * 60
+    assert limiter.try_acquire(0) > 0
+    assert limiter.stats()["admitted"] == 60
+
+
+def test_refill_is_shared_across_processes(monkeypatch):
+    limiter = TokenBucketRateLimiter(requests_per_minute=60, tokens_per_minute=0, headroom=1.0)
+    run_in_child(drain, limiter, 60, 0)
+    drained_at = limiter._state[_LAST_REFILL]
+
+    monkeypatch.setattr(rate_limiter.time, "time", lambda: drained_at + 3.5)
+    assert [limiter.try_acquire(0) for _ in range(3)] == [0.0] * 3
+    assert limiter.try_acquire(0) > 0
+
+    monkeypatch.undo()
+    limiter._state[_LAST_REFILL] = time.time() - 2.0
+    waits = run_in_child(drain, limiter, 3, 0)
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] > 0
+    assert limiter.stats()["admitted"] == 65
+
+
+def test_token_bucket_refills_at_the_per_second_rate(monkeypatch):
+    limiter = TokenBucketRateLimiter(requests_per_minute=0, tokens_per_minute=6000, headroom=1.0)
+    now = limiter._state[_LAST_REFILL]
+    monkeypatch.setattr(rate_limiter.time, "time", lambda: now)
+
+    assert limiter.try_acquire(6000) == 0.0
+    assert abs(limiter.try_acquire(500) - 5.0) < 1e-6
+
+    now += 5.0
+    assert limiter.try_acquire(500) == 0.0
+    assert limiter.stats()["tokens_charged"] == 6500
+
+
+def test_reconcile_charges_the_difference_to_the_shared_bucket(monkeypatch):
+    limiter = TokenBucketRateLimiter(requests_per_minute=0, tokens_per_minute=6000, headroom=1.0)
+    now = limiter._state[_LAST_REFILL]
+    monkeypatch.setattr(rate_limiter.time, "time", lambda: now)
+
+    assert limiter.try_acquire(1000) == 0.0
+    limiter.reconcile(1000, 3000)
+    assert limiter.stats()["tokens_available"] == 3000
+    assert limiter.stats()["tokens_charged"] == 3000
@@ -0,0 +1,53 @@
+import pytest
+
+from models.round_engine import RoundEngine, StagedNetwork, snapshot_network
+from models.social_network import SocialNetwork
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+def make_network():
+    network = SocialNetwork()
+    for user_id in (0, 1):
+        network.add_user(user_id)
+        network.user_servers[user_id] = "A"
+    network.add_post({"author": 1, "content": "hello", "likes": 0, "comments": [], "stance": 0,
+                      "timestamp": "2026-01-01T00:00:00"}, "A")
+    return network
+
+
+def test_staged_like_is_visible_to_the_agent_within_the_phase():
+    network = make_network()
+    post_id = network.posts_A[-1]["post_id"]
+    view = StagedNetwork(snapshot_network(network), 0)
+
+    assert str(post_id) not in view.user_likes.get(0, set())
+    view.add_interaction(0, post_id, "like_post")
+    assert str(post_id) in view.user_likes.get(0, set())
+    assert 0 not in network.user_likes
+
+
+def test_staged_likes_do_not_leak_into_other_views():
+    network = make_network()
+    post_id = network.posts_A[-1]["post_id"]
+    snapshot = snapshot_network(network)
+    view = StagedNetwork(snapshot, 0)
+    other = StagedNetwork(snapshot, 1)
+
+    view.add_interaction(0, post_id, "like_post")
+    assert str(post_id) not in other.user_likes.get(0, set())
+
+
+def test_commit_applies_a_like_once():
+    network = make_network()
+    post = network.posts_A[-1]
+    engine = RoundEngine(network, enabled=True)
+    view = StagedNetwork(snapshot_network(network), 0)
+
+    view.add_interaction(0, post["post_id"], "like_post")
+    engine.commit([view])
+    assert post["likes"] == 1
+    assert engine.stats()["intents"] == {"add_interaction": 1}
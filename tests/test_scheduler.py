@@ -0,0 +1,107 @@
+import asyncio
+
+from llm.concurrency import AdaptiveConcurrencyController
+from llm.scheduler import PriorityScheduler
+
+ORDER = ["critical", "decision", "followup", "deferrable"]
+CLASSES = {"migration": "critical", "interaction_decision": "decision", "stance_adjustment": "followup",
+           "summary": "deferrable"}
+
+
+def make_scheduler(capacity, shares=None):
+    return PriorityScheduler(capacity, enabled=True, classes=CLASSES, order=ORDER,
+                             shares=shares or {name: 1.0 for name in ORDER})
+
+
+async def start_waiters(scheduler, action_types, admitted):
+    async def waiter(action_type):
+        name = await scheduler.acquire(action_type)
+        admitted.append(action_type)
+        return name
+
+    tasks = []
+    for action_type in action_types:
+        tasks.append(asyncio.create_task(waiter(action_type)))
+        await asyncio.sleep(0)
+    return tasks
+
+
+def test_waiters_are_admitted_by_priority_then_arrival():
+    async def scenario():
+        limit = [1]
+        scheduler = make_scheduler(lambda: limit[0])
+        holder = await scheduler.acquire("summary")
+        admitted = []
+        tasks = await start_waiters(scheduler, ["summary", "stance_adjustment", "interaction_decision", "migration",
+                                                "interaction_decision"], admitted)
+        assert admitted == []
+
+        scheduler.release(holder)
+        for expected in ["migration", "interaction_decision", "interaction_decision", "stance_adjustment", "summary"]:
+            await asyncio.sleep(0)
+            assert admitted[-1] == expected
+            scheduler.release(scheduler.class_of(expected))
+        await asyncio.gather(*tasks)
+        assert sum(scheduler.active.values()) == 0
+
+    asyncio.run(scenario())
+
+
+def test_lower_classes_are_capped_to_their_share_while_higher_classes_wait():
+    async def scenario():
+        scheduler = make_scheduler(lambda: 4, shares={"critical": 1.0, "decision": 1.0, "followup": 0.5,
+                                                      "deferrable": 0.25})
+        held = [await scheduler.acquire("summary"), await scheduler.acquire("interaction_decision")]
+        admitted = []
+        tasks = await start_waiters(scheduler, ["summary", "interaction_decision", "interaction_decision",
+                                                "interaction_decision"], admitted)
+        await asyncio.sleep(0)
+        assert admitted == ["interaction_decision", "interaction_decision"]
+
+        scheduler.release(held.pop(0))
+        await asyncio.sleep(0)
+        assert admitted[-1] == "interaction_decision"
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run(scenario())
+
+
+def test_waiters_are_woken_when_the_concurrency_limit_grows():
+    async def scenario():
+        controller = AdaptiveConcurrencyController(max_limit=4, min_limit=1, initial_limit=1)
+        scheduler = make_scheduler(lambda: controller.limit)
+        controller.on_limit_increase(scheduler.wake)
+        holder = await scheduler.acquire("interaction_decision")
+        admitted = []
+        tasks = await start_waiters(scheduler, ["interaction_decision"], admitted)
+        assert admitted == []
+
+        await controller.acquire()
+        await controller.release(True)
+        assert int(controller.limit) == 2
+        await asyncio.sleep(0)
+        assert admitted == ["interaction_decision"]
+        scheduler.release(holder)
+        scheduler.release(await tasks[0])
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_does_not_hold_a_slot():
+    async def scenario():
+        scheduler = make_scheduler(lambda: 1)
+        holder = await scheduler.acquire("migration")
+        admitted = []
+        tasks = await start_waiters(scheduler, ["interaction_decision", "summary"], admitted)
+        tasks[0].cancel()
+        await asyncio.sleep(0)
+
+        scheduler.release(holder)
+        await asyncio.sleep(0)
+        assert admitted == ["summary"]
+        assert scheduler.waiting["decision"] == 0
+        scheduler.release(await tasks[1])
+
+    asyncio.run(scenario())
@@ -0,0 +1,119 @@
+import copy
+import random
+
+import httpx
+import pytest
+
+from agents.social_agent import SocialAgent
+from llm.cache import ResponseCache
+from llm.client import AsyncLLMClient
+from models.round_engine import RoundEngine, StagedNetwork, run_agent_turns
+from models.sharding import FEED_WINDOW, ShardCoordinator, author_window
+from models.social_network import SocialNetwork
+from utils.logger import set_output_directory
+from utils.mock_llm_server import MockLLM
+from utils.config import MAX_FOLLOWING_POSTS, MAX_SERVER_POSTS
+from utils.seeding import rng_stream, set_run_seed
+
+
+class MockTransport:
+    def __init__(self):
+        self.mock = MockLLM(latency="fixed", latency_mean=0.0, error_rates={})
+
+    async def post_chat(self, data, timeout=60, base_url=None):
+        _, status, payload = self.mock.complete(data, 0)
+        return httpx.Response(status, json=payload)
+
+    async def aclose(self):
+        pass
+
+
+def make_client():
+    return AsyncLLMClient(transport=MockTransport(), cache=ResponseCache(mode="off"))
+
+
+def without_timestamps(value):
+    if isinstance(value, dict):
+        return {key: without_timestamps(item) for key, item in value.items() if key != "timestamp"}
+    if isinstance(value, (list, tuple)):
+        return [without_timestamps(item) for item in value]
+    return value
+
+
+def run_simulation(sharded, users, rounds):
+    set_run_seed(11)
+    network = SocialNetwork()
+    llm_client = make_client()
+    agents = [SocialAgent({"name": f"u{i}", "stance": i % 5 - 2, "age": 30, "interests": []}, i, network,
+                          "ABC"[i % 3], llm_client=llm_client) for i in range(users)]
+    engine = RoundEngine(network)
+    committed = []
+    commit = engine.commit
+
+    def recording_commit(views):
+        committed.append(without_timestamps([copy.deepcopy(view.intents) for view in views]))
+        commit(views)
+
+    engine.commit = recording_commit
+    coordinator = ShardCoordinator(network, agents, engine, llm_client, enabled=sharded,
+                                   client_factory=make_client).start()
+    try:
+        for round_num in range(1, rounds + 1):
+            for agent in agents:
+                agent.current_round = round_num
+            posters = rng_stream(round_num, "posters").sample(agents, 4)
+            poster_ids = {agent.user_id for agent in posters}
+            if sharded:
+                coordinator.run_phase("post", posters, round_num)
+                coordinator.run_phase("interact", agents, round_num, poster_ids)
+            else:
+                engine.run_phase(posters, lambda agent: agent.create_post(), run_agent_turns)
+                engine.run_phase(agents, lambda agent: agent.interact_with_posts(round_num, agent.user_id in poster_ids),
+                                 run_agent_turns)
+    finally:
+        coordinator.stop()
+        llm_client.close()
+    return committed, network, coordinator.stats()
+
+
+@pytest.mark.parametrize("users, rounds", [(12, 4), (5, 12)])
+def test_sharded_phases_commit_the_same_intents_as_the_round_engine(tmp_path, monkeypatch, users, rounds):
+    monkeypatch.chdir(tmp_path)
+    set_output_directory(str(tmp_path))
+    unsharded, _, _ = run_simulation(sharded=False, users=users, rounds=rounds)
+    sharded, network, stats = run_simulation(sharded=True, users=users, rounds=rounds)
+    assert len(sharded) == len(unsharded) == rounds * 2
+    for phase, (expected, actual) in enumerate(zip(unsharded, sharded)):
+        assert actual == expected, f"phase {phase} differs"
+
+    changed = sum(1 for phase in sharded for intents in phase for name, _ in intents
+                  if name in ("add_post", "add_interaction"))
+    assert stats["posts_shipped"] <= changed * stats["shards"]
+    if rounds > FEED_WINDOW:
+        assert any(len(author_window(network.get_server_posts(server))) < len(network.get_server_posts(server))
+                   for server in network.servers)
+
+
+def test_author_windows_give_the_same_feeds_as_full_post_lists():
+    rng = random.Random(5)
+    servers = ["A", "B", "C"]
+    authors = [f"user_{i}" for i in range(8)]
+    posts = {server: [] for server in servers}
+    for post_id in range(300):
+        posts[rng.choice(servers)].append({"post_id": post_id, "author": rng.choice(authors),
+                                           "timestamp": f"2026-01-01T00:{post_id // 60:02d}:{post_id % 60:02d}"})
+
+    def snapshot(lists, following):
+        return {"servers": servers, "user_likes": {}, "user_following": {"me": following}, "user_servers": {},
+                **{f"posts_{server}": lists[server] for server in servers}}
+
+    windowed = {server: author_window(server_posts) for server, server_posts in posts.items()}
+    assert sum(map(len, windowed.values())) < 300
+    for _ in range(50):
+        following = set(rng.sample(authors, rng.randint(0, len(authors))))
+        for server in servers:
+            expected = StagedNetwork(snapshot(posts, following), "me").get_mixed_posts_for_user(
+                "me", server, MAX_FOLLOWING_POSTS, MAX_SERVER_POSTS)
+            actual = StagedNetwork(snapshot(windowed, following), "me").get_mixed_posts_for_user(
+                "me", server, MAX_FOLLOWING_POSTS, MAX_SERVER_POSTS)
+            assert actual == expected
@@ -0,0 +1,75 @@
+import pytest
+
+from llm.streaming import JSONStreamScanner, STREAM_COMPLETE, STREAM_MALFORMED, STREAM_PENDING
+
+DECISION = '{"actions": [{"type": "comment", "target_post_id": 3, "content": "a \\"quoted\\" {brace} ]"}, {"type": "like", "target_post_id": 4}]}'
+CASES = [
+    (DECISION, "interaction_decision", False, STREAM_COMPLETE),
+    ("Here is my answer:\n" + DECISION + "\nThanks!", "interaction_decision", False, STREAM_COMPLETE),
+    ('{"score": 7, "reason": "path C:\\\\temp\\\\"}', "environment_evaluation", False, STREAM_COMPLETE),
+    ('[{"content": "x"}, {"content": "y"}]', "unknown", True, STREAM_COMPLETE),
+    ('{"actions": [{"type": "dance"}, {"type": "like"}]}', "interaction_decision", False, STREAM_MALFORMED),
+    ('{"reason": "no score"}', "environment_evaluation", False, STREAM_MALFORMED),
+    ('["wrong opener"]', "environment_evaluation", False, STREAM_MALFORMED),
+    ('{"score": 7]', "environment_evaluation", False, STREAM_MALFORMED),
+    ('{"score": 7,}', "environment_evaluation", False, STREAM_MALFORMED),
+    ('{"score": 7, "reason": "still going', "environment_evaluation", False, STREAM_PENDING),
+]
+
+
+def outcome(scanner):
+    return scanner.state, scanner.json_text if scanner.state == STREAM_COMPLETE else None
+
+
+def scan(chunks, action_type, expect_array):
+    scanner = JSONStreamScanner(expect_array=expect_array, action_type=action_type, max_chars=10000,
+                                max_preamble=200)
+    for chunk in chunks:
+        if scanner.feed(chunk) != STREAM_PENDING:
+            break
+    return scanner
+
+
+@pytest.mark.parametrize("text, action_type, expect_array, state", CASES)
+def test_whole_response(text, action_type, expect_array, state):
+    scanner = scan([text], action_type, expect_array)
+    assert scanner.state == state
+    if state == STREAM_COMPLETE:
+        assert scanner.json_text == text[text.index("[" if expect_array else "{"):text.rindex("]" if expect_array else "}") + 1]
+
+
+@pytest.mark.parametrize("text, action_type, expect_array, state", CASES)
+def test_every_two_chunk_split_matches_the_whole_response(text, action_type, expect_array, state):
+    whole = scan([text], action_type, expect_array)
+    for split in range(1, len(text)):
+        scanner = scan([text[:split], text[split:]], action_type, expect_array)
+        assert outcome(scanner) == outcome(whole), split
+
+
+@pytest.mark.parametrize("text, action_type, expect_array, state", CASES)
+def test_single_character_chunks_match_the_whole_response(text, action_type, expect_array, state):
+    whole = scan([text], action_type, expect_array)
+    scanner = scan(list(text), action_type, expect_array)
+    assert outcome(scanner) == outcome(whole)
+
+
+def test_unknown_action_type_fails_before_the_object_closes():
+    scanner = JSONStreamScanner(action_type="interaction_decision", max_chars=10000, max_preamble=200)
+    assert scanner.feed('{"actions": [{"type": "da') == STREAM_PENDING
+    assert scanner.feed('nce", "target_post_id": 1}') == STREAM_MALFORMED
+    assert "dance" in scanner.error
+
+
+def test_chunks_after_the_value_closes_are_ignored():
+    scanner = JSONStreamScanner(action_type="environment_evaluation", max_chars=10000, max_preamble=200)
+    assert scanner.feed('{"score": 5}') == STREAM_COMPLETE
+    assert scanner.feed(' and {"score": 9}') == STREAM_COMPLETE
+    assert scanner.json_text == '{"score": 5}'
+
+
+def test_limits_fail_a_stream_that_never_starts_or_never_ends():
+    preamble = JSONStreamScanner(action_type="environment_evaluation", max_chars=10000, max_preamble=10)
+    assert preamble.feed("I think that ") == STREAM_MALFORMED
+    runaway = JSONStreamScanner(action_type="environment_evaluation", max_chars=50, max_preamble=10)
+    assert runaway.feed('{"reason": "' + "x" * 30) == STREAM_PENDING
+    assert runaway.feed("y" * 30) == STREAM_MALFORMED
@@ -0,0 +1,100 @@
+import pytest
+
+from agents.social_agent import SocialAgent
+from llm import tokenizer
+from llm.tokenizer import HeuristicTokenizer, count_tokens, truncate_to_tokens
+from models.social_network import SocialNetwork
+from utils.config import MAX_TOKEN_COUNT, TRUNCATED_PROMPT_TOKENS
+
+SUFFIX = "\n\n[Content truncated to save tokens]"
+
+
+@pytest.fixture(autouse=True)
+def heuristic_tokenizer(monkeypatch):
+    monkeypatch.setattr(tokenizer, "_tokenizer", HeuristicTokenizer(calibration=1.0))
+    tokenizer._count_line.cache_clear()
+    yield
+    tokenizer._count_line.cache_clear()
+
+
+def test_counts_words_newlines_and_long_runs():
+    assert count_tokens("hello world") == 2
+    assert count_tokens("hello\nworld") == 3
+    assert count_tokens("12345") == 2
+    assert count_tokens("") == 0
+
+
+@pytest.mark.parametrize("text", ["one two three four", "one two\nthree four\nfive", "a\n\n\nb"])
+def test_text_at_the_limit_is_unchanged(text):
+    assert truncate_to_tokens(text, count_tokens(text)) == text
+    assert truncate_to_tokens(text, count_tokens(text), suffix=SUFFIX) == text
+
+
+@pytest.mark.parametrize("text", ["one two three four", "one two\nthree four\nfive", "alpha beta\ngamma delta"])
+def test_one_token_over_the_limit_is_truncated(text):
+    limit = count_tokens(text) - 1
+    truncated = truncate_to_tokens(text, limit)
+    assert truncated != text
+    assert text.startswith(truncated)
+    assert count_tokens(truncated) <= limit
+
+
+def test_cut_inside_a_line_keeps_the_earlier_lines():
+    assert truncate_to_tokens("one two\nthree four five", 5) == "one two\nthree four "
+
+
+def test_cut_at_a_line_boundary_drops_the_empty_partial():
+    assert truncate_to_tokens("one two\nthree four", 2) == "one two"
+
+
+def test_suffix_counts_against_the_budget():
+    text = " ".join(f"word{i}" for i in range(200))
+    limit = 50
+    truncated = truncate_to_tokens(text, limit, suffix=SUFFIX)
+    assert truncated.endswith(SUFFIX)
+    assert count_tokens(truncated) <= limit
+    assert count_tokens(truncated) >= limit - 2
+
+
+def test_budget_smaller_than_the_suffix_returns_only_the_suffix():
+    assert truncate_to_tokens("one two three", 1, suffix=SUFFIX) == SUFFIX
+
+
+@pytest.mark.skipif(tokenizer.tiktoken is None, reason="tiktoken is not installed")
+def test_tiktoken_truncation_stays_within_the_limit(monkeypatch):
+    try:
+        monkeypatch.setattr(tokenizer, "_tokenizer", tokenizer.TiktokenTokenizer())
+    except Exception as e:
+        pytest.skip(f"tiktoken encoding unavailable: {e}")
+    tokenizer._count_line.cache_clear()
+    text = "\n".join("The quick brown fox jumps over the lazy dog " * 5 for _ in range(20))
+    for limit in (10, 57, 200):
+        truncated = truncate_to_tokens(text, limit, suffix=SUFFIX)
+        assert count_tokens(truncated) <= limit
+
+
+class RecordingClient:
+    def __init__(self):
+        self.prompts = []
+
+    def chat(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return {}
+
+
+@pytest.mark.parametrize("words, truncated", [(MAX_TOKEN_COUNT, False), (TRUNCATED_PROMPT_TOKENS + 5000, True)])
+def test_agent_truncates_long_prompts_to_the_configured_target(tmp_path, monkeypatch, words, truncated):
+    monkeypatch.chdir(tmp_path)
+    client = RecordingClient()
+    agent = SocialAgent({"name": "u0", "stance": 0, "age": 30, "interests": []}, 0, SocialNetwork(), "A",
+                        llm_client=client)
+    prompt = "\n".join(["word"] * words)
+
+    agent._query_openai(prompt)
+
+    sent = client.prompts[0]
+    if truncated:
+        assert sent.endswith("[Content truncated to save tokens]")
+        assert TRUNCATED_PROMPT_TOKENS - 10 <= count_tokens(sent) <= TRUNCATED_PROMPT_TOKENS
+    else:
+        assert sent == prompt
@@ -21,13 +21,113 @@ RETRYABLE_ERROR_SUBSTRINGS = [
     "model_not_found",
 ]
 
+LLM_MAX_CONCURRENCY = 8
+LLM_MIN_CONCURRENCY = 1
+LLM_INITIAL_CONCURRENCY = 4
+LLM_AIMD_DECREASE_FACTOR = 0.5
+LLM_AIMD_DECREASE_INTERVAL = 2.0
+LLM_BREAKER_WINDOW = 20
+LLM_BREAKER_MIN_CALLS = 10
+LLM_BREAKER_ERROR_THRESHOLD = 0.5
+LLM_BREAKER_OPEN_SECONDS = 15.0
+LLM_BREAKER_MODE = "queue"
+LLM_POOL_SIZE = 32
+LLM_KEEPALIVE_EXPIRY = 30.0
+LLM_HTTP2 = True
+LLM_TEMPERATURE = 0.7
+
+LLM_CACHE_MODE = "off"
+LLM_CACHE_PATH = "cache/llm_responses.sqlite"
+LLM_CACHE_MAX_BYTES = 512 * 1024 * 1024
+LLM_CACHE_BYPASS_NONZERO_TEMPERATURE = False
+
+LLM_JOURNAL_MODE = "off"
+
+LLM_BATCH_MODE = "off"
+LLM_BATCH_DIR = "batches"
+LLM_BATCH_POLL_INTERVAL = 30.0
+LLM_BATCH_COMPLETION_WINDOW = "24h"
+
+# Only deterministic calls are coalesced by default, so single-flight is inactive while LLM_TEMPERATURE > 0
+LLM_SINGLE_FLIGHT = True
+LLM_SINGLE_FLIGHT_BYPASS_NONZERO_TEMPERATURE = True
+
+LLM_RPM_LIMIT = 500
+LLM_TPM_LIMIT = 200000
+LLM_RATE_LIMIT_HEADROOM = 0.9
+LLM_COMPLETION_TOKEN_ESTIMATE = 150
+
+LLM_JSON_REPAIR = True
+
+LLM_ROUND_TOKEN_BUDGET = 0
+LLM_RUN_TOKEN_BUDGET = 0
+LLM_PROMPT_COST_PER_MILLION = 0.15
+LLM_COMPLETION_COST_PER_MILLION = 0.60
+LLM_BUDGET_RECOVERY_RATIO = 0.8
+LLM_BUDGET_PROMPT_SCALE = 0.5
+LLM_BUDGET_AGENT_SAMPLE_RATE = 0.5
+
+LLM_SCHEDULER_ENABLED = True
+LLM_PRIORITY_ORDER = ["critical", "decision", "followup", "deferrable"]
+LLM_PRIORITY_CLASSES = {
+    "post_creation": "critical",
+    "interaction_decision": "decision",
+    "group_interaction_decision": "decision",
+    "fused_turn": "decision",
+    "stance_adjustment": "followup",
+    "environment_evaluation": "deferrable",
+    "reflection": "deferrable",
+}
+LLM_PRIORITY_SHARES = {"critical": 1.0, "decision": 1.0, "followup": 0.5, "deferrable": 0.25}
+
+LLM_HEDGE_ENABLED = False
+LLM_HEDGE_PERCENTILE = 95
+LLM_HEDGE_MIN_DELAY = 2.0
+LLM_HEDGE_MIN_SAMPLES = 10
+LLM_HEDGE_MAX_RATE = 0.1
+
+LLM_STREAMING = False
+LLM_STREAM_MAX_CHARS = 6000
+LLM_STREAM_MAX_PREAMBLE = 200
+
+LLM_TOKENIZER = "auto"
+LLM_TOKENIZER_ENCODING = "o200k_base"
+LLM_TOKENIZER_CALIBRATION = 1.0
+
+LLM_ROUTER_WINDOW = 50
+LLM_ROUTER_PRIOR_LATENCY = 5.0
+LLM_ROUTER_ERROR_PENALTY = 4.0
+LLM_ROUTER_SATURATION_COOLDOWN = 30.0
+
+MOCK_LLM_HOST = "127.0.0.1"
+MOCK_LLM_PORT = 8800
+MOCK_LLM_SEED = 42
+MOCK_LLM_LATENCY = "lognormal"
+MOCK_LLM_LATENCY_MEAN = 0.8
+MOCK_LLM_LATENCY_SIGMA = 0.4
+MOCK_LLM_ERROR_RATES = {"429": 0.02, "503": 0.01, "saturated": 0.01}
+MOCK_LLM_COMPLETION_TOKENS = None
+
+SIMULATION_SEED = None
+ROUND_ENGINE_ENABLED = True
+ROUND_PIPELINE_ENABLED = True
+ROUND_PIPELINE_MAX_PENDING = 2
+SHARDED_SERVERS = False
+MAX_AGENTS = None
+MIGRATION_SATISFACTION_THRESHOLD = 6
+
 TOTAL_ROUNDS = 30
 KEY_ROUNDS = list(range(1, TOTAL_ROUNDS + 1))
 SERVERS = ['A', 'B', 'C']
+ACTION_TYPES = ['comment', 'retweet', 'like', 'follow', 'unfollow', 'silent']
 
 PROFILES_FILE = "big5_user_profiles.json"
 
 OUTPUT_DIR = "output/Multi-server_time_50agents_9visible"
+SWEEP_OUTPUT_DIR = "output/sweeps"
+SWEEP_MAX_JOBS = 2
+SWEEP_SUMMARY_CSV = "sweep_summary.csv"
+SWEEP_CACHE_MODE = "read-write"
 
 ACTIONS_LOG_CSV = "logs_actions.csv"
 STANCE_CHANGES_CSV = "logs_stance_changes.csv"
@@ -36,6 +136,10 @@ MIGRATIONS_CSV = "logs_migrations.csv"
 DRAMATIC_STANCE_CHANGES_CSV = "logs_dramatic_stance_changes.csv"
 MEMORY_COMPRESSION_CSV = "logs_memory_compression.csv"
 TOKEN_USAGE_CSV = "logs_token_usage.csv"
+JSON_REPAIRS_CSV = "logs_json_repairs.csv"
+PROMPT_SECTIONS_CSV = "logs_prompt_sections.csv"
+BUDGET_LOG_CSV = "logs_budget.csv"
+LLM_JOURNAL_JSONL = "llm_journal.jsonl"
 
 SATISFACTION_HISTORY_JSON = "satisfaction_history.json"
 FINAL_STATISTICS_TXT = "final_statistics.txt"
@@ -52,4 +156,17 @@ MAX_SERVER_POSTS = 6
 MAX_POST_CONTENT_LENGTH = 50
 MAX_STANCE_HISTORY = 20
 MAX_TOKEN_COUNT = 10000
+TRUNCATED_PROMPT_TOKENS = 50000
+DECISION_GROUP_SIZE = 1
+FUSED_TURN_MODE = False
+PROMPT_COMPACT_JSON = True
+PROMPT_SECTION_BUDGETS = {
+    "history": 200,
+    "stance_history": 100,
+    "feed": 1600,
+    "comments": 100,
+    "following": 150,
+    "memories": 300,
+    "actions": 800,
+}
 MAX_DISPLAY_TOKEN_COUNT = 5000
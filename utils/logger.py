@@ -1,6 +1,7 @@
 import csv
 import json
 import os
+import threading
 from .config import (
     ACTIONS_LOG_CSV,
     STANCE_CHANGES_CSV,
@@ -9,9 +10,24 @@ from .config import (
     DRAMATIC_STANCE_CHANGES_CSV,
     MEMORY_COMPRESSION_CSV,
     TOKEN_USAGE_CSV,
+    JSON_REPAIRS_CSV,
+    PROMPT_SECTIONS_CSV,
+    BUDGET_LOG_CSV,
 )
 
 OUTPUT_DIR = "."
+_CSV_LOCK = threading.RLock()
+_TOKEN_USAGE_LISTENERS = []
+_CHECKED_HEADERS = {}
+
+def add_token_usage_listener(listener):
+    if listener not in _TOKEN_USAGE_LISTENERS:
+        _TOKEN_USAGE_LISTENERS.append(listener)
+
+
+def reset_token_usage_listeners():
+    _TOKEN_USAGE_LISTENERS.clear()
+
 
 def set_output_directory(output_dir: str):
     global OUTPUT_DIR
@@ -19,14 +35,42 @@ def set_output_directory(output_dir: str):
     os.makedirs(output_dir, exist_ok=True)
 
 
+def _read_csv_header(path: str):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return next(csv.reader(f), [])
+
+
+def _rotate_csv(path: str):
+    root, ext = os.path.splitext(path)
+    n = 1
+    while os.path.exists(f"{root}.old{n}{ext}"):
+        n += 1
+    rotated = f"{root}.old{n}{ext}"
+    os.replace(path, rotated)
+    return rotated
+
+
 def _ensure_csv_with_header(path: str, header: list[str]):
     os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if _CHECKED_HEADERS.get(path) != header and os.path.exists(path) and os.path.getsize(path) > 0:
+        existing = _read_csv_header(path)
+        if existing != header:
+            rotated = _rotate_csv(path)
+            print(f"⚠️ {path} has {len(existing)} columns but {len(header)} are logged now, moved it to {rotated}")
+    _CHECKED_HEADERS[path] = header
     if not os.path.exists(path) or os.path.getsize(path) == 0:
         with open(path, "w", encoding="utf-8", newline="") as f:
             writer = csv.writer(f)
             writer.writerow(header)
 
 
+def _append_csv_row(path: str, header: list[str], row: list):
+    with _CSV_LOCK:
+        _ensure_csv_with_header(path, header)
+        with open(path, "a", encoding="utf-8", newline="") as f:
+            csv.writer(f).writerow(row)
+
+
 def log_action(action_data: dict):
     header = [
         "timestamp",
@@ -40,7 +84,6 @@ def log_action(action_data: dict):
         "prompt",
     ]
     log_path = os.path.join(OUTPUT_DIR, ACTIONS_LOG_CSV)
-    _ensure_csv_with_header(log_path, header)
 
     row = [
         action_data.get("timestamp", ""),
@@ -54,9 +97,7 @@ def log_action(action_data: dict):
         action_data.get("prompt", ""),
     ]
 
-    with open(log_path, "a", encoding="utf-8", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(row)
+    _append_csv_row(log_path, header, row)
 
 
 def _add_round_separator_to_csv(log_path: str, round_num: int, separator_type: str, num_columns: int):
@@ -67,7 +108,7 @@ def _add_round_separator_to_csv(log_path: str, round_num: int, separator_type: s
     
     separator_row = [separator_text] + [""] * (num_columns - 1)
     
-    with open(log_path, "a", encoding="utf-8", newline="") as f:
+    with _CSV_LOCK, open(log_path, "a", encoding="utf-8", newline="") as f:
         writer = csv.writer(f)
         writer.writerow(separator_row)
 
@@ -77,7 +118,7 @@ def _add_action_separator_to_csv(log_path: str, num_columns: int):
     
     separator_row = [separator_text] + [""] * (num_columns - 1)
     
-    with open(log_path, "a", encoding="utf-8", newline="") as f:
+    with _CSV_LOCK, open(log_path, "a", encoding="utf-8", newline="") as f:
         writer = csv.writer(f)
         writer.writerow(separator_row)
 
@@ -119,7 +160,6 @@ def log_stance_change(record: dict):
         "prompt",
     ]
     log_path = os.path.join(OUTPUT_DIR, STANCE_CHANGES_CSV)
-    _ensure_csv_with_header(log_path, header)
     
     row = [
         record.get("timestamp", ""),
@@ -131,8 +171,7 @@ def log_stance_change(record: dict):
         record.get("round", ""),
         record.get("prompt", ""),
     ]
-    with open(log_path, "a", encoding="utf-8", newline="") as f:
-        csv.writer(f).writerow(row)
+    _append_csv_row(log_path, header, row)
 
 
 def log_satisfaction(record: dict):
@@ -146,7 +185,6 @@ def log_satisfaction(record: dict):
         "prompt",
     ]
     log_path = os.path.join(OUTPUT_DIR, SATISFACTION_CSV)
-    _ensure_csv_with_header(log_path, header)
     
     row = [
         record.get("timestamp", ""),
@@ -157,8 +195,7 @@ def log_satisfaction(record: dict):
         record.get("round", ""),
         record.get("prompt", ""),
     ]
-    with open(log_path, "a", encoding="utf-8", newline="") as f:
-        csv.writer(f).writerow(row)
+    _append_csv_row(log_path, header, row)
 
 
 def log_migration(record: dict):
@@ -172,7 +209,6 @@ def log_migration(record: dict):
         "prompt",
     ]
     log_path = os.path.join(OUTPUT_DIR, MIGRATIONS_CSV)
-    _ensure_csv_with_header(log_path, header)
     
     row = [
         record.get("timestamp", ""),
@@ -183,8 +219,7 @@ def log_migration(record: dict):
         record.get("round", ""),
         record.get("prompt", ""),
     ]
-    with open(log_path, "a", encoding="utf-8", newline="") as f:
-        csv.writer(f).writerow(row)
+    _append_csv_row(log_path, header, row)
 
 
 def log_dramatic_stance_change(record: dict):
@@ -203,7 +238,6 @@ def log_dramatic_stance_change(record: dict):
         "user_profile",
         "current_server"
     ]
-    _ensure_csv_with_header(log_path, header)
     
     row = [
         record.get("timestamp", ""),
@@ -218,8 +252,7 @@ def log_dramatic_stance_change(record: dict):
         record.get("user_profile", ""),
         record.get("current_server", ""),
     ]
-    with open(log_path, "a", encoding="utf-8", newline="") as f:
-        csv.writer(f).writerow(row)
+    _append_csv_row(log_path, header, row)
 
 
 def load_profiles(file_path):
@@ -243,7 +276,6 @@ def log_memory_compression(record: dict):
         "final_reflection_count",
     ]
     log_path = os.path.join(OUTPUT_DIR, MEMORY_COMPRESSION_CSV)
-    _ensure_csv_with_header(log_path, header)
     
     row = [
         record.get("timestamp", ""),
@@ -259,8 +291,7 @@ def log_memory_compression(record: dict):
         record.get("new_reflection_count", ""),
         record.get("final_reflection_count", ""),
     ]
-    with open(log_path, "a", encoding="utf-8", newline="") as f:
-        csv.writer(f).writerow(row)
+    _append_csv_row(log_path, header, row)
 
 
 def log_memory_compression_separator(round_num: int, separator_type: str = "start"):
@@ -269,22 +300,21 @@ def log_memory_compression_separator(round_num: int, separator_type: str = "star
 
 
 def log_token_usage(record: dict):
+    header = [
+        "timestamp",
+        "round",
+        "user_id",
+        "action_type",
+        "prompt_tokens",
+        "completion_tokens",
+        "total_tokens",
+        "model",
+        "source",
+        "saved_tokens",
+        "cached_tokens",
+    ]
     log_path = os.path.join(OUTPUT_DIR, TOKEN_USAGE_CSV)
     
-    if not os.path.exists(log_path):
-        with open(log_path, "w", encoding="utf-8", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                "timestamp",
-                "round",
-                "user_id",
-                "action_type",
-                "prompt_tokens",
-                "completion_tokens",
-                "total_tokens",
-                "model",
-            ])
-    
     row = [
         record.get("timestamp", ""),
         record.get("round", ""),
@@ -294,11 +324,97 @@ def log_token_usage(record: dict):
         record.get("completion_tokens", 0),
         record.get("total_tokens", 0),
         record.get("model", ""),
+        record.get("source", "api"),
+        record.get("saved_tokens", 0),
+        record.get("cached_tokens", 0),
     ]
-    with open(log_path, "a", encoding="utf-8", newline="") as f:
-        csv.writer(f).writerow(row)
+    _append_csv_row(log_path, header, row)
+    notify_token_usage(record)
+
+
+def notify_token_usage(record: dict):
+    for listener in _TOKEN_USAGE_LISTENERS:
+        listener(record)
 
 
 def log_token_usage_separator(round_num: int, separator_type: str = "start"):
     log_path = os.path.join(OUTPUT_DIR, TOKEN_USAGE_CSV)
-    _add_round_separator_to_csv(log_path, round_num, separator_type, 8)
+    _add_round_separator_to_csv(log_path, round_num, separator_type, 11)
+
+
+def log_json_repair(record: dict):
+    header = [
+        "timestamp",
+        "round",
+        "user_id",
+        "action_type",
+        "outcome",
+        "repairs",
+        "saved_tokens",
+        "content",
+    ]
+    log_path = os.path.join(OUTPUT_DIR, JSON_REPAIRS_CSV)
+
+    row = [
+        record.get("timestamp", ""),
+        record.get("round", ""),
+        record.get("user_id", ""),
+        record.get("action_type", ""),
+        record.get("outcome", ""),
+        record.get("repairs", ""),
+        record.get("saved_tokens", 0),
+        record.get("content", ""),
+    ]
+    _append_csv_row(log_path, header, row)
+
+
+def log_prompt_sections(record: dict):
+    header = [
+        "timestamp",
+        "round",
+        "user_id",
+        "action_type",
+        "prompt_tokens",
+        "sections",
+        "trimmed",
+    ]
+    log_path = os.path.join(OUTPUT_DIR, PROMPT_SECTIONS_CSV)
+
+    row = [
+        record.get("timestamp", ""),
+        record.get("round", ""),
+        record.get("user_id", ""),
+        record.get("action_type", ""),
+        record.get("prompt_tokens", 0),
+        record.get("sections", ""),
+        record.get("trimmed", ""),
+    ]
+    _append_csv_row(log_path, header, row)
+
+
+def log_budget_step(record: dict):
+    header = [
+        "timestamp",
+        "round",
+        "level",
+        "step",
+        "round_tokens",
+        "run_tokens",
+        "projected_tokens",
+        "projected_cost",
+        "reason",
+    ]
+    log_path = os.path.join(OUTPUT_DIR, BUDGET_LOG_CSV)
+
+    row = [
+        record.get("timestamp", ""),
+        record.get("round", ""),
+        record.get("level", 0),
+        record.get("step", ""),
+        record.get("round_tokens", 0),
+        record.get("run_tokens", 0),
+        record.get("projected_tokens", 0),
+        record.get("projected_cost", 0.0),
+        record.get("reason", ""),
+    ]
+    _append_csv_row(log_path, header, row)
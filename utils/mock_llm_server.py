@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from utils.config import (
+    ACTION_TYPES, MOCK_LLM_HOST, MOCK_LLM_PORT, MOCK_LLM_SEED,
+    MOCK_LLM_LATENCY, MOCK_LLM_LATENCY_MEAN, MOCK_LLM_LATENCY_SIGMA,
+    MOCK_LLM_ERROR_RATES, MOCK_LLM_COMPLETION_TOKENS
+)
+from llm.tokenizer import count_tokens
+
+POST_ID_RE = re.compile(r'"post_id":\s*(\d+)')
+AUTHOR_RE = re.compile(r'"author":\s*"([^"]+)"')
+STANCE_RE = re.compile(r'(?<!_)"?[Ss]tance"?:\s*(-?\d+)')
+GROUP_USER_RE = re.compile(r"^## (\S+)$", re.MULTILINE)
+PREFIX_CACHE_MIN_TOKENS = 1024
+PREFIX_CACHE_BLOCK = 128
+
+POST_OPENERS = [
+    "Honestly, AI", "I keep thinking that AI", "Hot take: AI", "After reading the news, AI", "Not sure yet, but AI",
+]
+POST_CLAIMS = {
+    -2: "is moving far too fast and the risks to jobs and privacy are being ignored.",
+    -1: "worries me more than it excites me; we need stronger rules first.",
+    0: "has real benefits and real risks, and I want to see more evidence either way.",
+    1: "is already making my work easier, as long as we keep humans in the loop.",
+    2: "will be the biggest boost to health, science and education we have ever seen.",
+}
+COMMENTS = [
+    "Interesting point, but who is accountable when AI gets it wrong?",
+    "Agreed, the benefits in healthcare alone are hard to ignore.",
+    "I think regulation and transparency have to come first.",
+    "This matches my experience using AI tools at work.",
+]
+
+
+def classify_prompt(prompt):
+    if "# Posting Task" in prompt:
+        return "post_creation"
+    if "You are simulating" in prompt:
+        return "group_interaction_decision"
+    if '"evaluation": {' in prompt:
+        return "fused_turn"
+    if "# Discussion Topic" in prompt:
+        return "interaction_decision"
+    if "# Evaluation Task" in prompt:
+        return "environment_evaluation"
+    if "new_stance" in prompt:
+        return "stance_adjustment"
+    if "reflecting on your recent social media behavior" in prompt:
+        return "reflection"
+    return "unknown"
+
+
+class MockLLM:
+    def __init__(self, seed=MOCK_LLM_SEED, latency=MOCK_LLM_LATENCY, latency_mean=MOCK_LLM_LATENCY_MEAN,
+                 latency_sigma=MOCK_LLM_LATENCY_SIGMA, error_rates=None, completion_tokens=MOCK_LLM_COMPLETION_TOKENS):
+        self.seed = seed
+        self.latency = latency
+        self.latency_mean = latency_mean
+        self.latency_sigma = latency_sigma
+        self.error_rates = dict(MOCK_LLM_ERROR_RATES if error_rates is None else error_rates)
+        self.completion_tokens = completion_tokens
+        self.requests = 0
+        self.errors = 0
+        self._prefixes = set()
+        self._lock = threading.Lock()
+
+    def _rng(self, prompt, attempt):
+        digest = hashlib.sha256(f"{self.seed}|{attempt}|{prompt}".encode("utf-8")).hexdigest()
+        return random.Random(int(digest[:16], 16))
+
+    def sample_latency(self, rng):
+        if self.latency == "fixed":
+            return self.latency_mean
+        if self.latency == "uniform":
+            return rng.uniform(max(0.0, self.latency_mean - self.latency_sigma), self.latency_mean + self.latency_sigma)
+        if self.latency == "lognormal":
+            return self.latency_mean * rng.lognormvariate(0, self.latency_sigma)
+        return 0.0
+
+    def sample_error(self, rng):
+        roll = rng.random()
+        for kind, rate in self.error_rates.items():
+            if roll < rate:
+                return kind
+            roll -= rate
+        return None
+
+    def cached_tokens(self, prompt):
+        digest = hashlib.sha256()
+        cached = 0
+        tokens = 0
+        hashes = []
+        for line in prompt.splitlines(keepends=True):
+            digest.update(line.encode("utf-8"))
+            tokens += count_tokens(line)
+            prefix = digest.hexdigest()
+            hashes.append(prefix)
+            if prefix in self._prefixes:
+                cached = tokens
+        with self._lock:
+            self._prefixes.update(hashes)
+        if cached < PREFIX_CACHE_MIN_TOKENS:
+            return 0
+        return cached - cached % PREFIX_CACHE_BLOCK
+
+    def respond(self, prompt, rng):
+        kind = classify_prompt(prompt)
+        stances = [int(s) for s in STANCE_RE.findall(prompt)]
+        stance = max(-2, min(2, stances[0])) if stances else 0
+        post_ids = [int(p) for p in POST_ID_RE.findall(prompt)]
+        authors = sorted(set(AUTHOR_RE.findall(prompt)))
+
+        if kind == "post_creation":
+            return {"content": f"{rng.choice(POST_OPENERS)} {POST_CLAIMS[stance]}"}
+        if kind == "interaction_decision":
+            return {"actions": self._actions(rng, post_ids, authors)}
+        if kind == "group_interaction_decision":
+            return {user_id: {"actions": self._actions(rng, post_ids, authors)}
+                    for user_id in GROUP_USER_RE.findall(prompt)}
+        if kind == "fused_turn":
+            return {
+                "actions": self._actions(rng, post_ids, authors),
+                "stance": self._stance(rng, stance),
+                "evaluation": self._evaluation(rng),
+            }
+        if kind == "environment_evaluation":
+            return self._evaluation(rng)
+        if kind == "stance_adjustment":
+            return self._stance(rng, stance)
+        if kind == "reflection":
+            return [
+                "I mostly engage with posts that match my own view on AI.",
+                "Thoughtful disagreement makes me reconsider my stance more than agreement does.",
+            ][:rng.randint(1, 2)]
+        return {}
+
+    def _actions(self, rng, post_ids, authors):
+        if not post_ids or rng.random() < 0.25:
+            return [{"type": "silent"}]
+        actions = []
+        for _ in range(rng.randint(1, 3)):
+            action_type = rng.choice([t for t in ACTION_TYPES if t != "silent"])
+            action = {"type": action_type}
+            if action_type in ("follow", "unfollow"):
+                if not authors:
+                    continue
+                action["target_user_id"] = rng.choice(authors)
+            else:
+                action["target_post_id"] = rng.choice(post_ids)
+            if action_type == "comment":
+                action["content"] = rng.choice(COMMENTS)
+            actions.append(action)
+        return actions or [{"type": "silent"}]
+
+    def _stance(self, rng, stance):
+        roll = rng.random()
+        if roll < 0.15:
+            new_stance = max(-2, min(2, stance + rng.choice([-1, 1])))
+            return {"reason": "The discussion raised points I had not fully considered before.", "new_stance": new_stance}
+        return {"reason": "The post did not change how I see the benefits and risks of AI.", "new_stance": stance}
+
+    def _evaluation(self, rng):
+        score = rng.randint(3, 9)
+        reason = "The discussion is balanced and relevant." if score >= 6 else "The posts feel one-sided and repetitive."
+        return {"reason": reason, "score": score}
+
+    def complete(self, body, attempt):
+        messages = body.get("messages", [])
+        prompt = "\n".join(m.get("content", "") for m in messages)
+        rng = self._rng(prompt, attempt)
+        delay = self.sample_latency(rng)
+        error = self.sample_error(rng)
+        with self._lock:
+            self.requests += 1
+            if error:
+                self.errors += 1
+        if error == "429":
+            return delay, 429, {"error": {"message": "Rate limit reached for requests", "type": "rate_limit"}}
+        if error == "503":
+            return delay, 503, {"error": {"message": "Service temporarily unavailable", "type": "server_error"}}
+        if error == "saturated":
+            return delay, 503, {"error": {"message": "upstream load saturated", "type": "server_error"}}
+
+        answer = self.respond(messages[-1].get("content", "") if messages else "", rng)
+        content = "```json\n" + json.dumps(answer, ensure_ascii=False) + "\n```"
+        prompt_tokens = count_tokens(prompt)
+        completion_tokens = self.completion_tokens or count_tokens(content)
+        return delay, 200, {
+            "id": f"mock-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": self.cached_tokens(prompt)},
+            },
+        }
+
+
+def make_handler(mock):
+    attempts = {}
+    attempts_lock = threading.Lock()
+
+    class MockLLMHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            key = json.dumps(body.get("messages", []), sort_keys=True)
+            with attempts_lock:
+                attempt = attempts.get(key, 0)
+                attempts[key] = attempt + 1
+            delay, status, payload = mock.complete(body, attempt)
+            time.sleep(delay)
+            if status == 200 and body.get("stream"):
+                self._send_stream(payload)
+            else:
+                self._send_json(status, payload)
+
+        def _send_json(self, status, payload):
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_stream(self, payload):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            content = payload["choices"][0]["message"]["content"]
+            events = [{"model": payload["model"], "choices": [{"index": 0, "delta": {"content": content[i:i + 16]}}]}
+                      for i in range(0, len(content), 16)]
+            events.append({"model": payload["model"], "choices": [], "usage": payload["usage"]})
+            try:
+                for event in events:
+                    self._write_chunk(f"data: {json.dumps(event, ensure_ascii=False)}\n\n")
+                self._write_chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def _write_chunk(self, text):
+            data = text.encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+    return MockLLMHandler
+
+
+def serve(host=MOCK_LLM_HOST, port=MOCK_LLM_PORT, mock=None):
+    mock = mock or MockLLM()
+    server = ThreadingHTTPServer((host, port), make_handler(mock))
+    server.daemon_threads = True
+    print(f"🧪 Mock LLM server listening on http://{host}:{port}/v1 (seed {mock.seed}, latency {mock.latency} "
+          f"mean {mock.latency_mean}s, errors {mock.error_rates})")
+    return server
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else MOCK_LLM_PORT
+    server = serve(port=port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
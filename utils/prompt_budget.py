@@ -0,0 +1,84 @@
+import json
+
+from .config import PROMPT_COMPACT_JSON, PROMPT_SECTION_BUDGETS
+from llm.tokenizer import count_tokens
+
+_BUDGET_SCALE = 1.0
+
+
+def set_section_budget_scale(scale: float):
+    global _BUDGET_SCALE
+    _BUDGET_SCALE = scale
+
+
+def section_budgets() -> dict:
+    return {section: max(1, int(budget * _BUDGET_SCALE)) if budget else budget
+            for section, budget in PROMPT_SECTION_BUDGETS.items()}
+
+
+def serialize(value) -> str:
+    if PROMPT_COMPACT_JSON:
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return json.dumps(value, ensure_ascii=False, indent=2)
+
+
+def fit_items(items: list, budget, render) -> tuple:
+    items = list(items)
+    text = render(items)
+    dropped = 0
+    while budget and items and count_tokens(text) > budget:
+        items.pop(0)
+        dropped += 1
+        text = render(items)
+    return items, text, dropped
+
+
+def prompt_profile(profile: dict) -> dict:
+    return {key: value for key, value in profile.items() if key not in ("history", "stance_history")}
+
+
+def prompt_post(post: dict) -> dict:
+    comments, _, _ = fit_items(
+        [{"author": c.get("author", ""), "content": c.get("content", "")} for c in post.get("comments", [])],
+        section_budgets().get("comments"),
+        serialize
+    )
+    return {
+        "post_id": post.get("post_id"),
+        "author": post.get("author", ""),
+        "content": post.get("content", ""),
+        "stance": post.get("stance", "unknown"),
+        "likes": post.get("likes", 0),
+        "comments_count": len(post.get("comments", [])),
+        "recent_comments": comments,
+    }
+
+
+class PromptAssembler:
+    def __init__(self, budgets=None):
+        self.budgets = section_budgets() if budgets is None else budgets
+        self.parts = []
+        self.tokens = {}
+        self.trimmed = {}
+
+    def add(self, section: str, text: str):
+        self.parts.append(text)
+        self.tokens[section] = self.tokens.get(section, 0) + count_tokens(text)
+        return self
+
+    def add_items(self, section: str, items: list, render) -> list:
+        kept, text, dropped = fit_items(items, self.budgets.get(section), render)
+        if dropped:
+            self.trimmed[section] = self.trimmed.get(section, 0) + dropped
+        self.add(section, text)
+        return kept
+
+    def build(self, report: dict = None) -> str:
+        if report is not None:
+            report["sections"] = dict(self.tokens)
+            report["trimmed"] = dict(self.trimmed)
+        return "".join(self.parts)
+
+
+def format_sections(counts: dict) -> str:
+    return "|".join(f"{section}={count}" for section, count in counts.items())
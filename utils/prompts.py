@@ -1,15 +1,40 @@
-import json
 from .config import MAX_FOLLOWING_POSTS, MAX_SERVER_POSTS
+from .prompt_budget import PromptAssembler, fit_items, prompt_post, prompt_profile, serialize
 
 
-def build_create_post_prompt(profile: dict) -> str:
-    return f"""# Posting Task
-You are a social media user and need to publish an original post about the topic: Artificial Intelligence (AI).
-
-# Your Profile
-{json.dumps(profile, ensure_ascii=False, indent=2)}
+SYSTEM_PROMPT = """You are role-playing users of a multi-server social network simulation. The discussion topic is whether Artificial Intelligence (AI) brings more benefits or more risks.
+Stay in character as the user described in each request and always answer with valid JSON only, exactly in the requested format.
 
 Note: stance scale from -2 to 2 (-2=Strongly Oppose AI, -1=Oppose AI, 0=Neutral, 1=Support AI, 2=Strongly Support AI)
+"""
+
+
+def _history_text(history: list) -> str:
+    return f"Recent behavior summary: {history}\n"
+
+
+def _stance_history_text(changes: list) -> str:
+    if not changes:
+        return ""
+    return f"Your stance changes so far (oldest first): {serialize(changes)}\n"
+
+
+def _memories_text(memories: list, closing: str) -> str:
+    if not memories:
+        return ""
+    memory_text = "\nPast experience (recent interactions):\n"
+    for i, memory in enumerate(reversed(memories), 1):
+        memory_text += f"{i}. {memory['action_type']}@{memory['server']}(stance {memory['stance']}) "
+        memory_text += f"'{memory['content']}'\n"
+        if memory.get('outcome'):
+            memory_text += f"   Outcome: {memory['outcome']}\n"
+    return memory_text + f"\n{closing}\n"
+
+
+def build_create_post_prompt(profile: dict, report: dict = None) -> str:
+    prompt = PromptAssembler()
+    prompt.add("instructions", """# Posting Task
+You are a social media user and need to publish an original post about the topic: Artificial Intelligence (AI).
 
 # Posting Guidelines
 1. Your post must be related to the topic of Artificial Intelligence (AI), especially about whether AI brings more benefits or more risks (e.g., opinions, questions, personal experiences, or concerns about AI).
@@ -17,90 +42,56 @@ Note: stance scale from -2 to 2 (-2=Strongly Oppose AI, -1=Oppose AI, 0=Neutral,
 3. **IMPORTANT: Keep your post content concise - maximum 40 words.**
 
 Please return your post in the following format:
-{{
+{
     "content": "Post content (max 40 words)"
-}}
-"""
-
-
-def build_environment_evaluation_prompt(user_id: str, profile: dict, server: str, visible_posts: list, memories: list = None) -> str:
-    prompt = f"""You are a social media user (user {user_id}).please evaluate the discussion the current server: {server}.
+}
+""")
+    prompt.add("profile", f"""
+# Your Profile
+{serialize(prompt_profile(profile))}
+""")
+    prompt.add_items("history", profile.get('history', []), _history_text)
+    prompt.add_items("stance_history", profile.get('stance_history', []), _stance_history_text)
+    return prompt.build(report)
 
-Your personality traits:
-{json.dumps(profile, ensure_ascii=False, indent=2)}
 
-Note: stance scale from -2 to 2 (-2=Strongly Oppose AI, -1=Oppose AI, 0=Neutral, 1=Support AI, 2=Strongly Support AI)
+def build_environment_evaluation_prompt(user_id: str, profile: dict, server: str, visible_posts: list, memories: list = None,
+                                        report: dict = None) -> str:
+    prompt = PromptAssembler()
+    prompt.add("instructions", """# Evaluation Task
+You are a social media user. Please evaluate the discussion on your current server.
 
 How do you evaluate the quality of social media content based on the posts you have seen (satisfaction level)?
 
-Recent posts visible to you ({MAX_FOLLOWING_POSTS} from people you follow + {MAX_SERVER_POSTS} from current server, in chronological order):
-{json.dumps(visible_posts, ensure_ascii=False, indent=2)}
-"""
-    
-    if memories:
-        memory_text = "\n\nPast experience (recent interactions):\n"
-        for i, memory in enumerate(memories, 1):
-            memory_text += f"{i}. {memory['action_type']}@{memory['server']}(stance {memory['stance']}) "
-            memory_text += f"'{memory['content']}'\n"
-            if memory.get('outcome'):
-                memory_text += f"   Outcome: {memory['outcome']}\n"
-        memory_text += "\nPlease consider these experiences when evaluating."
-        prompt += memory_text
-    
-    prompt += """
-
 # IMPORTANT: First provide your reasoning for the satisfaction level, then assign the score between 1 and 10 (1 = very poor, 10 = excellent). The reasoning should be concise and align with your score.
 
 Respond in the following JSON format:
-{{
+{
     "reason": "A brief explanation of your evaluation (maximum 50 words)",
     "score": integer from 1 to 10
-}}
-"""
-    return prompt
-
+}
+""")
+    prompt.add("profile", f"""
+# You are user {user_id}. Your personality traits:
+{serialize(prompt_profile(profile))}
+""")
+    prompt.add_items("history", profile.get('history', []), _history_text)
+    prompt.add_items("stance_history", profile.get('stance_history', []), _stance_history_text)
+    prompt.add_items("feed", [prompt_post(post) for post in visible_posts], lambda posts: f"""
+# Current server: {server}
+Recent posts visible to you ({MAX_FOLLOWING_POSTS} from people you follow + {MAX_SERVER_POSTS} from current server, in chronological order):
+{serialize(posts)}
+""")
+    prompt.add_items("memories", list(reversed(memories or [])),
+                     lambda items: _memories_text(items, "Please consider these experiences when evaluating."))
+    return prompt.build(report)
 
-def build_decision_prompt(profile: dict, visible_posts_info: list, round_num: int, has_posted_this_round: bool = False) -> str:
-    stance = profile.get('stance', 'unknown')
-    history = profile.get('history', [])  
-    
-    age = profile.get('age', 0)
-    gender = profile.get('gender', '')
-    education = profile.get('education', '')
-    occupation = profile.get('occupation', '')
-    interests = profile.get('interests', [])
-    
-    openness = profile.get('openness', 'unknown')
-    conscientiousness = profile.get('conscientiousness', 'unknown')
-    extraversion = profile.get('extraversion', 'unknown')
-    agreeableness = profile.get('agreeableness', 'unknown')
-    neuroticism = profile.get('neuroticism', 'unknown')
 
-    return f"""
+DECISION_INSTRUCTIONS = """
 # Discussion Topic
 AI brings more benefits or more risks
 
-You are a social network user with the following attributes:
-- Age: {age}
-- Gender: {gender}
-- Education: {education}
-- Occupation: {occupation}
-- Interests: {', '.join(interests) if interests else 'None specified'}
-- Stance: {stance}
-- Recent behavior summary: {history}
-
-Note: stance scale from -2 to 2 (-2=Strongly Oppose AI, -1=Oppose AI, 0=Neutral, 1=Support AI, 2=Strongly Support AI)
-
-# Big Five Personality Traits:
-- Openness: {openness} (openness to new experiences and ideas)
-- Conscientiousness: {conscientiousness} (self-discipline and organization)
-- Extraversion: {extraversion} (social energy and assertiveness)
-- Agreeableness: {agreeableness} (trust and cooperation)
-- Neuroticism: {neuroticism} (emotional stability, higher = less stable)
-
-Recent posts on this server (in chronological order):
-{json.dumps(visible_posts_info, ensure_ascii=False, indent=2)}
-
+You are a social network user. Your attributes and the recent posts on your server are given below.
 
 You can choose one or more of the following actions:
 - comment: comment on a post,you should provide specific comment content
@@ -117,16 +108,186 @@ Based on your profile and the posts, decide which actions you will take this rou
 # - For comment actions, you must provide specific comment content, not generic text
 # - If you cannot think of a specific comment, do not choose the comment action
 
-Return your answer in the following JSON format:
-{{
+"""
+
+
+def _add_decision_context(prompt: PromptAssembler, profile: dict, visible_posts_info: list, following=None,
+                          memories: list = None):
+    interests = profile.get('interests', [])
+
+    prompt.add("profile", f"""
+# Your attributes
+- Age: {profile.get('age', 0)}
+- Gender: {profile.get('gender', '')}
+- Education: {profile.get('education', '')}
+- Occupation: {profile.get('occupation', '')}
+- Interests: {', '.join(interests) if interests else 'None specified'}
+
+# Big Five Personality Traits:
+- Openness: {profile.get('openness', 'unknown')} (openness to new experiences and ideas)
+- Conscientiousness: {profile.get('conscientiousness', 'unknown')} (self-discipline and organization)
+- Extraversion: {profile.get('extraversion', 'unknown')} (social energy and assertiveness)
+- Agreeableness: {profile.get('agreeableness', 'unknown')} (trust and cooperation)
+- Neuroticism: {profile.get('neuroticism', 'unknown')} (emotional stability, higher = less stable)
+
+- Stance: {profile.get('stance', 'unknown')}
+""")
+    prompt.add_items("history", profile.get('history', []), lambda history: "- " + _history_text(history))
+    prompt.add_items("feed", visible_posts_info, lambda posts: f"""
+Recent posts on this server (in chronological order):
+{serialize(posts)}
+""")
+    if following is not None:
+        prompt.add_items("following", sorted(following),
+                         lambda users: f"\nCurrently following users: {users if users else 'none'}\n")
+    prompt.add_items("memories", list(reversed(memories or [])),
+                     lambda items: _memories_text(items, "Please refer to these experiences to make decisions."))
+
+
+def build_decision_prompt(profile: dict, visible_posts_info: list, round_num: int, has_posted_this_round: bool = False,
+                          following=None, memories: list = None, report: dict = None) -> str:
+    prompt = PromptAssembler()
+    prompt.add("instructions", DECISION_INSTRUCTIONS + """Return your answer in the following JSON format:
+{
   "actions": [
-    {{"type": "comment/retweet/like/follow/unfollow/silent", "target_post_id": optional, "target_user_id": optional, "content": optional}}
+    {"type": "comment/retweet/like/follow/unfollow/silent", "target_post_id": optional, "target_user_id": optional, "content": optional}
   ]
-}}
+}
+""")
+    _add_decision_context(prompt, profile, visible_posts_info, following, memories)
+    return prompt.build(report)
+
+
+def build_fused_turn_prompt(profile: dict, visible_posts_info: list, round_num: int, server: str, following=None,
+                            memories: list = None, report: dict = None) -> str:
+    prompt = PromptAssembler()
+    prompt.add("instructions", DECISION_INSTRUCTIONS + """After choosing your actions, also report in the same answer:
+- stance: whether interacting with these posts (comment, retweet or like) changes your stance. Your new stance must be one of -2, -1, 0, 1, 2; keep your current stance if you do not interact or are not persuaded. Give a brief reason (max 30 words); large stance changes (difference >= 2) should have specific reasons.
+- evaluation: your satisfaction with the discussion on your current server, based on the posts you have seen. First give a brief reason (max 50 words), then a score between 1 and 10 (1 = very poor, 10 = excellent) that agrees with it.
+
+Return your answer in the following JSON format:
+{
+  "actions": [
+    {"type": "comment/retweet/like/follow/unfollow/silent", "target_post_id": optional, "target_user_id": optional, "content": optional}
+  ],
+  "stance": {"reason": "your explanation", "new_stance": -2 or -1 or 0 or 1 or 2},
+  "evaluation": {"reason": "A brief explanation of your evaluation", "score": integer from 1 to 10}
+}
+""")
+    _add_decision_context(prompt, profile, visible_posts_info, following, memories)
+    prompt.add("server", f"""
+Current server: {server}
+""")
+    return prompt.build(report)
+
+
+GROUP_DECISION_INSTRUCTIONS = """
+# Discussion Topic
+AI brings more benefits or more risks
+
+You are simulating several different social network users who all see the same posts. Decide for each user independently, based only on that user's own attributes, personality and experience.
+
+Big Five traits: Openness (openness to new experiences and ideas), Conscientiousness (self-discipline and organization), Extraversion (social energy and assertiveness), Agreeableness (trust and cooperation), Neuroticism (emotional stability, higher = less stable)
+
+Each user can choose one or more of the following actions:
+- comment: comment on a post,you should provide specific comment content
+- retweet: retweet a post
+- like: like a post (do not like posts listed in that user's already liked post ids)
+- follow: follow a user (specify target_user_id)
+- unfollow: unfollow a user (specify target_user_id)
+- silent: remain silent and do nothing this round
+
+Based on each user's profile and the posts, decide which actions each user will take this round.All actions and comments must be related to the topic of AI.
+
+# IMPORTANT:
+# - Keep comment content concise (max 30 words)
+# - For comment actions, you must provide specific comment content, not generic text
+# - If you cannot think of a specific comment, do not choose the comment action
+# - Include every user id listed below exactly once
+
+Return your answer in the following JSON format, keyed by user id:
+{
+  "user_id": {
+    "actions": [
+      {"type": "comment/retweet/like/follow/unfollow/silent", "target_post_id": optional, "target_user_id": optional, "content": optional}
+    ]
+  }
+}
+"""
+
+
+def build_group_decision_prompt(members: list, visible_posts_info: list, round_num: int, report: dict = None) -> str:
+    prompt = PromptAssembler()
+    prompt.add("instructions", GROUP_DECISION_INSTRUCTIONS)
+    users_text = f"""
+# Users ({len(members)})
+"""
+    for member in members:
+        profile = member["profile"]
+        interests = profile.get('interests', [])
+        _, history_text, _ = fit_items(profile.get('history', []), prompt.budgets.get("history"),
+                                       lambda history: "- " + _history_text(history))
+        users_text += f"""
+## {member['user_id']}
+- Age: {profile.get('age', 0)}
+- Gender: {profile.get('gender', '')}
+- Education: {profile.get('education', '')}
+- Occupation: {profile.get('occupation', '')}
+- Interests: {', '.join(interests) if interests else 'None specified'}
+- Big Five: Openness {profile.get('openness', 'unknown')}, Conscientiousness {profile.get('conscientiousness', 'unknown')}, Extraversion {profile.get('extraversion', 'unknown')}, Agreeableness {profile.get('agreeableness', 'unknown')}, Neuroticism {profile.get('neuroticism', 'unknown')}
+- Stance: {profile.get('stance', 'unknown')}
+{history_text}- Already liked post ids: {member['already_liked'] or 'none'}
+"""
+        _, following_text, _ = fit_items(member['following'], prompt.budgets.get("following"),
+                                         lambda users: f"- Currently following users: {users or 'none'}\n")
+        _, memories_text, _ = fit_items(list(reversed(member["memories"])), prompt.budgets.get("memories"),
+                                        _group_memories_text)
+        users_text += following_text + memories_text
+    prompt.add("users", users_text)
+    prompt.add_items("feed", visible_posts_info, lambda posts: f"""
+Recent posts on this server (in chronological order):
+{serialize(posts)}
+""")
+    return prompt.build(report)
+
+
+def _group_memories_text(memories: list) -> str:
+    if not memories:
+        return ""
+    memory_text = "- Past experience (recent interactions):\n"
+    for i, memory in enumerate(reversed(memories), 1):
+        memory_text += f"  {i}. {memory['action_type']}@{memory['server']}(stance {memory['stance']}) '{memory['content']}'"
+        if memory.get('outcome'):
+            memory_text += f" (Outcome: {memory['outcome']})"
+        memory_text += "\n"
+    return memory_text
+
+
+STANCE_ADJUSTMENT_INSTRUCTIONS = """
+You are a social media user. You just performed an action on a post and are considering whether this interaction should change your stance.
+
+# Question
+Based on the content you have interacted with on social media, do you want to adjust your stance? Consider:
+1. Does the content of the post impact or align with your current stance?
+2. Did this interaction challenge or reinforce your views, or change your perspective?
+3. Do you think your stance should become more extreme, more moderate, or stay the same?
+
+# IMPORTANT: 
+# - Provide a brief reason for your new stance (max 30 words)
+# - If your stance does not change, explain why it remains the same.
+# - Your new stance must be one of the following five values: -2, -1, 0, 1, 2
+# - Large stance changes (difference >= 2) should have specific reasons
+
+Return your answer in the following JSON format:
+{
+  "reason": "your explanation",
+  "new_stance": -2 or -1 or 0 or 1 or 2
+}
 """
 
 
-def build_adjust_stance_after_interaction_prompt(profile: dict, post: dict, action_type: str, action_content: str) -> str:
+def build_adjust_stance_after_interaction_prompt(profile: dict, post: dict, action_type: str, action_content: str,
+                                                 report: dict = None) -> str:
     simplified_profile = {
         "name": profile.get("name", ""),
         "age": profile.get("age", 0),
@@ -134,13 +295,12 @@ def build_adjust_stance_after_interaction_prompt(profile: dict, post: dict, acti
         "education": profile.get("education", ""),
         "occupation": profile.get("occupation", ""),
         "interests": profile.get("interests", []),
-        "stance": profile.get("stance", 0),
         "openness": profile.get("openness", "moderate"),
         "conscientiousness": profile.get("conscientiousness", "moderate"),
         "extraversion": profile.get("extraversion", "moderate"),
         "agreeableness": profile.get("agreeableness", "moderate"),
         "neuroticism": profile.get("neuroticism", "moderate"),
-        "history": profile.get("history", [])[-5:]  
+        "stance": profile.get("stance", 0),
     }
     
     simplified_post = {
@@ -151,56 +311,36 @@ def build_adjust_stance_after_interaction_prompt(profile: dict, post: dict, acti
         "comments_count": len(post.get("comments", []))
     }
     
-    return f"""
-You are a social media user. You just performed an action on a post and are considering whether this interaction should change your stance.
-
+    prompt = PromptAssembler()
+    prompt.add("instructions", STANCE_ADJUSTMENT_INSTRUCTIONS)
+    prompt.add("profile", f"""
 # Your profile
-{json.dumps(simplified_profile, ensure_ascii=False, indent=2)}
-
-Note: stance scale from -2 to 2 (-2=Strongly Oppose AI, -1=Oppose AI, 0=Neutral, 1=Support AI, 2=Strongly Support AI)
-
+{serialize(simplified_profile)}
+""")
+    prompt.add_items("history", profile.get("history", [])[-5:], _history_text)
+    prompt.add("interaction", f"""
 # The post you interacted with
-{json.dumps(simplified_post, ensure_ascii=False, indent=2)}
+{serialize(simplified_post)}
 
 # Your action
 Action type: {action_type}
 Action content: {action_content}
+""")
+    return prompt.build(report)
 
-# Question
-Based on the content you have interacted with on social media, do you want to adjust your stance? Consider:
-1. Does the content of the post impact or align with your current stance?
-2. Did this interaction challenge or reinforce your views, or change your perspective?
-3. Do you think your stance should become more extreme, more moderate, or stay the same?
-
-# IMPORTANT: 
-# - Provide a brief reason for your new stance (max 30 words)
-# - If your stance does not change, explain why it remains the same.
-# - Your new stance must be one of the following five values: -2, -1, 0, 1, 2
-# - Large stance changes (difference >= 2) should have specific reasons
-
-Return your answer in the following JSON format:
-{{
-  "reason": "your explanation",
-  "new_stance": -2 or -1 or 0 or 1 or 2
-}}
-"""
 
 
-
-def build_reflection_prompt(recent_memories: list) -> str:
-    memories_text = "\n".join([
-        f"- {m['action_type']} on {m['server']} (stance {m['stance']}): {m['content']}"
-        for m in recent_memories
-    ])
-    
-    return f"""You are reflecting on your recent social media behavior. Here are your last actions:
-
-{memories_text}
-
-Based on these observations, what are 1-2 high-level insights about your behavior patterns?
+def build_reflection_prompt(recent_memories: list, report: dict = None) -> str:
+    prompt = PromptAssembler()
+    prompt.add("instructions", """You are reflecting on your recent social media behavior. Based on your last actions listed below, what are 1-2 high-level insights about your behavior patterns?
 
 Keep each insight brief (max 40 words). Return them as a JSON array of strings.
 
 Example format:
 ["insight 1", "insight 2"]
-"""
+""")
+    prompt.add_items("actions", recent_memories, lambda memories: "\nHere are your last actions:\n" + "\n".join([
+        f"- {m['action_type']} on {m['server']} (stance {m['stance']}): {m['content']}"
+        for m in memories
+    ]) + "\n")
+    return prompt.build(report)
@@ -0,0 +1,26 @@
+import hashlib
+import random
+import secrets
+
+_RUN_SEED = None
+
+
+def set_run_seed(seed=None):
+    global _RUN_SEED
+    _RUN_SEED = secrets.randbits(63) if seed is None else seed
+    return _RUN_SEED
+
+
+def run_seed():
+    if _RUN_SEED is None:
+        set_run_seed()
+    return _RUN_SEED
+
+
+def derive_seed(*path):
+    key = "/".join(str(part) for part in (run_seed(),) + path)
+    return int.from_bytes(hashlib.sha256(key.encode("utf-8")).digest()[:8], "big")
+
+
+def rng_stream(*path):
+    return random.Random(derive_seed(*path))
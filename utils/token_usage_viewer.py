@@ -19,11 +19,13 @@ def analyze_token_usage(log_file):
     total_prompt_tokens = 0
     total_completion_tokens = 0
     total_tokens = 0
+    total_cached_tokens = 0
     action_type_stats = defaultdict(lambda: {
         'count': 0,
         'prompt_tokens': 0,
         'completion_tokens': 0,
-        'total_tokens': 0
+        'total_tokens': 0,
+        'cached_tokens': 0
     })
     round_stats = defaultdict(lambda: {
         'count': 0,
@@ -45,6 +47,12 @@ def analyze_token_usage(log_file):
     })
     
     records = []
+    coalesced_calls = 0
+    coalesced_saved_tokens = 0
+    grouped_calls = 0
+    grouped_saved_tokens = 0
+    batch_prompt_tokens = 0
+    batch_completion_tokens = 0
     
     with open(log_file, 'r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
@@ -53,19 +61,35 @@ def analyze_token_usage(log_file):
                 continue
             
             try:
+                if (row.get('source') or 'api') == 'coalesced':
+                    coalesced_calls += 1
+                    coalesced_saved_tokens += int(row.get('saved_tokens') or 0)
+                    continue
+                if row.get('source') == 'grouped':
+                    grouped_calls += 1
+                    grouped_saved_tokens += int(row.get('saved_tokens') or 0)
+                    continue
+                
                 prompt_tokens = int(row.get('prompt_tokens', 0))
                 completion_tokens = int(row.get('completion_tokens', 0))
                 total = int(row.get('total_tokens', 0))
+                cached_tokens = int(row.get('cached_tokens') or 0)
                 
                 total_prompt_tokens += prompt_tokens
+                total_cached_tokens += cached_tokens
                 total_completion_tokens += completion_tokens
                 total_tokens += total
                 
+                if row.get('source') == 'batch':
+                    batch_prompt_tokens += prompt_tokens
+                    batch_completion_tokens += completion_tokens
+                
                 action_type = row.get('action_type', 'unknown')
                 action_type_stats[action_type]['count'] += 1
                 action_type_stats[action_type]['prompt_tokens'] += prompt_tokens
                 action_type_stats[action_type]['completion_tokens'] += completion_tokens
                 action_type_stats[action_type]['total_tokens'] += total
+                action_type_stats[action_type]['cached_tokens'] += cached_tokens
                 
                 round_num = row.get('round', 'unknown')
                 round_stats[round_num]['count'] += 1
@@ -98,6 +122,20 @@ def analyze_token_usage(log_file):
     print(f"Total Tokens: {total_tokens:,}")
     print()
     
+    if coalesced_calls:
+        print(f"🔗 Single-Flight Coalescing")
+        print(f"{'='*80}")
+        print(f"Calls Saved: {coalesced_calls}")
+        print(f"Tokens Saved: {coalesced_saved_tokens:,}")
+        print()
+    
+    if grouped_calls:
+        print(f"👥 Grouped Decisions")
+        print(f"{'='*80}")
+        print(f"Group Prompts: {grouped_calls}")
+        print(f"Tokens Saved: {grouped_saved_tokens:,}")
+        print()
+    
     print(f"📝 By Action Type")
     print(f"{'='*80}")
     print(f"{'Action Type':<25} {'Calls':<10} {'Prompt':<15} {'Completion':<15} {'Total':<15}")
@@ -107,6 +145,19 @@ def analyze_token_usage(log_file):
         print(f"{action_type:<25} {stats['count']:<10} {stats['prompt_tokens']:<15,} {stats['completion_tokens']:<15,} {stats['total_tokens']:<15,}")
     print()
     
+    if total_cached_tokens:
+        print(f"⚡ Prefix Cache Hit Rate")
+        print(f"{'='*80}")
+        print(f"{'Action Type':<25} {'Prompt':<15} {'Cached':<15} {'Hit Rate':<10}")
+        print(f"{'-'*80}")
+        for action_type in sorted(action_type_stats.keys()):
+            stats = action_type_stats[action_type]
+            hit_rate = stats['cached_tokens'] / stats['prompt_tokens'] if stats['prompt_tokens'] else 0.0
+            print(f"{action_type:<25} {stats['prompt_tokens']:<15,} {stats['cached_tokens']:<15,} {hit_rate:<10.1%}")
+        overall_hit_rate = total_cached_tokens / total_prompt_tokens if total_prompt_tokens else 0.0
+        print(f"{'total':<25} {total_prompt_tokens:<15,} {total_cached_tokens:<15,} {overall_hit_rate:<10.1%}")
+        print()
+    
     print(f"🔄 By Round")
     print(f"{'='*80}")
     print(f"{'Round':<10} {'Calls':<10} {'Prompt':<15} {'Completion':<15} {'Total':<15}")
@@ -143,8 +194,8 @@ def analyze_token_usage(log_file):
         print(f"{user_id:<25} {stats['count']:<10} {stats['prompt_tokens']:<15,} {stats['completion_tokens']:<15,} {stats['total_tokens']:<15,}")
     print()
     
-    input_cost = (total_prompt_tokens / 1_000_000) * 0.15
-    output_cost = (total_completion_tokens / 1_000_000) * 0.60
+    input_cost = ((total_prompt_tokens - batch_prompt_tokens * 0.5 - total_cached_tokens * 0.5) / 1_000_000) * 0.15
+    output_cost = ((total_completion_tokens - batch_completion_tokens * 0.5) / 1_000_000) * 0.60
     total_cost = input_cost + output_cost
     
     print(f"💰 Cost Estimation (gpt-4o-mini)")
@@ -152,6 +203,10 @@ def analyze_token_usage(log_file):
     print(f"Input Cost:  ${input_cost:.4f} ({total_prompt_tokens:,} tokens @ $0.15/1M)")
     print(f"Output Cost: ${output_cost:.4f} ({total_completion_tokens:,} tokens @ $0.60/1M)")
     print(f"Total Cost:  ${total_cost:.4f}")
+    if batch_prompt_tokens or batch_completion_tokens:
+        print(f"(Batch API calls billed at 50%: {batch_prompt_tokens + batch_completion_tokens:,} tokens)")
+    if total_cached_tokens:
+        print(f"(Cached prompt tokens billed at 50%: {total_cached_tokens:,} tokens)")
     print()
 
 